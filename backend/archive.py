@@ -0,0 +1,224 @@
+"""
+Archivage des transactions anciennes (stockage froid).
+
+Les transactions antérieures à l'horizon (ARCHIVE_AFTER_MONTHS mois, aligné sur
+le début d'un mois) sont déplacées de `transactions` vers `transactions_archive`
+par lots, et des résumés mensuels (revenus, dépenses, dépenses par catégorie,
+nombre) sont tenus dans `transaction_summaries`. La collection chaude, son index
+(user_id, date) et donc la mémoire de travail restent bornés.
+
+Chaque utilisateur archivé porte `archived_before` : les lectures dont la période
+commence avant cette date interrogent aussi l'archive (voir server.py), les
+totaux globaux utilisent les résumés. Une transaction créée après coup avec une
+date ancienne reste dans la collection chaude jusqu'au passage suivant.
+
+Un lot est d'abord copié dans l'archive (même _id : rejouable) en portant le
+marqueur IN_FLIGHT, que toutes les lectures de l'archive ignorent (`settled`) :
+tant qu'il existe dans la collection chaude, il n'est compté qu'une fois. Il est
+ensuite supprimé de la collection chaude, le marqueur est retiré, puis les
+résumés de ses mois sont recalculés : entre la suppression et ce recalcul, les
+totaux globaux omettent brièvement le lot, sans jamais le compter deux fois. Un
+arrêt en cours de lot est réparé par le passage suivant, qui commence par
+terminer les lots marqués (`resume_user`). À la fin, `data_version` est incrémenté : une réponse mise en
+cache pendant le déplacement (response_cache.py) n'est plus relue.
+
+    python archive.py run [--months 24] [--user EMAIL] [--dry-run]
+    python archive.py summaries [--user EMAIL]     # recalcule les résumés
+"""
+import argparse
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional, Tuple
+
+from pymongo.errors import BulkWriteError
+
+from compact import TransactionCollection, decode
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_AFTER_MONTHS = int(os.getenv("ARCHIVE_AFTER_MONTHS", "24"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "1000"))
+DUPLICATE_KEY = 11000
+IN_FLIGHT = "archiving"  # lot copié dans l'archive, pas encore supprimé de la collection chaude
+
+
+def month_start(dt: datetime) -> datetime:
+    return datetime(dt.year, dt.month, 1, tzinfo=timezone.utc)
+
+
+def next_month(dt: datetime) -> datetime:
+    return datetime(dt.year + (dt.month == 12), dt.month % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def horizon(months: int = ARCHIVE_AFTER_MONTHS, now: Optional[datetime] = None) -> datetime:
+    """Début du mois situé `months` mois avant le mois courant."""
+    now = now or datetime.now(timezone.utc)
+    index = now.year * 12 + now.month - 1 - months
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def settled(query: dict) -> dict:
+    """Restreint une requête sur l'archive aux transactions dont le déplacement est terminé."""
+    return {**query, IN_FLIGHT: {"$exists": False}}
+
+
+def hot(database) -> TransactionCollection:
+    return TransactionCollection(database.transactions)
+
+
+def cold(database) -> TransactionCollection:
+    return TransactionCollection(database.transactions_archive)
+
+
+async def ensure_indexes(database):
+    await cold(database).create_index([("user_id", 1), ("date", -1)])
+    await cold(database).create_index([("user_id", 1), ("id", 1)])
+    await cold(database).create_index(IN_FLIGHT, sparse=True)
+    await database.transaction_summaries.create_index([("user_id", 1), ("month", 1)], unique=True)
+
+
+async def rebuild_summaries(database, user_id: str, months: Optional[Iterable[datetime]] = None):
+    """Recalcule depuis l'archive les résumés des mois donnés (tous si None)."""
+    match = {"user_id": user_id}
+    months = sorted({month_start(m) for m in months}) if months is not None else None
+    if months is not None:
+        if not months:
+            return
+        match["date"] = {"$gte": months[0], "$lt": next_month(months[-1])}
+    rows = await cold(database).aggregate([
+        {"$match": settled(match)},
+        {"$group": {
+            "_id": {"y": {"$year": "$date"}, "m": {"$month": "$date"}, "type": "$type", "cat": "$category_id"},
+            "total": {"$sum": "$amount"}, "count": {"$sum": 1}
+        }}
+    ]).to_list(None)
+    summaries: Dict[datetime, dict] = {}
+    for row in rows:
+        g = row["_id"]
+        month = datetime(g["y"], g["m"], 1, tzinfo=timezone.utc)
+        summary = summaries.setdefault(month, {"user_id": user_id, "month": month, "income": 0, "expense": 0, "count": 0, "categories": {}})
+        summary["count"] += row["count"]
+        if g["type"] == "Revenu":
+            summary["income"] += row["total"]
+        elif g["type"] == "Dépense":
+            summary["expense"] += row["total"]
+            if g.get("cat"):
+                summary["categories"][g["cat"]] = summary["categories"].get(g["cat"], 0) + row["total"]
+    await database.transaction_summaries.delete_many(match if months is None else {"user_id": user_id, "month": match["date"]})
+    if summaries:
+        await database.transaction_summaries.insert_many(list(summaries.values()))
+
+
+async def summary_totals(database, user_id: str) -> Dict[str, float]:
+    """Totaux par type de toutes les transactions archivées."""
+    rows = await database.transaction_summaries.aggregate([
+        {"$match": {"user_id": user_id}},
+        {"$group": {"_id": None, "income": {"$sum": "$income"}, "expense": {"$sum": "$expense"}}}
+    ]).to_list(None)
+    if not rows:
+        return {"Revenu": 0, "Dépense": 0}
+    return {"Revenu": rows[0]["income"], "Dépense": rows[0]["expense"]}
+
+
+async def summaries_by_month(database, user_id: str, start: datetime, end: datetime) -> Dict[Tuple[int, int], dict]:
+    """Résumés des mois archivés de [start, end) : {(année, mois): {"Revenu", "Dépense", "categories"}}."""
+    summaries = await database.transaction_summaries.find(
+        {"user_id": user_id, "month": {"$gte": month_start(start), "$lt": end}}
+    ).to_list(None)
+    return {
+        (s["month"].year, s["month"].month): {"Revenu": s["income"], "Dépense": s["expense"], "categories": dict(s["categories"])}
+        for s in summaries
+    }
+
+
+async def _finish_batch(database, user_id: str, batch: list):
+    """Termine le déplacement d'un lot déjà copié : suppression, marqueur retiré, résumés."""
+    ids = [t["_id"] for t in batch]
+    await database.transactions.delete_many({"_id": {"$in": ids}})
+    await database.transactions_archive.update_many({"_id": {"$in": ids}}, {"$unset": {IN_FLIGHT: ""}})
+    await rebuild_summaries(database, user_id, {month_start(decode(t)["date"]) for t in batch})
+
+
+async def resume_user(database, user_id: str) -> int:
+    """Termine les lots laissés marqués par un passage interrompu ; renvoie leur taille."""
+    query = cold(database).read_query({"user_id": user_id})
+    batch = await database.transactions_archive.find({IN_FLIGHT: True, **query}).to_list(None)
+    if batch:
+        await _finish_batch(database, user_id, batch)
+    return len(batch)
+
+
+async def archive_user(database, user_id: str, cutoff: datetime) -> int:
+    """Déplace les transactions de l'utilisateur antérieures à `cutoff` ; renvoie leur nombre."""
+    transactions = hot(database)
+    resumed = await resume_user(database, user_id)
+    # Lots copiés tels quels (format historique ou compact, voir compact.py)
+    query = transactions.read_query({"user_id": user_id, "date": {"$lt": cutoff}})
+    if not resumed and not await transactions.raw.count_documents(query, limit=1):
+        return 0
+    # Les lectures consultent l'archive dès maintenant : aucune transaction n'est invisible pendant le déplacement.
+    await database.users.update_one({"id": user_id}, {"$max": {"archived_before": cutoff}})
+    moved = resumed
+    while True:
+        batch = await transactions.raw.find(query).sort("_id", 1).limit(ARCHIVE_BATCH_SIZE).to_list(None)
+        if not batch:
+            break
+        try:
+            await database.transactions_archive.insert_many([{**t, IN_FLIGHT: True} for t in batch], ordered=False)
+        except BulkWriteError as e:
+            # Lot déjà copié lors d'un passage interrompu
+            if any(err.get("code") != DUPLICATE_KEY for err in e.details.get("writeErrors", [])):
+                raise
+        await _finish_batch(database, user_id, batch)
+        moved += len(batch)
+    # Même effet que mark_transactions_changed(rewrite=True) : les snapshots sont reconstruits,
+    # les réponses en cache (data_version) ne sont plus relues.
+    await database.users.update_one(
+        {"id": user_id},
+        {"$inc": {"tx_version": 1, "tx_epoch": 1, "data_version": 1}, "$set": {"tx_written_at": datetime.now(timezone.utc)}}
+    )
+    return moved
+
+
+async def _main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("run", help="archive les transactions anciennes")
+    run.add_argument("--months", type=int, default=ARCHIVE_AFTER_MONTHS, help="horizon en mois")
+    run.add_argument("--dry-run", action="store_true", help="compte sans rien déplacer")
+    summaries = sub.add_parser("summaries", help="recalcule les résumés mensuels")
+    for p in (run, summaries):
+        p.add_argument("--user", help="e-mail d'un seul utilisateur")
+    args = parser.parse_args()
+
+    from motor.motor_asyncio import AsyncIOMotorClient
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    database = client.budget_tracker
+    await ensure_indexes(database)
+    users = database.users.find({"email": args.user} if args.user else {}, {"id": 1, "email": 1})
+
+    if args.command == "summaries":
+        async for user in users:
+            await rebuild_summaries(database, user["id"])
+            print(f"{user['email']} : résumés recalculés")
+        return
+
+    cutoff = horizon(args.months)
+    total = 0
+    async for user in users:
+        if args.dry_run:
+            count = await hot(database).count_documents({"user_id": user["id"], "date": {"$lt": cutoff}})
+        else:
+            count = await archive_user(database, user["id"], cutoff)
+        if count:
+            print(f"{user['email']} : {count} transactions")
+        total += count
+    verb = "à archiver" if args.dry_run else "archivées"
+    print(f"{total} transactions {verb} (avant le {cutoff:%Y-%m-%d})")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main())
@@ -0,0 +1,352 @@
+"""
+Sauvegarde et restauration complètes d'un compte.
+
+Archive : NDJSON compressé en gzip, une ligne JSON (bson.json_util) par document.
+    {"format": "budget-backup", "version": 1, "created_at": ..., "user_id": ...}
+    {"section": "users"}
+    {...}                              # documents de la section, sans _id
+    {"section": "categories"}
+    ...
+    {"end": {"users": 1, "categories": 12, ...}}    # absent = archive tronquée
+
+Les sections sont écrites dans l'ordre de SECTIONS (une entité avant celles qui
+la référencent), chacune depuis un curseur : mémoire constante. Les
+transactions archivées (archive.py) sont écrites dans la section
+`transactions` et restaurées dans la collection chaude. Les catégories par
+défaut partagées (category_templates.py) sont écrites comme des catégories
+propres : la restauration en fait des copies ordinaires.
+
+La restauration lit l'archive deux fois : validation complète, puis
+insertion par lots (insert_many) sous un propriétaire provisoire, invisible
+des lectures. Les anciennes données ne sont supprimées, et les nouvelles
+rattachées au compte, qu'une fois tout inséré : une erreur en cours de route
+retire les documents provisoires et laisse le compte intact. Tous les
+identifiants sont régénérés ; seuls ceux qui sont référencés (catégories,
+sous-catégories, objectifs) sont gardés en mémoire pour réécrire les références.
+La décompression et le décodage JSON tournent dans le pool de threads.
+
+    python backup.py dump EMAIL [-o FICHIER]           # avec les identifiants de connexion
+    python backup.py restore FICHIER --into EMAIL      # remplace les données d'un compte
+    python backup.py restore FICHIER --new [--email E] # crée un nouveau compte
+"""
+import argparse
+import asyncio
+import gzip
+import itertools
+import os
+import uuid
+import zlib
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, IO, Iterator, Optional, Tuple
+
+from bson import json_util
+from starlette.concurrency import run_in_threadpool
+
+import archive
+import category_templates
+from compact import TransactionCollection
+
+FORMAT = "budget-backup"
+VERSION = 1
+BACKUP_BATCH_SIZE = int(os.getenv("BACKUP_BATCH_SIZE", "1000"))
+FLUSH_BYTES = 64 * 1024
+
+SECTIONS = [
+    "users", "categories", "subcategories", "budgets", "savings_goals", "savings_contributions",
+    "recurring_transactions", "pending_transactions", "transactions",
+]
+# champ -> section référencée ; REQUIRED : document ignoré si la référence est introuvable
+REFERENCES = {
+    "subcategories": {"category_id": "categories"},
+    "budgets": {"category_id": "categories"},
+    "savings_contributions": {"goal_id": "savings_goals"},
+    "recurring_transactions": {"category_id": "categories", "subcategory_id": "subcategories"},
+    "pending_transactions": {"category_id": "categories", "subcategory_id": "subcategories"},
+    "transactions": {"category_id": "categories", "subcategory_id": "subcategories"},
+}
+REQUIRED = {("subcategories", "category_id"), ("budgets", "category_id"), ("savings_contributions", "goal_id")}
+REFERENCED = {"categories", "subcategories", "savings_goals"}
+CREDENTIALS = ("hashed_password", "mfa_secret", "api_key")
+# Champs techniques du compte, jamais restaurés
+USER_STATE = ("_id", "id", "tx_version", "tx_epoch", "tx_written_at", "data_version", "tokens_valid_after",
+              "token_generation", "archived_before", "api_key", category_templates.FLAG)
+JSON_OPTIONS = json_util.RELAXED_JSON_OPTIONS
+
+
+class BackupError(ValueError):
+    pass
+
+
+def filename(now: Optional[datetime] = None) -> str:
+    return f"budget-backup-{(now or datetime.now(timezone.utc)):%Y%m%d}.ndjson.gz"
+
+
+def _line(doc: dict) -> bytes:
+    return (json_util.dumps(doc, json_options=JSON_OPTIONS) + "\n").encode("utf-8")
+
+
+def _owned(database, section: str):
+    if section == "transactions":
+        return [TransactionCollection(database.transactions), TransactionCollection(database.transactions_archive)]
+    return [database[section]]
+
+
+# --- Sauvegarde ---
+
+async def backup_stream(database, user_id: str, include_credentials: bool = False) -> AsyncIterator[bytes]:
+    """Archive gzip du compte, produite par morceaux d'environ FLUSH_BYTES."""
+    gz = zlib.compressobj(6, zlib.DEFLATED, 31)
+    pending = []
+    size = 0
+    counts: Dict[str, int] = {}
+
+    def emit(doc: dict):
+        nonlocal size
+        line = _line(doc)
+        pending.append(line)
+        size += len(line)
+
+    def drain() -> bytes:
+        nonlocal size
+        data = gz.compress(b"".join(pending))
+        pending.clear()
+        size = 0
+        return data
+
+    emit({"format": FORMAT, "version": VERSION, "created_at": datetime.now(timezone.utc), "user_id": user_id})
+    uses_defaults = False
+    for section in SECTIONS:
+        emit({"section": section})
+        counts[section] = 0
+        for collection in _owned(database, section):
+            query = {"id": user_id} if section == "users" else {"user_id": user_id}
+            if section == "categories":
+                # Modèles partagés, copies modifiées et pierres tombales -> catégories visibles
+                docs = _iterate(await category_templates.user_categories(collection, user_id, uses_defaults))
+            else:
+                if collection.name == "transactions_archive":
+                    query = archive.settled(query)  # lot en cours : sauvegardé depuis la collection chaude
+                docs = collection.find(query).batch_size(BACKUP_BATCH_SIZE)
+            async for doc in docs:
+                doc = dict(doc)
+                doc.pop("_id", None)
+                if section == "users":
+                    uses_defaults = bool(doc.get(category_templates.FLAG))
+                    if not include_credentials:
+                        for name in CREDENTIALS:
+                            doc.pop(name, None)
+                emit(doc)
+                counts[section] += 1
+                if size >= FLUSH_BYTES:
+                    chunk = drain()
+                    if chunk:
+                        yield chunk
+    emit({"end": counts})
+    yield drain() + gz.flush()
+
+
+async def _iterate(docs):
+    for doc in docs:
+        yield doc
+
+
+# --- Lecture et validation ---
+
+def read_archive(fileobj: IO[bytes]) -> Iterator[Tuple[Optional[str], dict]]:
+    """(section, document) ; section None pour l'en-tête et le pied."""
+    section = None
+    try:
+        with gzip.open(fileobj, "rt", encoding="utf-8") as lines:
+            for number, line in enumerate(lines, 1):
+                if not line.strip():
+                    continue
+                doc = json_util.loads(line, json_options=JSON_OPTIONS)
+                if "section" in doc and len(doc) == 1:
+                    section = doc["section"]
+                    continue
+                yield (None if number == 1 or "end" in doc and len(doc) == 1 else section), doc
+    except (OSError, EOFError, ValueError, zlib.error) as e:
+        raise BackupError(f"Archive illisible : {e}")
+
+
+def validate(fileobj: IO[bytes]) -> Dict[str, int]:
+    """Parcourt toute l'archive ; renvoie les effectifs par section ou lève BackupError."""
+    header, counts, end = None, {}, None
+    for section, doc in read_archive(fileobj):
+        if section is None and header is None:
+            header = doc
+            if doc.get("format") != FORMAT or doc.get("version") != VERSION:
+                raise BackupError("Ce fichier n'est pas une sauvegarde reconnue.")
+        elif section is None:
+            end = doc["end"]
+        elif section not in SECTIONS:
+            raise BackupError(f"Section inconnue : {section}")
+        else:
+            counts[section] = counts.get(section, 0) + 1
+    if header is None or end is None:
+        raise BackupError("Archive incomplète (pied absent).")
+    if {k: v for k, v in end.items() if v} != counts:
+        raise BackupError("Archive incohérente : effectifs différents du pied.")
+    if counts.get("users", 0) != 1:
+        raise BackupError("L'archive doit contenir exactement un compte.")
+    return counts
+
+
+# --- Restauration ---
+
+def _take(records: Iterator, count: int) -> list:
+    return list(itertools.islice(records, count))
+
+
+async def _delete_owned(database, user_id: str):
+    for section in SECTIONS[1:]:
+        for collection in _owned(database, section):
+            await collection.delete_many({"user_id": user_id})
+    await database.transaction_summaries.delete_many({"user_id": user_id})
+
+
+async def _reassign(database, source: str, target: str):
+    for section in SECTIONS[1:]:
+        for collection in _owned(database, section):
+            await collection.update_many({"user_id": source}, {"$set": {"user_id": target}})
+
+
+async def restore(database, fileobj: IO[bytes], user_id: Optional[str] = None,
+                  email: Optional[str] = None) -> Tuple[str, Dict[str, int]]:
+    """Restaure l'archive (à relire depuis le début : validate() l'a déjà parcourue).
+
+    - user_id donné : les données du compte sont remplacées ; son e-mail, ses
+      identifiants de connexion et sa MFA sont conservés ;
+    - sinon : un nouveau compte est créé (e-mail de l'archive ou `email`), ce
+      qui suppose une archive produite avec les identifiants de connexion.
+    Renvoie (user_id, documents insérés par section).
+    """
+    id_maps: Dict[str, Dict[str, str]] = {section: {} for section in REFERENCED}
+    inserted: Dict[str, int] = {}
+    batch, batch_section = [], None
+    transactions = TransactionCollection(database.transactions)
+    staging = str(uuid.uuid4())  # propriétaire provisoire des documents insérés
+    created = user_id is None
+    preferences: Dict[str, object] = {}
+
+    async def flush():
+        if batch:
+            target = transactions if batch_section == "transactions" else database[batch_section]
+            await target.insert_many(list(batch), ordered=False)
+            inserted[batch_section] = inserted.get(batch_section, 0) + len(batch)
+            batch.clear()
+
+    records = read_archive(fileobj)
+    try:
+        while True:
+            chunk = await run_in_threadpool(_take, records, BACKUP_BATCH_SIZE)
+            if not chunk:
+                break
+            for section, doc in chunk:
+                if section is None:
+                    continue
+                if section == "users":
+                    user_id, preferences = await _restore_user(database, doc, user_id, email)
+                    continue
+                if user_id is None:
+                    raise BackupError("Section users absente.")
+                if section != batch_section:
+                    await flush()
+                    batch_section = section
+                skip = False
+                for name, target in REFERENCES.get(section, {}).items():
+                    old = doc.get(name)
+                    if old is not None:
+                        doc[name] = id_maps[target].get(old)
+                    if doc.get(name) is None and (section, name) in REQUIRED:
+                        skip = True
+                if skip:
+                    continue
+                new_id = str(uuid.uuid4())
+                if section in REFERENCED and doc.get("id"):
+                    id_maps[section][doc["id"]] = new_id
+                doc["id"], doc["user_id"] = new_id, staging
+                batch.append(doc)
+                if len(batch) >= BACKUP_BATCH_SIZE:
+                    await flush()
+        await flush()
+    except Exception:
+        await _delete_owned(database, staging)
+        if created and user_id is not None:
+            await database.users.delete_one({"id": user_id})
+        raise
+    # Tout est inséré : les anciennes données laissent la place aux nouvelles
+    await _delete_owned(database, user_id)
+    await _reassign(database, staging, user_id)
+    # Nouvelles données : snapshots à reconstruire, plus d'archive froide ni de
+    # catégories partagées (les catégories restaurées sont des copies) pour ce compte
+    await database.users.update_one(
+        {"id": user_id}, {"$inc": {"tx_version": 1, "tx_epoch": 1, "data_version": 1},
+                          "$set": {"tx_written_at": datetime.now(timezone.utc), **preferences},
+                          "$unset": {"archived_before": "", category_templates.FLAG: ""}}
+    )
+    return user_id, inserted
+
+
+async def _restore_user(database, doc: dict, user_id: Optional[str], email: Optional[str]) -> Tuple[str, dict]:
+    """(id du compte, préférences à appliquer une fois les données remplacées)."""
+    if user_id is not None:
+        # Compte existant : seules les préférences suivent
+        return user_id, {k: doc[k] for k in ("currency",) if k in doc}
+    if not doc.get("hashed_password"):
+        raise BackupError("Archive sans identifiants de connexion : restauration dans un compte existant uniquement.")
+    account = {k: v for k, v in doc.items() if k not in USER_STATE}
+    account["email"] = email or doc["email"]
+    if await database.users.find_one({"email": account["email"]}):
+        raise BackupError(f"Un compte existe déjà pour {account['email']}.")
+    account.update(id=str(uuid.uuid4()), api_key=None, tx_version=0, tx_epoch=0)
+    await database.users.insert_one(account)
+    return account["id"], {}
+
+
+async def _main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    dump = sub.add_parser("dump", help="sauvegarde un compte")
+    dump.add_argument("email")
+    dump.add_argument("-o", "--output", help=f"fichier de sortie (défaut : {filename()})")
+    dump.add_argument("--without-credentials", action="store_true", help="sans mot de passe, MFA ni clé d'API")
+    load = sub.add_parser("restore", help="restaure une sauvegarde")
+    load.add_argument("file")
+    target = load.add_mutually_exclusive_group(required=True)
+    target.add_argument("--into", metavar="EMAIL", help="remplace les données de ce compte")
+    target.add_argument("--new", action="store_true", help="crée un nouveau compte")
+    load.add_argument("--email", help="e-mail du nouveau compte (défaut : celui de l'archive)")
+    args = parser.parse_args()
+
+    from motor.motor_asyncio import AsyncIOMotorClient
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    database = client.budget_tracker
+
+    if args.command == "dump":
+        user = await database.users.find_one({"email": args.email})
+        if not user:
+            parser.error(f"compte introuvable : {args.email}")
+        path = args.output or filename()
+        with open(path, "wb") as f:
+            async for chunk in backup_stream(database, user["id"], include_credentials=not args.without_credentials):
+                f.write(chunk)
+        print(f"{path} : {os.path.getsize(path)} octets")
+        return
+
+    user_id = None
+    if args.into:
+        user = await database.users.find_one({"email": args.into})
+        if not user:
+            parser.error(f"compte introuvable : {args.into}")
+        user_id = user["id"]
+    with open(args.file, "rb") as f:
+        counts = validate(f)
+        print("archive valide : " + ", ".join(f"{k} {v}" for k, v in counts.items()))
+        f.seek(0)
+        user_id, inserted = await restore(database, f, user_id, args.email)
+    print(f"compte {user_id} : " + ", ".join(f"{k} {v}" for k, v in inserted.items()))
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
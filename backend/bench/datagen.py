@@ -0,0 +1,206 @@
+"""
+Générateur de données synthétiques pour les benchmarks et tests de charge.
+
+Crée N utilisateurs avec catégories, sous-catégories, budgets, règles
+récurrentes, transactions sur M années et quelques éléments dans l'inbox,
+avec les mêmes formes de documents que celles écrites par server.py.
+
+    python bench/datagen.py --mongo-url mongodb://localhost:27017 --users 20 --years 3
+"""
+import argparse
+import asyncio
+import os
+import random
+import secrets
+import sys
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+import category_templates  # noqa: E402
+import server  # noqa: E402
+from compact import TransactionCollection  # noqa: E402
+
+PASSWORD = "loadtest-password"
+INSERT_BATCH = 1000
+
+# (catégorie, montant min, max, occurrences par mois, sous-catégories)
+EXPENSE_PROFILE = [
+    ("Alimentation", 8, 120, 10, ["Supermarché", "Marché", "Boulangerie"]),
+    ("Restaurant", 12, 80, 4, ["Midi", "Soir"]),
+    ("Transport", 2, 60, 6, ["Métro", "Essence", "Train"]),
+    ("Loisirs", 10, 90, 3, ["Cinéma", "Sport"]),
+    ("Shopping", 15, 150, 2, ["Vêtements", "Maison"]),
+    ("Santé", 10, 70, 1, ["Pharmacie", "Médecin"]),
+    ("Abonnements", 5, 20, 3, ["Streaming", "Téléphone"]),
+    ("Cadeaux", 20, 100, 0.3, []),
+    ("Vacances", 100, 900, 0.2, []),
+]
+MERCHANTS = {
+    "Alimentation": ["Carrefour", "Monoprix", "Lidl", "Franprix", "Boulangerie Paul"],
+    "Restaurant": ["Big Mamma", "Sushi Shop", "Le Bistrot", "Pizza Hut"],
+    "Transport": ["RATP", "Total Energies", "SNCF", "Uber"],
+    "Loisirs": ["UGC", "Basic Fit", "Fnac"],
+    "Shopping": ["Zara", "Ikea", "Decathlon", "Amazon"],
+    "Santé": ["Pharmacie du Centre", "Doctolib"],
+    "Abonnements": ["Netflix", "Spotify", "Free Mobile"],
+    "Cadeaux": ["Nature & Découvertes", "Amazon"],
+    "Vacances": ["Airbnb", "Air France", "Booking.com"],
+}
+
+
+@dataclass
+class SyntheticUser:
+    id: str
+    email: str
+    api_key: str
+    category_ids: dict = field(default_factory=dict)
+    transaction_count: int = 0
+
+
+@dataclass
+class Dataset:
+    users: List[SyntheticUser]
+    password: str = PASSWORD
+
+    @property
+    def transaction_count(self) -> int:
+        return sum(u.transaction_count for u in self.users)
+
+
+def _months(years: int, now: datetime):
+    year, month = now.year - years, now.month
+    while (year, month) <= (now.year, now.month):
+        yield year, month
+        month += 1
+        if month == 13:
+            year, month = year + 1, 1
+
+
+def _user_documents(index: int, years: int, rng: random.Random, hashed_password: str, now: datetime):
+    user = SyntheticUser(id=str(uuid.uuid4()), email=f"loadtest-{index}@example.com", api_key="bt_" + secrets.token_hex(24))
+    created = now - timedelta(days=365 * years)
+    docs = {name: [] for name in ("users", "subcategories", "budgets", "recurring_transactions", "pending_transactions")}
+    docs["users"].append({
+        "id": user.id, "email": user.email, "hashed_password": hashed_password, "is_verified": True,
+        "mfa_enabled": False, "mfa_secret": None, "currency": "EUR", "api_key": user.api_key,
+        category_templates.FLAG: True,
+    })
+
+    # Comme à l'inscription : catégories par défaut partagées, aucune copie
+    subcategory_ids = {}
+    for template in category_templates.TEMPLATES.values():
+        user.category_ids[template["name"]] = template["id"]
+    for name, _lo, hi, per_month, subs in EXPENSE_PROFILE:
+        subcategory_ids[name] = []
+        for sub in subs:
+            sid = str(uuid.uuid4())
+            subcategory_ids[name].append(sid)
+            docs["subcategories"].append({"id": sid, "user_id": user.id, "category_id": user.category_ids[name], "name": sub, "created_at": created})
+        if per_month >= 1:
+            docs["budgets"].append({
+                "id": str(uuid.uuid4()), "user_id": user.id, "category_id": user.category_ids[name],
+                "amount": round(hi * per_month * rng.uniform(0.4, 0.7), 2), "created_at": created,
+            })
+
+    salary = round(rng.uniform(1800, 4200), 2)
+    rent = round(salary * rng.uniform(0.25, 0.4), 2)
+    recurring = [
+        ("Salaire", "Revenu", salary, "Salaire", rng.randint(25, 28)),
+        ("Logement", "Dépense", rent, "Loyer", rng.randint(1, 5)),
+        ("Abonnements", "Dépense", 13.49, "Netflix", rng.randint(5, 20)),
+    ]
+    for cat_name, type_, amount, description, day in recurring:
+        docs["recurring_transactions"].append({
+            "id": str(uuid.uuid4()), "user_id": user.id, "amount": amount, "type": type_,
+            "description": description, "category_id": user.category_ids[cat_name], "subcategory_id": None,
+            "frequency": "Mensuel", "day_of_month": day, "created_at": created,
+        })
+
+    def transactions():
+        for year, month in _months(years, now):
+            for cat_name, type_, amount, description, day in recurring:
+                date = datetime(year, month, day, tzinfo=timezone.utc)
+                if date <= now:
+                    yield _transaction(user, date, amount, type_, description, user.category_ids[cat_name], None)
+            for name, lo, hi, per_month, _subs in EXPENSE_PROFILE:
+                count = int(per_month) + (1 if rng.random() < per_month % 1 else 0)
+                for _ in range(count):
+                    date = datetime(year, month, rng.randint(1, 28), rng.randint(7, 22), rng.randint(0, 59), tzinfo=timezone.utc)
+                    if date > now:
+                        continue
+                    sub = rng.choice(subcategory_ids[name]) if subcategory_ids[name] and rng.random() < 0.6 else None
+                    # ~5% de transactions non catégorisées, comme après un import PDF
+                    category_id = user.category_ids[name] if rng.random() > 0.05 else None
+                    yield _transaction(user, date, round(rng.uniform(lo, hi), 2), "Dépense", rng.choice(MERCHANTS[name]), category_id, sub if category_id else None)
+            if rng.random() < 0.15:
+                date = datetime(year, month, rng.randint(1, 28), tzinfo=timezone.utc)
+                if date <= now:
+                    yield _transaction(user, date, round(rng.uniform(20, 300), 2), "Revenu", "Remboursement", user.category_ids["Autres revenu"], None)
+
+    for _ in range(rng.randint(0, 5)):
+        docs["pending_transactions"].append({
+            "id": str(uuid.uuid4()), "user_id": user.id, "amount": round(rng.uniform(3, 60), 2),
+            "merchant": rng.choice(MERCHANTS["Alimentation"] + MERCHANTS["Restaurant"]),
+            "date": now - timedelta(days=rng.randint(0, 10)), "created_at": now,
+        })
+    return user, docs, transactions()
+
+
+def _transaction(user, date, amount, type_, description, category_id, subcategory_id):
+    user.transaction_count += 1
+    return {
+        "id": str(uuid.uuid4()), "user_id": user.id, "date": date, "amount": amount, "type": type_,
+        "description": description, "category_id": category_id, "subcategory_id": subcategory_id,
+        "created_at": date,
+    }
+
+
+async def generate(database, users: int = 10, years: int = 2, seed: int = 42) -> Dataset:
+    """Peuple `database` (Motor ou substitut compatible) et renvoie le jeu de données créé."""
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    hashed_password = server.get_password_hash(PASSWORD)  # bcrypt une seule fois
+    dataset = Dataset(users=[])
+    transactions_collection = TransactionCollection(database.transactions)  # format TRANSACTION_FORMAT
+    for index in range(users):
+        user, docs, transactions = _user_documents(index, years, rng, hashed_password, now)
+        for name, documents in docs.items():
+            if documents:
+                await database[name].insert_many(documents)
+        batch = []
+        for doc in transactions:
+            batch.append(doc)
+            if len(batch) >= INSERT_BATCH:
+                await transactions_collection.insert_many(batch)
+                batch = []
+        if batch:
+            await transactions_collection.insert_many(batch)
+        dataset.users.append(user)
+    return dataset
+
+
+async def _main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", default=os.getenv("MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--database", default="budget_tracker")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    from motor.motor_asyncio import AsyncIOMotorClient
+    client = AsyncIOMotorClient(args.mongo_url)
+    dataset = await generate(client[args.database], args.users, args.years, args.seed)
+    print(f"{len(dataset.users)} utilisateurs, {dataset.transaction_count} transactions (mot de passe : {PASSWORD})")
+    for user in dataset.users:
+        print(f"  {user.email}  api_key={user.api_key}")
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
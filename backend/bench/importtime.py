@@ -0,0 +1,107 @@
+"""
+Mesure du coût d'import de `server` (démarrage d'un worker).
+
+Lance `python -X importtime -c "import server"` dans des processus neufs,
+agrège les temps cumulés par module de premier niveau et vérifie qu'aucun
+sous-système chargé paresseusement (PDF, Gemini, MFA, e-mail) n'est importé
+au démarrage.
+
+    python bench/importtime.py                 # rapport
+    python bench/importtime.py --save          # enregistre la baseline
+    python bench/importtime.py --check         # compare à la baseline (code 1 si régression)
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(BACKEND_DIR, "bench", "baselines", "importtime.json")
+
+# Modules qui ne doivent jamais être chargés par `import server`
+LAZY_MODULES = ["pdfplumber", "google.generativeai", "qrcode", "resend", "pyotp"]
+
+
+def run_once():
+    """Un import à froid : renvoie ({module: cumul_us}, total_us, modules paresseux chargés)."""
+    probe = (
+        "import sys, json; import server; "
+        f"print(json.dumps([m for m in {LAZY_MODULES!r} if m in sys.modules]))"
+    )
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", probe],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+    )
+    per_module, total = {}, 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _self_us, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        name = name.strip()
+        if name == "server":
+            total = int(cumulative)
+        elif depth == 1:
+            # Dépendances importées directement par server (premier niveau)
+            per_module[name] = per_module.get(name, 0) + int(cumulative)
+    loaded_lazy = json.loads(proc.stdout.strip().splitlines()[-1])
+    return per_module, total, loaded_lazy
+
+
+def measure(runs: int):
+    totals, modules, loaded = [], {}, set()
+    for _ in range(runs):
+        per_module, total, loaded_lazy = run_once()
+        totals.append(total)
+        loaded.update(loaded_lazy)
+        for name, us in per_module.items():
+            modules.setdefault(name, []).append(us)
+    return {
+        "runs": runs,
+        "total_ms": round(statistics.median(totals) / 1000, 1),
+        "modules_ms": {name: round(statistics.median(v) / 1000, 1) for name, v in modules.items()},
+        "lazy_modules_loaded": sorted(loaded),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--json", action="store_true", help="sortie JSON uniquement")
+    parser.add_argument("--save", action="store_true", help="écrit la baseline")
+    parser.add_argument("--check", action="store_true", help="compare à la baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="régression tolérée (0.25 = +25%%)")
+    args = parser.parse_args()
+
+    result = measure(args.runs)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"import server : {result['total_ms']} ms (médiane sur {args.runs} imports à froid)")
+        ranked = sorted(result["modules_ms"].items(), key=lambda kv: kv[1], reverse=True)
+        for name, ms in ranked[:args.top]:
+            print(f"  {ms:>8.1f} ms  {name}")
+        if result["lazy_modules_loaded"]:
+            print(f"ATTENTION : modules paresseux chargés au démarrage : {', '.join(result['lazy_modules_loaded'])}")
+
+    if args.save:
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+            f.write("\n")
+
+    failed = bool(result["lazy_modules_loaded"])
+    if args.check:
+        with open(BASELINE_PATH, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        limit = baseline["total_ms"] * (1 + args.tolerance)
+        if result["total_ms"] > limit:
+            print(f"RÉGRESSION : {result['total_ms']} ms > {limit:.1f} ms (baseline {baseline['total_ms']} ms)")
+            failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+Test de charge de bout en bout de l'API (dans le processus, via httpx ASGITransport).
+
+Peuple une base avec bench/datagen.py puis lance des utilisateurs virtuels
+concurrents qui enchaînent login, statistiques du dashboard, liste des
+transactions, bilan mensuel et webhook Apple Pay. Rapporte p50/p95/p99 et le
+débit par opération, et compare à bench/baselines/loadtest.json.
+
+Base : substitut Motor en mémoire (mongomock-motor, par défaut) ou mongod
+local (--mongo-url, base dédiée vidée au début). mongomock parcourt et copie
+toute la collection à chaque requête : ses chiffres ne valent que comparés à
+une baseline prise dans les mêmes conditions ; utiliser un mongod pour des
+latences réalistes. Le rate limiter est neutralisé pendant le test : toutes les
+requêtes viennent de la même adresse.
+
+    python bench/loadtest.py                          # rapport
+    python bench/loadtest.py --mongo-url mongodb://localhost:27017 --duration 60
+    python bench/loadtest.py --save                   # enregistre la baseline
+    python bench/loadtest.py --check                  # compare (code 1 si régression)
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(BENCH_DIR, "baselines", "loadtest.json")
+sys.path.insert(0, BENCH_DIR)
+
+import httpx  # noqa: E402
+
+import datagen  # noqa: E402
+import server  # noqa: E402
+
+# Répartition des opérations (poids relatifs), proche d'une session sur le frontend
+WEIGHTS = {"dashboard": 35, "transactions": 25, "monthly_review": 15, "webhook": 20, "login": 5}
+
+
+class _Unlimited:
+    async def hit(self, key, capacity, period):
+        return 0.0
+
+
+def percentile(sorted_values, p: float) -> float:
+    """Percentile au rang le plus proche."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(p / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+async def open_database(mongo_url, database_name):
+    if mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(mongo_url, **server.mongo_client_options())
+        await client.drop_database(database_name)
+        return client, client[database_name]
+    try:
+        from mongomock_motor import AsyncMongoMockClient
+    except ImportError:
+        sys.exit("mongomock-motor n'est pas installé : `pip install mongomock-motor` ou utiliser --mongo-url.")
+    client = AsyncMongoMockClient()
+    return client, client[database_name]
+
+
+class Session:
+    """Un utilisateur virtuel : son jeton et ses requêtes chronométrées."""
+
+    def __init__(self, http: httpx.AsyncClient, user, password: str, samples: dict):
+        self.http = http
+        self.user = user
+        self.password = password
+        self.samples = samples
+        self.headers = {}
+
+    async def timed(self, op: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        response = await self.http.request(method, url, **kwargs)
+        elapsed = time.perf_counter() - started
+        ok = response.status_code < 400
+        self.samples[op].append((elapsed, ok))
+        return response if ok else None
+
+    async def login(self):
+        response = await self.timed("login", "POST", "/api/auth/token", data={"username": self.user.email, "password": self.password})
+        if response is not None:
+            self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    async def dashboard(self):
+        await self.timed("dashboard", "GET", "/api/dashboard/stats", headers=self.headers)
+
+    async def transactions(self):
+        await self.timed("transactions", "GET", "/api/transactions", headers=self.headers)
+
+    async def monthly_review(self):
+        await self.timed("monthly_review", "GET", "/api/dashboard/monthly-review", headers=self.headers)
+
+    async def webhook(self):
+        payload = {
+            "amount": round(random.uniform(2, 80), 2),
+            "merchant": random.choice(datagen.MERCHANTS["Restaurant"]),
+            "date": datetime.now(timezone.utc).isoformat(),
+        }
+        await self.timed("webhook", "POST", "/api/webhooks/apple-pay", json=payload,
+                         headers={"Authorization": f"Bearer {self.user.api_key}"})
+
+
+async def run(args):
+    client, database = await open_database(args.mongo_url, args.database)
+    server.bind_database(database)
+    await server.ensure_indexes()
+    server.limiter.backend = _Unlimited()
+
+    started = time.perf_counter()
+    dataset = await datagen.generate(database, args.users, args.years, args.seed)
+    print(f"Données : {len(dataset.users)} utilisateurs, {dataset.transaction_count} transactions "
+          f"({time.perf_counter() - started:.1f} s)", file=sys.stderr)
+
+    samples = {op: [] for op in WEIGHTS}
+    ops, weights = list(WEIGHTS), list(WEIGHTS.values())
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=60) as http:
+        sessions = [Session(http, dataset.users[i % len(dataset.users)], dataset.password, samples) for i in range(args.concurrency)]
+        await asyncio.gather(*(s.login() for s in sessions))
+        # Échauffement non mesuré (caches, snapshots, pool de connexions)
+        for session in sessions:
+            await session.dashboard()
+        for op in samples:
+            samples[op].clear()
+
+        deadline = time.perf_counter() + args.duration
+        rng = random.Random(args.seed)
+
+        async def virtual_user(session):
+            while time.perf_counter() < deadline:
+                await getattr(session, rng.choices(ops, weights)[0])()
+
+        measured = time.perf_counter()
+        await asyncio.gather(*(virtual_user(s) for s in sessions))
+        wall = time.perf_counter() - measured
+    client.close()
+
+    result = {
+        "config": {
+            "backend": "mongod" if args.mongo_url else "mongomock",
+            "users": args.users, "years": args.years, "concurrency": args.concurrency,
+            "duration_s": args.duration, "transactions": dataset.transaction_count,
+        },
+        "throughput_rps": round(sum(len(v) for v in samples.values()) / wall, 1),
+        "operations": {},
+    }
+    for op, values in samples.items():
+        latencies = sorted(elapsed * 1000 for elapsed, _ok in values)
+        result["operations"][op] = {
+            "requests": len(values),
+            "errors": sum(1 for _elapsed, ok in values if not ok),
+            "rps": round(len(values) / wall, 1),
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+        }
+    return result
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list:
+    """Régressions par rapport à la baseline (p95 par opération et débit global)."""
+    regressions = []
+    # Le nombre de transactions dépend de la date du jour : pas comparé
+    same = lambda config: {k: v for k, v in config.items() if k != "transactions"}
+    if same(baseline["config"]) != same(result["config"]):
+        print("ATTENTION : configuration différente de la baseline, comparaison indicative.")
+    for op, stats in result["operations"].items():
+        reference = baseline["operations"].get(op)
+        if reference and reference["p95_ms"] and stats["p95_ms"] > reference["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{op} p95 {stats['p95_ms']} ms > {reference['p95_ms']} ms (+{tolerance:.0%})")
+    if result["throughput_rps"] < baseline["throughput_rps"] * (1 - tolerance):
+        regressions.append(f"débit {result['throughput_rps']} req/s < {baseline['throughput_rps']} req/s (-{tolerance:.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", help="mongod local (défaut : substitut en mémoire)")
+    parser.add_argument("--database", default="budget_tracker_loadtest")
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--years", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=20.0, help="durée mesurée en secondes")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", action="store_true", help="sortie JSON uniquement")
+    parser.add_argument("--save", action="store_true", help="écrit la baseline")
+    parser.add_argument("--check", action="store_true", help="compare à la baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="régression tolérée (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    result = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"{result['throughput_rps']} req/s ({result['config']['backend']}, {args.concurrency} utilisateurs virtuels, {args.duration:g} s)")
+        print(f"  {'opération':<16}{'requêtes':>9}{'erreurs':>9}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for op, s in result["operations"].items():
+            print(f"  {op:<16}{s['requests']:>9}{s['errors']:>9}{s['rps']:>9}{s['p50_ms']:>10}{s['p95_ms']:>10}{s['p99_ms']:>10}")
+
+    if args.save:
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+            f.write("\n")
+
+    failed = any(s["errors"] for s in result["operations"].values())
+    if failed:
+        print("ERREURS : des requêtes ont échoué pendant le test.")
+    if args.check:
+        with open(BASELINE_PATH, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        for regression in compare(result, baseline, args.tolerance):
+            print(f"RÉGRESSION : {regression}")
+            failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+Microbenchmarks des fonctions exécutées à chaque requête.
+
+- get_current_user : décodage du JWT + lecture de l'utilisateur (substitut Motor en mémoire),
+  avec le cache des claims (cas courant) et sans (`_uncached`) ;
+- jwt_decode / jwt_decode_cached : vérification du jeton seule, sans puis avec le cache ;
+- render : UnifiedJSONResponse.render (json_serial) sur la liste de transactions ;
+- render_columnar / render_gzip : même liste en disposition colonnaire, puis JSON compressé (wire.py) ;
+- summarize : summarize_transactions (boucles du dashboard et du bilan mensuel) ;
+- transaction_rows : reconstruction des lignes de GET /api/transactions ;
+- compact_decode : décodage des documents au format compact (compact.py), par lecture.
+
+Jeux de données fixes (graine, dates et volumes constants) : les résultats sont
+comparables d'une exécution à l'autre sur une même machine.
+
+    python bench/microbench.py                  # rapport
+    python bench/microbench.py --json           # sortie JSON
+    python bench/microbench.py --save           # enregistre la baseline
+    python bench/microbench.py --check          # compare (code 1 si régression)
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(BENCH_DIR, "baselines", "microbench.json")
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import server  # noqa: E402
+
+SEED = 1234
+ROWS = 2000
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def decorator(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return decorator
+
+
+def make_transactions(count: int = ROWS, seed: int = SEED) -> list:
+    """Documents Mongo déterministes (mêmes clés que ceux écrits par server.py)."""
+    rng = random.Random(seed)
+    categories = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(15)]
+    docs = []
+    for i in range(count):
+        date = EPOCH + timedelta(minutes=rng.randint(0, 60 * 24 * 365))
+        income = rng.random() < 0.1
+        docs.append({
+            "_id": i,
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "user_id": "bench-user",
+            "date": date,
+            "amount": round(rng.uniform(1, 3000 if income else 150), 2),
+            "type": "Revenu" if income else "Dépense",
+            "description": f"Marchand {rng.randint(1, 200)}",
+            "category_id": None if rng.random() < 0.05 else rng.choice(categories),
+            "subcategory_id": None,
+            "created_at": date,
+        })
+    return docs
+
+
+def _current_user_setup():
+    from mongomock_motor import AsyncMongoMockClient
+    database = AsyncMongoMockClient().microbench
+    server.bind_database(database)
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(database.users.insert_one({
+        "id": "bench-user", "email": "bench@example.com", "hashed_password": "x", "is_verified": True,
+    }))
+    token = server.create_access_token({"sub": "bench@example.com", "scope": "access"}, timedelta(hours=1))
+    return loop, token
+
+
+@benchmark("get_current_user")
+def bench_get_current_user():
+    loop, token = _current_user_setup()
+    return lambda: loop.run_until_complete(server.get_current_user(token))
+
+
+@benchmark("get_current_user_uncached")
+def bench_get_current_user_uncached():
+    loop, token = _current_user_setup()
+
+    def run():
+        server.claims_cache.clear()
+        loop.run_until_complete(server.get_current_user(token))
+    return run
+
+
+@benchmark("jwt_decode")
+def bench_jwt_decode():
+    token = server.create_access_token({"sub": "bench@example.com", "scope": "access"}, timedelta(hours=1))
+    return lambda: server.jwt.decode(token, server.SECRET_KEY, algorithms=[server.ALGORITHM])
+
+
+@benchmark("jwt_decode_cached")
+def bench_jwt_decode_cached():
+    token = server.create_access_token({"sub": "bench@example.com", "scope": "access"}, timedelta(hours=1))
+    return lambda: server.decode_token(token)
+
+
+@benchmark("render")
+def bench_render():
+    rows = [server.transaction_row(t) for t in make_transactions()]
+    response = server.UnifiedJSONResponse(content=[])
+    return lambda: response.render(rows)
+
+
+@benchmark("render_columnar")
+def bench_render_columnar():
+    import wire
+    rows = [server.transaction_row(t) for t in make_transactions()]
+    response = server.UnifiedJSONResponse(content=[])
+    response.wire = wire.WireFormat(columnar=True)
+    return lambda: response.render(rows)
+
+
+@benchmark("render_gzip")
+def bench_render_gzip():
+    import wire
+    rows = [server.transaction_row(t) for t in make_transactions()]
+    fmt = wire.WireFormat(encoding="gzip", negotiated=True)
+
+    def run():
+        response = server.UnifiedJSONResponse(content=[])
+        response.body = response.render(rows)
+        wire.finish(response, fmt, False)
+    return run
+
+
+@benchmark("summarize")
+def bench_summarize():
+    docs = make_transactions()
+    return lambda: server.summarize_transactions(docs)
+
+
+@benchmark("transaction_rows")
+def bench_transaction_rows():
+    docs = make_transactions()
+    return lambda: [server.transaction_row(t) for t in docs]
+
+
+@benchmark("compact_decode")
+def bench_compact_decode():
+    import compact
+    docs = [compact.encode(t) for t in make_transactions()]
+    return lambda: [compact.decode(t) for t in docs]
+
+
+def measure(func, repeat: int, min_time: float) -> dict:
+    """Calibre le nombre d'itérations puis renvoie le temps par appel (µs) sur `repeat` séries."""
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        if time.perf_counter() - started >= min_time:
+            break
+        number *= 2
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - started) / number * 1e6)
+    return {
+        "iterations": number,
+        "min_us": round(min(samples), 2),
+        "median_us": round(statistics.median(samples), 2),
+        "stdev_us": round(statistics.stdev(samples), 2) if len(samples) > 1 else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("names", nargs="*", help=f"benchmarks à lancer (défaut : tous) parmi {', '.join(BENCHMARKS)}")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--min-time", type=float, default=0.2, help="durée minimale d'une série (s)")
+    parser.add_argument("--json", action="store_true", help="sortie JSON uniquement")
+    parser.add_argument("--save", action="store_true", help="écrit la baseline")
+    parser.add_argument("--check", action="store_true", help="compare à la baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="régression tolérée (0.25 = +25%%)")
+    args = parser.parse_args()
+
+    unknown = set(args.names) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"benchmark inconnu : {', '.join(sorted(unknown))}")
+    server.logger.setLevel("WARNING")
+
+    result = {"rows": ROWS, "seed": SEED, "benchmarks": {}}
+    for name in args.names or BENCHMARKS:
+        result["benchmarks"][name] = measure(BENCHMARKS[name](), args.repeat, args.min_time)
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"  {'benchmark':<28}{'médiane µs':>14}{'min µs':>12}{'écart µs':>12}")
+        for name, stats in result["benchmarks"].items():
+            print(f"  {name:<28}{stats['median_us']:>14}{stats['min_us']:>12}{stats['stdev_us']:>12}")
+
+    if args.save:
+        baseline = {"rows": ROWS, "seed": SEED, "benchmarks": {}}
+        if os.path.exists(BASELINE_PATH):
+            with open(BASELINE_PATH, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+        baseline["benchmarks"].update(result["benchmarks"])
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2)
+            f.write("\n")
+
+    failed = False
+    if args.check:
+        with open(BASELINE_PATH, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["benchmarks"]
+        for name, stats in result["benchmarks"].items():
+            reference = baseline.get(name)
+            if reference and stats["median_us"] > reference["median_us"] * (1 + args.tolerance):
+                print(f"RÉGRESSION : {name} {stats['median_us']} µs > {reference['median_us']} µs (+{args.tolerance:.0%})")
+                failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
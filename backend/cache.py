@@ -0,0 +1,60 @@
+"""
+Cache LRU en mémoire (par processus) pour des résultats calculés.
+
+Les appelants incluent dans la clé la version des données de l'utilisateur
+(`tx_version`, `tx_epoch`) : après une écriture, les anciennes entrées ne sont
+plus jamais demandées et sortent du LRU, sans invalidation explicite. Le TTL
+borne en plus la durée de vie de toute entrée.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from metrics import CACHE_LOOKUPS
+
+_MISSING = object()
+
+
+class LRUCache:
+    def __init__(self, name: str, maxsize: int, ttl: Optional[float] = None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING:
+                value, expires = entry
+                if expires is None or expires > now:
+                    self._entries.move_to_end(key)
+                    CACHE_LOOKUPS.inc(self.name, "hit")
+                    return value
+                del self._entries[key]
+        CACHE_LOOKUPS.inc(self.name, "miss")
+        return default
+
+    def set(self, key: Hashable, value: Any):
+        if self.maxsize <= 0:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
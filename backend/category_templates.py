@@ -0,0 +1,94 @@
+"""
+Catégories par défaut partagées entre tous les comptes.
+
+Les catégories par défaut ne sont plus copiées dans chaque compte à
+l'inscription : ce sont des modèles en lecture seule, identiques pour tous
+(identifiants uuid5 stables), gardés en mémoire et superposés aux catégories
+propres de l'utilisateur. Un compte qui les utilise porte le champ
+`uses_default_categories` ; les comptes créés avant gardent leurs copies.
+
+Copie à l'écriture : modifier un modèle crée un document de l'utilisateur de
+même identifiant, qui masque le modèle ; le supprimer crée une pierre tombale
+`{"deleted": True}`. Une lecture coûte une requête sur les seuls documents
+propres de l'utilisateur (souvent aucun) et une fusion en mémoire.
+"""
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+FLAG = "uses_default_categories"
+
+DEFAULT_CATEGORIES = [
+    {"name": "Salaire", "type": "Revenu"}, {"name": "Aide Papa", "type": "Revenu"},
+    {"name": "Autres revenu", "type": "Revenu"}, {"name": "Logement", "type": "Dépense"},
+    {"name": "Alimentation", "type": "Dépense"}, {"name": "Transport", "type": "Dépense"},
+    {"name": "Santé", "type": "Dépense"}, {"name": "Loisirs", "type": "Dépense"},
+    {"name": "Abonnements", "type": "Dépense"}, {"name": "Shopping", "type": "Dépense"},
+    {"name": "Autre dépense", "type": "Dépense"}, {"name": "Cadeaux", "type": "Dépense"},
+    {"name": "Coiffeur", "type": "Dépense"}, {"name": "Prêt", "type": "Dépense"},
+    {"name": "Restaurant", "type": "Dépense"}, {"name": "Investissement", "type": "Dépense"},
+    {"name": "Etudes", "type": "Dépense"}, {"name": "Vacances", "type": "Dépense"},
+]
+
+# Ne jamais changer : les transactions référencent ces identifiants
+_NAMESPACE = uuid.UUID("3b8f6a52-7c1d-4e0a-9f27-5d6c1e8b4a90")
+_CREATED_AT = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def template_id(name: str) -> str:
+    return str(uuid.uuid5(_NAMESPACE, name))
+
+
+# Identifiant -> modèle, dans l'ordre d'affichage. Partagés : ne pas modifier.
+TEMPLATES: Dict[str, dict] = {
+    template_id(c["name"]): {"id": template_id(c["name"]), "name": c["name"], "type": c["type"], "created_at": _CREATED_AT}
+    for c in DEFAULT_CATEGORIES
+}
+
+
+def overlay(own: Iterable[dict], uses_defaults: bool) -> List[dict]:
+    """Modèles (remplacés par leur copie modifiée, sans les supprimés) puis catégories propres."""
+    own = list(own)
+    if not uses_defaults:
+        return [c for c in own if not c.get("deleted")]
+    overrides = {c["id"]: c for c in own if c["id"] in TEMPLATES}
+    merged = []
+    for category_id, template in TEMPLATES.items():
+        doc = overrides.get(category_id, template)
+        if not doc.get("deleted"):
+            merged.append(doc)
+    merged.extend(c for c in own if c["id"] not in TEMPLATES and not c.get("deleted"))
+    return merged
+
+
+async def user_categories(collection, user_id: str, uses_defaults: bool) -> List[dict]:
+    return overlay(await collection.find({"user_id": user_id}).to_list(None), uses_defaults)
+
+
+async def find_one(collection, user_id: str, uses_defaults: bool, category_id: str) -> Optional[dict]:
+    doc = await collection.find_one({"id": category_id, "user_id": user_id})
+    if doc is not None:
+        return None if doc.get("deleted") else doc
+    if uses_defaults and category_id in TEMPLATES:
+        return dict(TEMPLATES[category_id])
+    return None
+
+
+async def update(collection, user_id: str, category_id: str, fields: dict):
+    """Modifie une catégorie visible (find_one) ; un modèle est d'abord copié chez l'utilisateur."""
+    template = TEMPLATES.get(category_id)
+    update_doc = {"$set": fields}
+    if template is not None:
+        on_insert = {k: v for k, v in template.items() if k != "id" and k not in fields}
+        if on_insert:
+            update_doc["$setOnInsert"] = on_insert
+    await collection.update_one({"id": category_id, "user_id": user_id}, update_doc, upsert=template is not None)
+
+
+async def delete(collection, user_id: str, category_id: str):
+    if category_id in TEMPLATES:
+        await collection.replace_one(
+            {"id": category_id, "user_id": user_id}, {"id": category_id, "user_id": user_id, "deleted": True}, upsert=True
+        )
+    else:
+        await collection.delete_one({"id": category_id, "user_id": user_id})
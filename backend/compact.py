@@ -0,0 +1,660 @@
+"""
+Format de stockage compact des transactions.
+
+Format historique (« legacy ») :
+    {_id, id: "uuid en 36 caractères", user_id, date, amount: 12.5, type, description,
+     category_id, subcategory_id, created_at}
+Format compact :
+    {_id, i: UUID binaire, u: UUID binaire, d: date, a: 1250 (centimes, entier), t: type,
+     l: libellé, c: UUID binaire, s: UUID binaire[, k: created_at]}
+
+- les champs à None sont omis ; un identifiant qui n'est pas un UUID reste une chaîne ;
+- `_id` reste un ObjectId (watermark des snapshots, ordre de l'archivage) :
+  created_at s'en déduit, `k` n'est écrit que si l'écart dépasse une seconde ;
+- les montants sont arrondis au centime et les sommes calculées par Mongo se
+  font en centimes entiers.
+
+TRANSACTION_FORMAT fixe la phase du déploiement :
+- legacy (défaut) : comportement historique, aucune traduction ;
+- mixed : écritures au format compact, lectures des deux formats (pendant la migration) ;
+- compact : tout est au format compact (après migration complète).
+Revenir à legacy suppose `migrate --to legacy` au préalable.
+
+TransactionCollection enveloppe la collection Motor : requêtes, mises à jour,
+tris, index et pipelines sont traduits, et les documents lus sont toujours
+renvoyés au format historique. Le reste du code ne connaît qu'un format.
+
+    python compact.py stats
+    python compact.py migrate [--to compact|legacy] [--collection transactions] [--restart] [--pause 0.05]
+    python compact.py finalize     # supprime les index historiques une fois tout migré
+"""
+import argparse
+import asyncio
+import heapq
+import logging
+import math
+import os
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from bson import Binary, ObjectId
+from bson.binary import UUID_SUBTYPE
+from pymongo import ReplaceOne
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("legacy", "mixed", "compact")
+TRANSACTION_FORMAT = os.getenv("TRANSACTION_FORMAT", "legacy")
+if TRANSACTION_FORMAT not in FORMATS:
+    raise ValueError(f"TRANSACTION_FORMAT invalide : {TRANSACTION_FORMAT}")
+MIGRATION_BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "1000"))
+COLLECTIONS = ("transactions", "transactions_archive")
+
+FIELDS = {
+    "id": "i", "user_id": "u", "date": "d", "amount": "a", "type": "t",
+    "description": "l", "category_id": "c", "subcategory_id": "s", "created_at": "k",
+}
+LEGACY_FIELDS = {short: name for name, short in FIELDS.items()}
+UUID_FIELDS = {"id", "user_id", "category_id", "subcategory_id"}
+MARKER = "i"  # présent uniquement dans les documents compacts
+COMPARISONS = ("$gt", "$gte", "$lt", "$lte")
+
+
+# --- Valeurs ---
+
+def to_uuid(value):
+    """Chaîne UUID -> Binary (sous-type 4) ; toute autre valeur est laissée telle quelle."""
+    if isinstance(value, str):
+        try:
+            return Binary(uuid.UUID(value).bytes, UUID_SUBTYPE)
+        except ValueError:
+            return value
+    return value
+
+
+def from_uuid(value):
+    if isinstance(value, Binary) and value.subtype == UUID_SUBTYPE:
+        return str(uuid.UUID(bytes=bytes(value)))
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+
+def to_cents(amount) -> int:
+    return round(amount * 100)
+
+
+def _utc(dt: datetime) -> datetime:
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+# --- Documents ---
+
+def encode(doc: dict) -> dict:
+    """Document historique -> document compact (un document déjà compact est renvoyé tel quel)."""
+    if MARKER in doc:
+        return doc
+    out = {"_id": doc.get("_id") or ObjectId()}
+    for name, value in doc.items():
+        if name == "_id" or value is None:
+            continue
+        short = FIELDS.get(name)
+        if short is None:
+            out[name] = value
+        elif name in UUID_FIELDS:
+            out[short] = to_uuid(value)
+        elif name == "amount":
+            out[short] = to_cents(value)
+        elif name == "created_at":
+            if not isinstance(out["_id"], ObjectId) or abs((_utc(value) - out["_id"].generation_time).total_seconds()) >= 1:
+                out[short] = value
+        else:
+            out[short] = value
+    return out
+
+
+def _uuid_string(value):
+    if type(value) is Binary and value.subtype == UUID_SUBTYPE:
+        h = value.hex()
+        return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+    return from_uuid(value)
+
+
+_references: Dict[Any, str] = {}
+
+
+def _reference(value):
+    """user_id / category_id / subcategory_id : peu de valeurs distinctes, décodage mémorisé."""
+    if value is None:
+        return None
+    text = _references.get(value)
+    if text is None:
+        if len(_references) >= 65536:
+            _references.clear()
+        text = _references[value] = _uuid_string(value)
+    return text
+
+
+KNOWN_KEYS = frozenset(LEGACY_FIELDS) | {"_id"}
+
+
+def decode(doc: dict) -> dict:
+    """Document compact -> document historique (un document historique est renvoyé tel quel)."""
+    if MARKER not in doc:
+        return doc
+    get = doc.get
+    _id, amount, created_at = get("_id"), get("a"), get("k")
+    if created_at is None and type(_id) is ObjectId:
+        created_at = _id.generation_time.replace(tzinfo=None)
+    out = {
+        "_id": _id, "id": _uuid_string(doc["i"]), "user_id": _reference(get("u")), "date": get("d"),
+        "amount": amount / 100 if amount is not None else None, "type": get("t"), "description": get("l"),
+        "category_id": _reference(get("c")), "subcategory_id": _reference(get("s")), "created_at": created_at,
+    }
+    if _id is None:
+        del out["_id"]
+    if not doc.keys() <= KNOWN_KEYS:
+        for key in doc.keys() - KNOWN_KEYS:
+            out[key] = doc[key]
+    return out
+
+
+def decode_values(value):
+    """Résultats d'agrégation : UUID binaires -> chaînes, récursivement."""
+    if isinstance(value, dict):
+        return {k: decode_values(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [decode_values(v) for v in value]
+    return from_uuid(value)
+
+
+# --- Requêtes et mises à jour ---
+
+def _cents_bound(value, op: str) -> int:
+    """Borne en centimes entiers équivalente à `amount <op> value` (a est entier).
+
+    100 * value est d'abord arrondi à 1e-6 près : 0.57 * 100 = 56.99999999999999
+    doit donner 57, pas 56.
+    """
+    scaled = round(value * 100, 6)
+    return math.floor(scaled) if op in ("$lte", "$gt") else math.ceil(scaled)
+
+
+def _encode_value(name: str, value, op: Optional[str] = None):
+    if value is None:
+        return None
+    if name in UUID_FIELDS:
+        return to_uuid(value)
+    if name == "amount" and isinstance(value, (int, float)):
+        return _cents_bound(value, op) if op in COMPARISONS else to_cents(value)
+    return value
+
+
+def _encode_condition(name: str, condition):
+    if isinstance(condition, dict) and condition and all(k.startswith("$") for k in condition):
+        out = {}
+        for op, value in condition.items():
+            if op in ("$in", "$nin"):
+                out[op] = [_encode_value(name, v) for v in value]
+            elif op in ("$eq", "$ne") + COMPARISONS:
+                out[op] = _encode_value(name, value, op)
+            else:
+                out[op] = value
+        return out
+    return _encode_value(name, condition)
+
+
+def encode_query(query: Optional[dict]) -> dict:
+    out = {}
+    for key, value in (query or {}).items():
+        if key in ("$or", "$and", "$nor"):
+            out[key] = [encode_query(q) for q in value]
+        elif key in FIELDS:
+            out[FIELDS[key]] = _encode_condition(key, value)
+        else:
+            out[key] = value
+    return out
+
+
+def _restrict(query: dict, compact: bool) -> dict:
+    """Limite la requête aux documents d'un seul format."""
+    marker = {MARKER: {"$exists": compact}}
+    if MARKER in query:
+        return {"$and": [query, marker]}
+    return {**query, **marker}
+
+
+def encode_update(update: dict) -> dict:
+    out: Dict[str, dict] = {}
+    for op, fields in update.items():
+        for name, value in fields.items():
+            short = FIELDS.get(name, name)
+            if op == "$set" and value is None:
+                # Format compact : un champ à None est absent
+                out.setdefault("$unset", {})[short] = ""
+            elif op == "$set":
+                out.setdefault("$set", {})[short] = _encode_value(name, value)
+            else:
+                out.setdefault(op, {})[short] = value
+    return out
+
+
+def _encode_keys(keys):
+    return [(FIELDS.get(name, name), direction) for name, direction in keys]
+
+
+def _normalize_stage(mode: str) -> dict:
+    """Étape qui reconstruit les champs historiques (montants en centimes dans `_cents`)."""
+    fields = {}
+    for name in ("user_id", "date", "type", "description", "category_id", "subcategory_id"):
+        short = "$" + FIELDS[name]
+        fields[name] = short if mode == "compact" else {"$ifNull": ["$" + name, short]}
+    fields["_cents"] = "$a" if mode == "compact" else {"$ifNull": ["$a", {"$round": [{"$multiply": ["$amount", 100]}, 0]}]}
+    fields["amount"] = {"$divide": ["$_cents", 100]}
+    return {"$addFields": fields}
+
+
+def _sum_in_cents(stage: dict) -> List[dict]:
+    """$group sommant `$amount` -> somme entière de `$_cents`, puis conversion en euros."""
+    group = dict(stage["$group"])
+    converted = {}
+    for name, accumulator in group.items():
+        if accumulator == {"$sum": "$amount"}:
+            group[name] = {"$sum": "$_cents"}
+            converted[name] = {"$divide": ["$" + name, 100]}
+    if not converted:
+        return [stage]
+    return [{"$group": group}, {"$addFields": converted}]
+
+
+# --- Curseurs ---
+
+def _sort_value(value):
+    # Ordre de Mongo : les valeurs absentes (None) d'abord
+    return (value is not None, value)
+
+
+class _Descending:
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+async def _iterate(items):
+    for item in items:
+        yield item
+
+
+async def _decoded(cursor):
+    async for doc in cursor:
+        yield decode(doc)
+
+
+async def merge_sorted(sources, key, reverse: bool = False):
+    """Fusion k-voies de flux asynchrones déjà triés selon `key`, sans les charger en mémoire."""
+    iterators = [source.__aiter__() for source in sources]
+    heap = []
+
+    async def advance(index):
+        try:
+            item = await iterators[index].__anext__()
+        except StopAsyncIteration:
+            return
+        value = key(item)
+        heapq.heappush(heap, (_Descending(value) if reverse else value, index, item))
+
+    for index in range(len(iterators)):
+        await advance(index)
+    while heap:
+        _, index, item = heapq.heappop(heap)
+        yield item
+        await advance(index)
+
+class _Cursor:
+    """Sous-ensemble de AsyncIOMotorCursor : sort, skip, limit, batch_size, to_list, async for."""
+
+    def __init__(self, collection: "TransactionCollection", query: dict, projection: Optional[dict]):
+        self._collection = collection
+        self._query = query
+        self._projection = projection
+        self._sort: List[tuple] = []
+        self._skip = 0
+        self._limit = 0
+        self._batch_size = 0
+
+    def sort(self, key, direction=None):
+        self._sort = [(key, direction or 1)] if isinstance(key, str) else list(key)
+        return self
+
+    def skip(self, count: int):
+        self._skip = count
+        return self
+
+    def limit(self, count: int):
+        self._limit = count
+        return self
+
+    def batch_size(self, size: int):
+        self._batch_size = size
+        return self
+
+    def _split(self) -> bool:
+        # Les deux formats n'ont pas le même nom de champ de tri : une requête par format
+        return self._collection.mode == "mixed" and any(name in FIELDS for name, _ in self._sort)
+
+    def _raw_cursor(self, query: dict, sort: List[tuple], skip: int, limit: int):
+        cursor = self._collection.raw.find(query, self._collection.projection(self._projection))
+        if sort:
+            cursor = cursor.sort(sort)
+        if skip:
+            cursor = cursor.skip(skip)
+        if limit:
+            cursor = cursor.limit(limit)
+        if self._batch_size:
+            cursor = cursor.batch_size(self._batch_size)
+        return cursor
+
+    async def _merged(self):
+        """Mode mixte : les deux requêtes triées sont fusionnées au fil de l'eau."""
+        window = self._skip + self._limit if self._limit else 0
+        legacy = self._raw_cursor(_restrict(self._query, False), self._sort, 0, window)
+        compact = _decoded(self._raw_cursor(_restrict(encode_query(self._query), True), _encode_keys(self._sort), 0, window))
+        directions = {direction for _, direction in self._sort}
+        if len(directions) == 1:
+            docs = merge_sorted([legacy, compact], lambda d: tuple(_sort_value(d.get(name)) for name, _ in self._sort),
+                                reverse=directions.pop() < 0)
+        else:
+            materialized = [doc async for doc in legacy] + [doc async for doc in compact]
+            for name, direction in reversed(self._sort):
+                materialized.sort(key=lambda d: _sort_value(d.get(name)), reverse=direction < 0)
+            docs = _iterate(materialized)
+        position = 0
+        async for doc in docs:
+            position += 1
+            if position <= self._skip:
+                continue
+            yield doc
+            if self._limit and position >= window:
+                return
+
+    async def to_list(self, length: Optional[int] = None) -> List[dict]:
+        if self._split():
+            docs = []
+            async for doc in self._merged():
+                docs.append(doc)
+                if length and len(docs) >= length:
+                    break
+            return docs
+        sort = self._sort if self._collection.mode != "compact" else _encode_keys(self._sort)
+        cursor = self._raw_cursor(self._collection.read_query(self._query), sort, self._skip, self._limit)
+        return [decode(doc) for doc in await cursor.to_list(length)]
+
+    async def __aiter__(self):
+        if self._split():
+            async for doc in self._merged():
+                yield doc
+            return
+        sort = self._sort if self._collection.mode != "compact" else _encode_keys(self._sort)
+        async for doc in self._raw_cursor(self._collection.read_query(self._query), sort, self._skip, self._limit):
+            yield decode(doc)
+
+
+class _AggregationCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    async def to_list(self, length: Optional[int] = None) -> List[dict]:
+        return [decode_values(row) for row in await self._cursor.to_list(length)]
+
+    async def __aiter__(self):
+        async for row in self._cursor:
+            yield decode_values(row)
+
+
+class UpdateSummary:
+    """Résultat cumulé des deux mises à jour (une par format) en mode mixte."""
+
+    def __init__(self, *results):
+        self.matched_count = sum(r.matched_count for r in results)
+        self.modified_count = sum(r.modified_count for r in results)
+
+
+class TransactionCollection:
+    """Collection de transactions vue au format historique, quel que soit le format stocké.
+
+    Seules les méthodes traduites ci-dessous et les attributs de PASSTHROUGH
+    (sans noms de champs) sont exposés : une méthode non traduite
+    (find_one_and_update, bulk_write, distinct, watch...) appliquerait les noms
+    historiques aux documents compacts. Passer explicitement par `raw`.
+    """
+
+    PASSTHROUGH = frozenset({"name", "full_name", "database", "list_indexes", "index_information", "drop_index",
+                             "estimated_document_count"})
+
+    def __init__(self, collection, mode: str = TRANSACTION_FORMAT):
+        self.raw = collection
+        self.mode = mode
+
+    def __getattr__(self, name):
+        if name in self.PASSTHROUGH:
+            return getattr(self.raw, name)
+        raise AttributeError(f"TransactionCollection.{name} n'est pas traduit pour le format compact (utiliser .raw)")
+
+    def read_query(self, query: Optional[dict]) -> dict:
+        query = query or {}
+        if self.mode == "legacy":
+            return query
+        if self.mode == "compact":
+            return encode_query(query)
+        return {"$or": [_restrict(query, False), _restrict(encode_query(query), True)]}
+
+    def projection(self, projection: Optional[dict]) -> Optional[dict]:
+        if not projection or self.mode == "legacy":
+            return projection
+        out = {} if self.mode == "compact" else dict(projection)
+        for name, value in projection.items():
+            out[FIELDS.get(name, name)] = value
+        if any(projection.values()):
+            out[MARKER] = 1
+        return out
+
+    def _write(self, doc: dict) -> dict:
+        return doc if self.mode == "legacy" else encode(doc)
+
+    # Lectures
+
+    def find(self, query: Optional[dict] = None, projection: Optional[dict] = None, **kwargs):
+        if self.mode == "legacy":
+            return self.raw.find(query or {}, projection, **kwargs)
+        return _Cursor(self, query or {}, projection)
+
+    async def find_one(self, query: Optional[dict] = None, projection: Optional[dict] = None, **kwargs):
+        if self.mode == "legacy":
+            return await self.raw.find_one(query or {}, projection, **kwargs)
+        doc = await self.raw.find_one(self.read_query(query), self.projection(projection), **kwargs)
+        return decode(doc) if doc else doc
+
+    async def count_documents(self, query: Optional[dict] = None, **kwargs) -> int:
+        return await self.raw.count_documents(self.read_query(query), **kwargs)
+
+    def aggregate(self, pipeline: List[dict], **kwargs):
+        """Pipelines commençant par un $match, écrits avec les noms historiques.
+
+        Mode mixte : un identifiant est une chaîne dans un document historique et un
+        UUID binaire dans un document compact. Un $group sur ce champ peut donc
+        renvoyer deux lignes de même clé une fois décodée ; les appelants cumulent.
+        """
+        if self.mode == "legacy":
+            return self.raw.aggregate(pipeline, **kwargs)
+        stages = list(pipeline)
+        first = [{"$match": self.read_query(stages.pop(0)["$match"])}] if stages and "$match" in stages[0] else []
+        rewritten = first + [_normalize_stage(self.mode)]
+        for stage in stages:
+            rewritten.extend(_sum_in_cents(stage) if "$group" in stage else [stage])
+        return _AggregationCursor(self.raw.aggregate(rewritten, **kwargs))
+
+    # Écritures
+
+    async def insert_one(self, doc: dict, **kwargs):
+        stored = self._write(doc)
+        result = await self.raw.insert_one(stored, **kwargs)
+        doc.setdefault("_id", stored["_id"])
+        return result
+
+    async def insert_many(self, docs: List[dict], **kwargs):
+        stored = [self._write(doc) for doc in docs]
+        try:
+            return await self.raw.insert_many(stored, **kwargs)
+        finally:
+            for doc, written in zip(docs, stored):
+                if "_id" in written:
+                    doc.setdefault("_id", written["_id"])
+
+    async def _update(self, method: str, query: dict, update: dict, **kwargs):
+        if self.mode == "legacy":
+            return await getattr(self.raw, method)(query, update, **kwargs)
+        compact = await getattr(self.raw, method)(_restrict(encode_query(query), True), encode_update(update), **kwargs)
+        if self.mode == "compact" or (method == "update_one" and compact.matched_count):
+            return compact
+        legacy = await getattr(self.raw, method)(_restrict(query, False), update, **kwargs)
+        return UpdateSummary(compact, legacy)
+
+    async def update_one(self, query: dict, update: dict, **kwargs):
+        return await self._update("update_one", query, update, **kwargs)
+
+    async def update_many(self, query: dict, update: dict, **kwargs):
+        return await self._update("update_many", query, update, **kwargs)
+
+    async def delete_one(self, query: dict, **kwargs):
+        return await self.raw.delete_one(self.read_query(query), **kwargs)
+
+    async def delete_many(self, query: dict, **kwargs):
+        return await self.raw.delete_many(self.read_query(query), **kwargs)
+
+    async def create_index(self, keys, **kwargs):
+        """Index sur les champs historiques, dupliqué sur les champs compacts selon le mode."""
+        if self.mode != "compact":
+            await self.raw.create_index(keys, **kwargs)
+        if self.mode != "legacy":
+            await self.raw.create_index(_encode_keys(keys), **kwargs)
+
+
+# --- Migration ---
+
+def to_legacy(doc: dict) -> dict:
+    legacy = decode(doc)
+    legacy.setdefault("_id", doc["_id"])
+    return legacy
+
+
+async def migrate(database, name: str, to: str = "compact", batch_size: int = MIGRATION_BATCH_SIZE,
+                  restart: bool = False, pause: float = 0.0):
+    """Convertit la collection par lots, en ligne et reprenable ; renvoie (convertis, restants).
+
+    Chaque document est remplacé seulement s'il n'a pas changé depuis sa lecture
+    (filtre = document lu) : une écriture concurrente n'est jamais écrasée, le
+    document reste simplement à convertir. La progression (dernier _id) est
+    enregistrée dans `migrations` après chaque lot.
+    """
+    collection = database[name]
+    convert = encode if to == "compact" else to_legacy
+    pending = {MARKER: {"$exists": to != "compact"}}
+    state_id = f"{name}:{to}"
+    state = None if restart else await database.migrations.find_one({"_id": state_id})
+    last_id = state.get("last_id") if state else None
+    converted = 0
+    while True:
+        query = dict(pending)
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = await collection.find(query).sort("_id", 1).limit(batch_size).to_list(None)
+        if not batch:
+            break
+        result = await collection.bulk_write([ReplaceOne(doc, convert(doc)) for doc in batch], ordered=False)
+        converted += result.modified_count
+        last_id = batch[-1]["_id"]
+        await database.migrations.update_one(
+            {"_id": state_id},
+            {"$set": {"last_id": last_id, "updated_at": datetime.now(timezone.utc)}, "$inc": {"converted": result.modified_count}},
+            upsert=True
+        )
+        if pause:
+            await asyncio.sleep(pause)
+    remaining = await collection.count_documents(pending)
+    await database.migrations.update_one({"_id": state_id}, {"$set": {"remaining": remaining}}, upsert=True)
+    return converted, remaining
+
+
+async def collection_stats(database, name: str) -> Dict[str, Any]:
+    stats = await database.command("collStats", name)
+    return {
+        "count": stats.get("count", 0),
+        "compact": await database[name].count_documents({MARKER: {"$exists": True}}),
+        "avg_obj_size": stats.get("avgObjSize", 0),
+        "size": stats.get("size", 0),
+        "index_size": stats.get("totalIndexSize", 0),
+        "indexes": stats.get("indexSizes", {}),
+    }
+
+
+async def drop_legacy_indexes(database, name: str) -> List[str]:
+    """Supprime les index portant sur des champs historiques (refusé s'il reste des documents historiques)."""
+    collection = database[name]
+    if await collection.count_documents({MARKER: {"$exists": False}}, limit=1):
+        raise RuntimeError(f"{name} : il reste des documents au format historique")
+    dropped = []
+    async for index in collection.list_indexes():
+        if any(field in FIELDS for field in index["key"]):
+            await collection.drop_index(index["name"])
+            dropped.append(index["name"])
+    return dropped
+
+
+async def _main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="taille des collections et répartition des formats")
+    run = sub.add_parser("migrate", help="convertit les documents")
+    run.add_argument("--to", choices=("compact", "legacy"), default="compact")
+    run.add_argument("--collection", choices=COLLECTIONS, action="append", help="défaut : toutes")
+    run.add_argument("--batch-size", type=int, default=MIGRATION_BATCH_SIZE)
+    run.add_argument("--pause", type=float, default=0.0, help="pause entre deux lots (s), pour limiter la charge")
+    run.add_argument("--restart", action="store_true", help="ignore la progression enregistrée")
+    sub.add_parser("finalize", help="supprime les index historiques")
+    args = parser.parse_args()
+
+    from motor.motor_asyncio import AsyncIOMotorClient
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    database = client.budget_tracker
+
+    if args.command == "stats":
+        for name in COLLECTIONS:
+            s = await collection_stats(database, name)
+            print(f"{name} : {s['count']} documents ({s['compact']} compacts), {s['avg_obj_size']} o/doc, "
+                  f"données {s['size'] / 1e6:.1f} Mo, index {s['index_size'] / 1e6:.1f} Mo")
+            for index, size in s["indexes"].items():
+                print(f"    {index:<32}{size / 1e6:>10.1f} Mo")
+    elif args.command == "migrate":
+        for name in args.collection or COLLECTIONS:
+            converted, remaining = await migrate(database, name, args.to, args.batch_size, args.restart, args.pause)
+            print(f"{name} : {converted} documents convertis, {remaining} restants")
+            if remaining:
+                print("    (documents modifiés pendant la migration : relancer avec --restart)")
+    else:
+        for name in COLLECTIONS:
+            wrapped = TransactionCollection(database[name], "compact")
+            await wrapped.create_index([("user_id", 1), ("date", -1)])
+            print(f"{name} : index supprimés {', '.join(await drop_legacy_indexes(database, name)) or '-'}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main())
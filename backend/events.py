@@ -0,0 +1,300 @@
+"""
+Notifications en direct par utilisateur (Server-Sent Events).
+
+Les pages ne re-téléchargent plus tout : elles reçoivent de petits deltas et
+ne rechargent que ce qui a changé.
+
+    event: pending        data: {"op": "added", "item": {...}} | {"op": "removed", "id": ...}
+    event: transactions   data: {"months": ["2025-03", ...]}   (null : tous les mois)
+    event: resync         data: {}                             (événements perdus : tout recharger)
+
+Sources (EVENTS_SOURCE) :
+- `changestream` : change streams MongoDB sur `transactions`,
+  `transactions_archive` et `pending_transactions` (replica set ou mongos). Les
+  écritures de tous les workers et des outils en ligne de commande sont vues.
+  Les suppressions sont routées grâce aux pré-images (MongoDB >= 6.0, activées
+  au démarrage si les droits le permettent) ; sans pré-image, une suppression
+  ne peut pas être attribuée à un utilisateur et n'est pas notifiée ;
+- `local` : pub/sub en mémoire alimenté par les chemins d'écriture de
+  server.py (mongod autonome) ; seules les écritures du processus sont vues ;
+- `auto` (défaut) : change streams si le serveur les permet, sinon local.
+
+Authentification : EventSource n'envoie pas d'en-têtes, le jeton passe dans
+l'URL (et donc dans les journaux des proxys). Ce n'est pas le jeton d'accès
+mais un jeton de flux (`scope: events`) obtenu par POST /api/events/token,
+valable TOKEN_SECONDS pour ouvrir la connexion. Le flux s'arrête à
+l'expiration de la session d'origine et revérifie la révocation (changement
+de mot de passe) toutes les REVALIDATE_SECONDS.
+
+Chaque connexion a une file bornée : un client trop lent reçoit `resync` au
+lieu d'une file qui grossit. Les événements arrivés dans la même fenêtre
+(COALESCE_SECONDS) sont fusionnés : un import de 500 lignes donne un seul
+événement `transactions`.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from compact import decode
+from metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+EVENTS_SOURCE = os.getenv("EVENTS_SOURCE", "auto")  # auto | changestream | local
+QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "256"))
+MAX_CONNECTIONS_PER_USER = int(os.getenv("EVENTS_MAX_CONNECTIONS_PER_USER", "5"))
+HEARTBEAT_SECONDS = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", "15"))
+COALESCE_SECONDS = float(os.getenv("EVENTS_COALESCE_SECONDS", "0.25"))
+TOKEN_SECONDS = int(os.getenv("EVENTS_TOKEN_SECONDS", "60"))
+REVALIDATE_SECONDS = float(os.getenv("EVENTS_REVALIDATE_SECONDS", "30"))
+RETRY_SECONDS = 5
+WATCHED = ("transactions", "transactions_archive", "pending_transactions")
+
+SSE_CONNECTIONS = Gauge("sse_connections", "Connexions SSE ouvertes.")
+EVENTS_PUBLISHED = Counter("events_published_total", "Événements distribués aux connexions SSE.", ("event", "source"))
+
+
+def month_key(dt: datetime) -> str:
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc)
+    return f"{dt.year:04d}-{dt.month:02d}"
+
+
+def transactions_event(months: Optional[Iterable[datetime]] = None) -> dict:
+    """Transactions modifiées dans ces mois (None : portée inconnue, tout recharger)."""
+    keys = sorted({month_key(m) for m in months if m is not None}) if months is not None else None
+    return {"event": "transactions", "months": keys}
+
+
+def pending_added(doc: dict) -> dict:
+    item = {k: doc.get(k) for k in ("id", "amount", "merchant", "date", "created_at", "category_id", "subcategory_id", "confidence")}
+    return {"event": "pending", "op": "added", "item": item}
+
+
+def pending_removed(pending_id: str) -> dict:
+    return {"event": "pending", "op": "removed", "id": pending_id}
+
+
+RESYNC = {"event": "resync"}
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def format_sse(event: dict) -> bytes:
+    data = {k: v for k, v in event.items() if k != "event"}
+    return f"event: {event['event']}\ndata: {json.dumps(data, default=_default)}\n\n".encode("utf-8")
+
+
+def coalesce(events: List[dict]) -> List[dict]:
+    """Fusionne les événements `transactions` ; `resync` remplace tout le reste."""
+    if any(e["event"] == "resync" for e in events):
+        return [RESYNC]
+    out, months, changed = [], set(), False
+    for event in events:
+        if event["event"] != "transactions":
+            out.append(event)
+            continue
+        changed = True
+        if months is not None:
+            months = None if event["months"] is None else months | set(event["months"])
+    if changed:
+        out.append({"event": "transactions", "months": None if months is None else sorted(months)})
+    return out
+
+
+class Subscription:
+    def __init__(self, hub: "EventHub", user_id: str):
+        self.hub = hub
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(QUEUE_SIZE)
+
+    def put(self, event: dict):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Client trop lent : on vide la file et il rechargera tout
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+
+    async def next(self, timeout: float) -> List[dict]:
+        """Événements fusionnés, [] si rien n'est arrivé avant `timeout`."""
+        try:
+            first = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        await asyncio.sleep(COALESCE_SECONDS)
+        events = [first]
+        while not self.queue.empty():
+            events.append(self.queue.get_nowait())
+        return coalesce(events)
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class TooManyConnections(Exception):
+    pass
+
+
+class EventHub:
+    def __init__(self):
+        self.source = "local"
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._pre_images = False
+
+    def subscribe(self, user_id: str) -> Subscription:
+        subscribers = self._subscribers.setdefault(user_id, set())
+        if len(subscribers) >= MAX_CONNECTIONS_PER_USER:
+            raise TooManyConnections(user_id)
+        subscription = Subscription(self, user_id)
+        subscribers.add(subscription)
+        SSE_CONNECTIONS.inc()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.user_id)
+        if subscribers and subscription in subscribers:
+            subscribers.discard(subscription)
+            SSE_CONNECTIONS.dec()
+            if not subscribers:
+                del self._subscribers[subscription.user_id]
+
+    def publish(self, user_id: str, event: dict):
+        """Distribue l'événement aux connexions de l'utilisateur dans ce processus."""
+        for subscription in self._subscribers.get(user_id, ()):
+            subscription.put(event)
+            EVENTS_PUBLISHED.inc(event["event"], self.source)
+
+    def notify(self, user_id: str, event: dict):
+        """Appelé après une écriture ; sans effet quand les change streams font foi."""
+        if self.source == "local":
+            self.publish(user_id, event)
+
+    def broadcast(self, event: dict):
+        for user_id in list(self._subscribers):
+            self.publish(user_id, event)
+
+    # --- Change streams ---
+
+    async def start(self, database):
+        if EVENTS_SOURCE == "local" or (EVENTS_SOURCE == "auto" and not await supports_change_streams(database)):
+            logger.info("Événements en direct : pub/sub en mémoire")
+            return
+        self._pre_images = await enable_pre_images(database)
+        self.source = "changestream"
+        self._task = asyncio.create_task(self._watch(database))
+        logger.info("Événements en direct : change streams MongoDB")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _watch(self, database):
+        pipeline = [{"$match": {
+            "ns.coll": {"$in": list(WATCHED)},
+            "operationType": {"$in": ["insert", "update", "replace", "delete"]},
+        }}]
+        resume_after = None
+        while True:
+            try:
+                async with database.watch(
+                    pipeline, full_document="updateLookup", full_document_before_change="whenAvailable" if self._pre_images else None,
+                    resume_after=resume_after,
+                ) as stream:
+                    async for change in stream:
+                        resume_after = stream.resume_token
+                        for user_id, event in change_events(change):
+                            self.publish(user_id, event)
+            except asyncio.CancelledError:
+                raise
+            except PyMongoError as e:
+                logger.warning(f"Change stream interrompu ({e}), reprise dans {RETRY_SECONDS}s")
+                if isinstance(e, OperationFailure) and resume_after is not None:
+                    # Jeton de reprise inutilisable (oplog dépassé...) : événements perdus
+                    resume_after = None
+                    self.broadcast(RESYNC)
+                await asyncio.sleep(RETRY_SECONDS)
+
+
+async def supports_change_streams(database) -> bool:
+    try:
+        hello = await database.client.admin.command("hello")
+    except PyMongoError:
+        return False
+    return bool(hello.get("setName")) or hello.get("msg") == "isdbgrid"
+
+
+async def enable_pre_images(database) -> bool:
+    """Active les pré-images des collections suivies ; False si aucune ne les a (serveur < 6.0, droits)."""
+    enabled = False
+    for name in WATCHED:
+        try:
+            await database.command("collMod", name, changeStreamPreAndPostImages={"enabled": True})
+            enabled = True
+        except PyMongoError as e:
+            logger.warning(f"Pré-images indisponibles pour {name} ({e}) : ses suppressions ne seront pas notifiées")
+    return enabled
+
+
+def change_events(change: dict) -> List[tuple]:
+    """[(user_id, événement)] pour un événement de change stream."""
+    collection = change["ns"]["coll"]
+    after = change.get("fullDocument")
+    before = change.get("fullDocumentBeforeChange")
+    if collection == "pending_transactions":
+        if change["operationType"] == "insert" and after:
+            return [(after["user_id"], pending_added(after))]
+        if change["operationType"] == "delete" and before:
+            return [(before["user_id"], pending_removed(before["id"]))]
+        return []
+    # Transactions (format historique ou compact, voir compact.py)
+    docs = [decode(d) for d in (before, after) if d]
+    by_user: Dict[str, list] = {}
+    for doc in docs:
+        if doc.get("user_id"):
+            by_user.setdefault(doc["user_id"], []).append(doc.get("date"))
+    return [(user_id, transactions_event(dates)) for user_id, dates in by_user.items()]
+
+
+async def sse_stream(subscription: Subscription, is_disconnected: Callable[[], Awaitable[bool]],
+                     expires_at: Optional[float] = None, still_valid: Optional[Callable[[], Awaitable[bool]]] = None):
+    """Flux text/event-stream de la connexion ; s'arrête à l'expiration de la session ou à sa révocation."""
+    try:
+        yield b"retry: 5000\n\n"
+        checked_at = time.monotonic()
+        while True:
+            if expires_at is not None and time.time() >= expires_at:
+                return
+            if still_valid is not None and time.monotonic() - checked_at >= REVALIDATE_SECONDS:
+                if not await still_valid():
+                    return
+                checked_at = time.monotonic()
+            events = await subscription.next(HEARTBEAT_SECONDS)
+            if await is_disconnected():
+                return
+            if not events:
+                yield b": ping\n\n"
+            for event in events:
+                yield format_sse(event)
+    finally:
+        subscription.close()
+
+
+hub = EventHub()
@@ -0,0 +1,197 @@
+"""
+Export des transactions en CSV ou XLSX, en flux.
+
+Les transactions arrivent d'un curseur Motor lu par lots et sont converties au
+fil de l'eau : la mémoire reste constante quelle que soit la taille de
+l'historique et les premiers octets partent dès le premier lot.
+
+- CSV : compressé en gzip à la volée (zlib, wbits=31) quand le client
+  l'accepte ; l'en-tête puis le premier lot sont vidés (Z_SYNC_FLUSH) pour être
+  livrés aussitôt. Les textes commençant par =, +, -, @ (formules pour un
+  tableur) sont préfixés d'une apostrophe.
+- XLSX : archive zip écrite en flux (descripteurs de données, pas de
+  fichier temporaire), chaînes en ligne (pas de table partagée à construire).
+"""
+import csv
+import io
+import os
+import re
+import zipfile
+import zlib
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, Optional
+from xml.sax.saxutils import escape
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+GZIP_LEVEL = 6
+
+HEADER = ["Date", "Type", "Montant", "Description", "Catégorie", "Sous-catégorie"]
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+MEDIA_TYPES = {
+    "csv": "text/csv",  # charset ajouté par Starlette
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def row(t: dict, categories: Dict[str, str], subcategories: Dict[str, str]) -> list:
+    return [
+        t["date"], t["type"], t["amount"], t.get("description") or "",
+        categories.get(t.get("category_id"), ""), subcategories.get(t.get("subcategory_id"), ""),
+    ]
+
+
+def csv_cell(value):
+    """Neutralise une cellule texte qu'un tableur interpréterait comme une formule."""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def filename(fmt: str, now: Optional[datetime] = None) -> str:
+    return f"transactions-{(now or datetime.now(timezone.utc)):%Y%m%d}.{fmt}"
+
+
+# --- CSV ---
+
+async def csv_stream(transactions, categories: Dict[str, str], subcategories: Dict[str, str],
+                     compress: bool = False) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    gzip = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31) if compress else None
+
+    def drain(mode: Optional[int] = None) -> bytes:
+        data = buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+        if gzip is None:
+            return data
+        return gzip.compress(data) + (gzip.flush(mode) if mode is not None else b"")
+
+    buffer.write("\ufeff")  # BOM : Excel détecte l'UTF-8
+    writer.writerow(HEADER)
+    yield drain(zlib.Z_SYNC_FLUSH)
+    count = 0
+    async for t in transactions:
+        values = [csv_cell(v) for v in row(t, categories, subcategories)]
+        values[0] = values[0].strftime("%Y-%m-%d")
+        writer.writerow(values)
+        count += 1
+        if count % EXPORT_BATCH_SIZE == 0:
+            chunk = drain(zlib.Z_SYNC_FLUSH if count == EXPORT_BATCH_SIZE else None)
+            if chunk:
+                yield chunk
+    yield drain(zlib.Z_FINISH)
+
+
+# --- XLSX ---
+
+XLSX_STATIC = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Transactions" sheetId="1" r:id="rId1"/></sheets></workbook>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+        '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+        '</Relationships>'
+    ),
+    # Styles : 0 = défaut, 1 = date (format 14), 2 = montant (format 4, « #,##0.00 »)
+    "xl/styles.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>'
+        '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        '<cellXfs count="3"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        '<xf numFmtId="14" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+        '<xf numFmtId="4" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>'
+        '</styleSheet>'
+    ),
+}
+SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<cols><col min="1" max="1" width="12" customWidth="1"/><col min="4" max="4" width="40" customWidth="1"/></cols>'
+    '<sheetData>'
+)
+SHEET_END = '</sheetData></worksheet>'
+EXCEL_EPOCH = datetime(1899, 12, 30)
+_ILLEGAL_XML = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def _text(value: str) -> str:
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(_ILLEGAL_XML.sub("", value))}</t></is></c>'
+
+
+def _xlsx_row(values: list) -> str:
+    date, kind, amount, description, category, subcategory = values
+    if date.tzinfo is not None:
+        date = date.astimezone(timezone.utc).replace(tzinfo=None)
+    serial = (date - EXCEL_EPOCH).total_seconds() / 86400
+    return (f'<row><c s="1"><v>{serial:.6f}</v></c>{_text(kind)}<c s="2"><v>{amount!r}</v></c>'
+            f'{_text(description)}{_text(category)}{_text(subcategory)}</row>')
+
+
+class _Pipe(io.RawIOBase):
+    """Destination non « seekable » de ZipFile : les octets écrits sont récupérés par drain()."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+async def xlsx_stream(transactions, categories: Dict[str, str], subcategories: Dict[str, str]) -> AsyncIterator[bytes]:
+    pipe = _Pipe()
+    archive = zipfile.ZipFile(pipe, "w", zipfile.ZIP_DEFLATED)
+    for name, content in XLSX_STATIC.items():
+        archive.writestr(name, content)
+    yield pipe.drain()
+    sheet = archive.open("xl/worksheets/sheet1.xml", "w", force_zip64=True)
+    parts = [SHEET_START, "<row>", "".join(_text(h) for h in HEADER), "</row>"]
+    count = 0
+    async for t in transactions:
+        parts.append(_xlsx_row(row(t, categories, subcategories)))
+        count += 1
+        if count % EXPORT_BATCH_SIZE == 0:
+            sheet.write("".join(parts).encode("utf-8"))
+            parts.clear()
+            chunk = pipe.drain()
+            if chunk:
+                yield chunk
+    parts.append(SHEET_END)
+    sheet.write("".join(parts).encode("utf-8"))
+    sheet.close()
+    archive.close()
+    yield pipe.drain()
@@ -0,0 +1,77 @@
+"""
+Cache des revendications (claims) des JWT déjà vérifiés.
+
+Le même jeton d'accès (valable 7 jours) est présenté à chaque requête : on
+garde, par empreinte SHA-256 du jeton, les claims décodés jusqu'à leur `exp`.
+Seuls les jetons dont la signature a été vérifiée sont mis en cache.
+
+Le cache est local au processus. La révocation (changement de mot de passe)
+repose sur le compteur `token_generation` de l'utilisateur comparé au claim
+`gen` du jeton (server.issued_before_revocation) :
+`revoke()` ne fait que libérer les entrées du sujet dans ce processus.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+
+from metrics import JWT_CACHE
+
+JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", "4096"))
+
+
+class ClaimsCache:
+    """LRU borné : empreinte du jeton -> (claims, exp)."""
+
+    def __init__(self, maxsize: int = JWT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def decode(self, token: str, verify: Callable[[str], dict]) -> dict:
+        """Claims du jeton (à ne pas modifier) ; `verify` n'est appelé qu'en cas d'absence.
+
+        Les erreurs de `verify` (signature, expiration...) sont propagées et rien n'est mis en cache.
+        """
+        if self.maxsize <= 0:
+            return verify(token)
+        key = self._key(token)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(key)
+                    JWT_CACHE.inc("hit")
+                    return entry[0]
+                del self._entries[key]
+        JWT_CACHE.inc("miss")
+        claims = verify(token)
+        exp = claims.get("exp")
+        if isinstance(exp, (int, float)) and exp > now:
+            with self._lock:
+                self._entries[key] = (claims, exp)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return claims
+
+    def revoke(self, subject: str) -> int:
+        """Retire les jetons du sujet (`sub`) de ce processus ; renvoie le nombre d'entrées retirées."""
+        with self._lock:
+            keys = [k for k, (claims, _exp) in self._entries.items() if claims.get("sub") == subject]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,111 @@
+"""
+Envoi d'e-mails transactionnels via Resend.
+
+Le SDK `resend` n'est importé qu'au premier envoi : la plupart des requêtes
+n'envoient jamais d'e-mail et n'ont pas à payer son import au démarrage.
+"""
+import os
+import logging
+
+from fastapi import HTTPException
+
+from metrics import EMAILS_SENT
+
+logger = logging.getLogger(__name__)
+
+_resend_module = None
+
+def _resend():
+    global _resend_module
+    if _resend_module is None:
+        import resend
+        _resend_module = resend
+    return _resend_module
+
+def send_verification_email(email: str, token: str):
+    frontend_url = os.getenv("FRONTEND_URL")
+    sender_email = os.getenv("SENDER_EMAIL")
+    resend_api_key = os.getenv("RESEND_API_KEY")
+
+    if not all([frontend_url, sender_email, resend_api_key]):
+        logger.error("CONFIG RESEND MANQUANTE : Vérifiez FRONTEND_URL, SENDER_EMAIL, RESEND_API_KEY")
+        raise HTTPException(status_code=500, detail="Email service is not configured.")
+
+    resend = _resend()
+    resend.api_key = resend_api_key
+    verification_link = f"{frontend_url}/verify-email?token={token}"
+    
+    html_content = f"""
+        <div style="font-family: Arial, sans-serif; line-height: 1.6; max-width: 600px; margin: auto; padding: 20px; border: 1px solid #ddd; border-radius: 10px;">
+            <h2 style="color: #333;">Bienvenue sur Budget Tracker !</h2>
+            <p>Merci de vous être inscrit. Pour finaliser la création de votre compte, veuillez cliquer sur le bouton ci-dessous :</p>
+            <p style="text-align: center; margin: 25px 0;">
+                <a href="{verification_link}" 
+                    style="background-color: #0d6efd; color: white; padding: 12px 25px; text-decoration: none; border-radius: 5px; display: inline-block; font-weight: bold;">
+                    Vérifier mon compte
+                </a>
+            </p>
+            <p>Ce lien est valide pendant 24 heures.</p>
+            <p style="font-size: 0.9em; color: #777;">Si vous n'avez pas créé ce compte, vous pouvez ignorer cet e-mail en toute sécurité.</p>
+        </div>
+    """
+
+    params = {
+        "from": f"Budget Tracker <{sender_email}>",
+        "to": [email],
+        "subject": "Budget Tracker - Vérifiez votre adresse e-mail",
+        "html": html_content,
+    }
+
+    try:
+        response = resend.Emails.send(params)
+        EMAILS_SENT.inc("verification", "success")
+        logger.info(f"Email Resend envoyé à {email}. Response: {response}")
+        return response
+    except Exception as e:
+        EMAILS_SENT.inc("verification", "failure")
+        logger.error(f"Erreur Resend lors de l'envoi de l'e-mail: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to send verification email.")
+
+def send_password_reset_email(email: str, token: str, expire_minutes: int):
+    frontend_url = os.getenv("FRONTEND_URL")
+    sender_email = os.getenv("SENDER_EMAIL")
+    resend_api_key = os.getenv("RESEND_API_KEY")
+
+    if not all([frontend_url, sender_email, resend_api_key]):
+        logger.error("Variables Resend manquantes pour Reset Password")
+        raise HTTPException(status_code=500, detail="Email service is not configured.")
+
+    resend = _resend()
+    resend.api_key = resend_api_key
+    reset_link = f"{frontend_url}/reset-password?token={token}"
+    
+    html_content = f"""
+        <div style="font-family: Arial, sans-serif; line-height: 1.6; max-width: 600px; margin: auto; padding: 20px; border: 1px solid #ddd; border-radius: 10px;">
+            <h2 style="color: #333;">Réinitialisation de mot de passe</h2>
+            <p>Vous avez demandé à réinitialiser votre mot de passe pour Budget Tracker. Cliquez sur le bouton ci-dessous pour continuer :</p>
+            <p style="text-align: center; margin: 25px 0;">
+                <a href="{reset_link}" style="background-color: #dc3545; color: white; padding: 12px 25px; text-decoration: none; border-radius: 5px; display: inline-block; font-weight: bold;">
+                    Réinitialiser mon mot de passe
+                </a>
+            </p>
+            <p>Ce lien est valide pendant {expire_minutes} minutes.</p>
+            <p style="font-size: 0.9em; color: #777;">Si vous n'êtes pas à l'origine de cette demande, vous pouvez ignorer cet e-mail.</p>
+        </div>
+    """
+
+    params = {
+        "from": f"Budget Tracker <{sender_email}>",
+        "to": [email],
+        "subject": "Budget Tracker - Réinitialisation de votre mot de passe",
+        "html": html_content,
+    }
+
+    try:
+        response = resend.Emails.send(params)
+        EMAILS_SENT.inc("password_reset", "success")
+        logger.info(f"Email Reset Resend envoyé à {email}. Response: {response}")
+    except Exception as e:
+        EMAILS_SENT.inc("password_reset", "failure")
+        logger.error(f"Erreur critique lors de l'envoi de l'e-mail de réinitialisation: {e}")
+        raise HTTPException(status_code=500, detail="Failed to send password reset email.")
@@ -0,0 +1,155 @@
+"""
+Catégorisation automatique : index marchand -> catégorie appris sur l'historique.
+
+Pour chaque utilisateur, les transactions déjà catégorisées donnent, par
+libellé normalisé, le nombre d'occurrences de chaque couple (catégorie,
+sous-catégorie). La suggestion est le couple le plus fréquent, avec une
+confiance `n / (total + 1)` : une seule occurrence donne 0.5, trois
+occurrences concordantes 0.75.
+
+Les index sont construits à la première demande (une agrégation sur la
+collection chaude), gardés en mémoire dans un LRU par utilisateur, puis tenus à
+jour à chaque écriture (learn / forget) : une suggestion coûte une
+recherche dans un dict. Les index sont par processus ; le TTL borne l'écart
+avec les écritures faites ailleurs (autres workers, outils en ligne de commande).
+"""
+import os
+import re
+import unicodedata
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from cache import LRUCache
+
+MERCHANT_INDEX_USERS = int(os.getenv("MERCHANT_INDEX_USERS", "1000"))
+MERCHANT_INDEX_TTL = int(os.getenv("MERCHANT_INDEX_TTL", "3600"))
+MIN_CONFIDENCE = float(os.getenv("MERCHANT_MIN_CONFIDENCE", "0.6"))
+KEY_TOKENS = 3
+
+# Préfixes et mentions bancaires sans valeur pour reconnaître le marchand
+NOISE = frozenset({
+    "cb", "carte", "paiement", "par", "achat", "prlv", "prelevement", "sepa", "vir", "virement",
+    "recu", "emis", "facture", "fact", "du", "le", "la", "les", "de", "des", "www", "com", "fr",
+})
+_SEPARATORS = re.compile(r"[^a-z0-9]+")
+
+
+class Suggestion(NamedTuple):
+    category_id: str
+    subcategory_id: Optional[str]
+    confidence: float
+
+
+def normalize(description: Optional[str]) -> Optional[str]:
+    """« CB CARREFOUR MARKET 12/03 CARTE 4974XX » -> « carrefour market »."""
+    if not description:
+        return None
+    text = unicodedata.normalize("NFKD", description).encode("ascii", "ignore").decode("ascii").lower()
+    tokens = [t for t in _SEPARATORS.split(text) if t and t not in NOISE and not any(c.isdigit() for c in t)]
+    return " ".join(tokens[:KEY_TOKENS]) or None
+
+
+def _prefixes(key: str) -> List[str]:
+    """« carrefour market paris » -> [« carrefour », « carrefour market », « carrefour market paris »]."""
+    tokens = key.split(" ")
+    return [" ".join(tokens[:n]) for n in range(1, len(tokens) + 1)]
+
+
+class MerchantIndex:
+    """Préfixe du libellé normalisé -> {(catégorie, sous-catégorie): occurrences}.
+
+    Chaque préfixe (1 à KEY_TOKENS mots) est compté : « amazon prime video »
+    se rabat sur « amazon prime », puis sur « amazon ».
+    """
+
+    def __init__(self):
+        self._prefixes: Dict[str, Dict[Tuple[str, Optional[str]], int]] = {}
+
+    def learn(self, description: Optional[str], category_id: Optional[str], subcategory_id: Optional[str] = None,
+              weight: int = 1):
+        key = normalize(description)
+        if key is None or not category_id:
+            return
+        target = (category_id, subcategory_id)
+        for prefix in _prefixes(key):
+            counts = self._prefixes.setdefault(prefix, {})
+            count = counts.get(target, 0) + weight
+            if count > 0:
+                counts[target] = count
+            else:
+                counts.pop(target, None)
+                if not counts:
+                    del self._prefixes[prefix]
+
+    def forget(self, description: Optional[str], category_id: Optional[str], subcategory_id: Optional[str] = None):
+        self.learn(description, category_id, subcategory_id, weight=-1)
+
+    def lookup(self, description: Optional[str]) -> Optional[Suggestion]:
+        key = normalize(description)
+        if key is None:
+            return None
+        counts = None
+        for prefix in reversed(_prefixes(key)):
+            counts = self._prefixes.get(prefix)
+            if counts:
+                break
+        if not counts:
+            return None
+        (category_id, subcategory_id), best = max(counts.items(), key=lambda item: item[1])
+        return Suggestion(category_id, subcategory_id, best / (sum(counts.values()) + 1))
+
+    def apply(self, rows: Iterable[dict], min_confidence: float = MIN_CONFIDENCE) -> int:
+        """Complète les lignes sans catégorie ; renvoie le nombre de lignes catégorisées."""
+        applied = 0
+        for row in rows:
+            if row.get("category_id"):
+                continue
+            suggestion = self.lookup(row.get("description"))
+            if suggestion and suggestion.confidence >= min_confidence:
+                row["category_id"], row["subcategory_id"] = suggestion.category_id, suggestion.subcategory_id
+                applied += 1
+        return applied
+
+    def __len__(self):
+        return len(self._prefixes)
+
+
+class MerchantIndexes:
+    def __init__(self, maxsize: int = MERCHANT_INDEX_USERS, ttl: Optional[float] = MERCHANT_INDEX_TTL):
+        self._cache = LRUCache("merchants", maxsize, ttl=ttl)
+
+    async def get(self, transactions, user_id: str) -> MerchantIndex:
+        """Index de l'utilisateur, construit depuis `transactions` s'il n'est pas en mémoire."""
+        index = self._cache.get(user_id)
+        if index is None:
+            index = await build(transactions, user_id)
+            self._cache.set(user_id, index)
+        return index
+
+    def learn(self, user_id: str, description: Optional[str], category_id: Optional[str],
+              subcategory_id: Optional[str] = None, weight: int = 1):
+        """Mise à jour incrémentale (sans effet si l'index n'est pas en mémoire)."""
+        index = self._cache.get(user_id)
+        if index is not None:
+            index.learn(description, category_id, subcategory_id, weight)
+
+    def forget(self, user_id: str, description: Optional[str], category_id: Optional[str],
+               subcategory_id: Optional[str] = None):
+        self.learn(user_id, description, category_id, subcategory_id, weight=-1)
+
+    def invalidate(self, user_id: str):
+        self._cache.delete(user_id)
+
+
+async def build(transactions, user_id: str) -> MerchantIndex:
+    index = MerchantIndex()
+    rows = transactions.aggregate([
+        {"$match": {"user_id": user_id, "category_id": {"$ne": None}, "description": {"$nin": [None, ""]}}},
+        {"$group": {
+            "_id": {"description": "$description", "category_id": "$category_id", "subcategory_id": "$subcategory_id"},
+            "count": {"$sum": 1},
+        }},
+    ])
+    async for row in rows:
+        g = row["_id"]
+        index.learn(g["description"], g["category_id"], g.get("subcategory_id"), weight=row["count"])
+    return index
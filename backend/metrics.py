@@ -0,0 +1,203 @@
+"""
+Métriques au format d'exposition texte Prometheus (sans dépendance externe).
+
+Les métriques sont par processus : avec plusieurs workers uvicorn, chaque
+worker expose les siennes (label `worker` = pid), à agréger côté Prometheus.
+
+Sources :
+- `MetricsMiddleware` (ASGI) : latence et nombre de requêtes par route ;
+- `MetricsRoute` : requêtes en cours par route ;
+- `MongoCommandListener` (pymongo) : durée des commandes par collection et par commande ;
+- compteurs applicatifs : rejets du rate limiter, relevés analysés, appels Gemini, e-mails envoyés,
+  caches (JWT, résultats), calculs regroupés, formats de réponse, routage des lectures analytiques.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, Tuple
+
+from fastapi.routing import APIRoute
+from pymongo import monitoring
+
+WORKER = str(os.getpid())
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    pairs.append(f'worker="{WORKER}"')
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labelvalues: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def value(self, *labelvalues: str) -> float:
+        return self._values.get(labelvalues, 0.0)
+
+    def expose(self):
+        lines = self._header()
+        for labelvalues, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labelvalues)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labelvalues: str, amount: float = 1.0):
+        self.inc(*labelvalues, amount=-amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labelvalues: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labelvalues)
+            if state is None:
+                # [compteurs par bucket (non cumulés), somme, total]
+                state = self._values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def expose(self):
+        lines = self._header()
+        for labelvalues, (counts, total, count) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labelvalues, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labelvalues)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labelvalues)} {count}")
+        return lines
+
+
+REGISTRY = []
+
+HTTP_REQUESTS = Counter("http_requests_total", "Requêtes HTTP traitées.", ("method", "route", "status"))
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "Latence des requêtes HTTP.", ("method", "route"))
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "Requêtes HTTP en cours.", ("method", "route"))
+MONGO_COMMANDS = Histogram("mongo_command_duration_seconds", "Durée des commandes MongoDB.", ("collection", "command", "outcome"))
+RATE_LIMIT_REJECTIONS = Counter("rate_limit_rejections_total", "Requêtes refusées par le rate limiter.", ("route",))
+STATEMENT_PARSES = Counter("statement_parses_total", "Relevés PDF analysés, par analyseur (ou gemini).", ("parser",))
+GEMINI_CALLS = Histogram("gemini_call_duration_seconds", "Durée des appels à Gemini.", ("outcome",), buckets=(0.5, 1, 2, 5, 10, 20, 30, 60, 120))
+EMAILS_SENT = Counter("emails_sent_total", "E-mails envoyés via Resend.", ("kind", "outcome"))
+JWT_CACHE = Counter("jwt_cache_lookups_total", "Consultations du cache des JWT vérifiés.", ("outcome",))
+CACHE_LOOKUPS = Counter("cache_lookups_total", "Consultations des caches de résultats.", ("cache", "outcome"))
+ANALYTICS_READS = Counter("analytics_reads_total", "Lectures analytiques routées, par cible (primary ou préférence de lecture).", ("target",))
+SINGLEFLIGHT_CALLS = Counter("singleflight_calls_total", "Calculs regroupés : leader (exécuté) ou coalesced (a rejoint un calcul en cours).", ("flight", "role"))
+RESPONSE_ENCODINGS = Counter("response_encodings_total", "Réponses JSON/MessagePack négociées, par format et compression.", ("format", "encoding"))
+
+
+def render_latest() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.expose())
+    return "\n".join(lines) + "\n"
+
+
+def mongo_seconds_total() -> float:
+    """Temps cumulé de toutes les commandes Mongo observées par ce processus."""
+    return sum(state[1] for state in list(MONGO_COMMANDS._values.values()))
+
+
+def route_label(scope) -> str:
+    """Gabarit de la route (ex: /api/transactions/{transaction_id}) pour borner la cardinalité."""
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """Middleware ASGI pur : latence et nombre de requêtes par route et statut."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        status = {"code": 500}
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # scope["route"] est renseigné par le routeur FastAPI pendant le traitement
+            route = route_label(scope)
+            HTTP_LATENCY.observe(time.perf_counter() - started, scope["method"], route)
+            HTTP_REQUESTS.inc(scope["method"], route, str(status["code"]))
+
+
+class MetricsRoute(APIRoute):
+    """Route FastAPI qui tient la jauge des requêtes en cours (la route est connue dès l'entrée)."""
+
+    async def handle(self, scope, receive, send):
+        labels = (scope["method"], self.path)
+        HTTP_IN_FLIGHT.inc(*labels)
+        try:
+            await super().handle(scope, receive, send)
+        finally:
+            HTTP_IN_FLIGHT.dec(*labels)
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Chronomètre chaque commande envoyée par le client Motor (appelé depuis ses threads)."""
+
+    def __init__(self):
+        self._pending: Dict[Tuple[int, int], Tuple[str, str]] = {}
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = "-"
+        self._pending[(event.connection_id, event.request_id)] = (collection, event.command_name)
+
+    def _finish(self, event, outcome: str):
+        collection, command = self._pending.pop((event.connection_id, event.request_id), ("-", event.command_name))
+        MONGO_COMMANDS.observe(event.duration_micros / 1e6, collection, command, outcome)
+
+    def succeeded(self, event):
+        self._finish(event, "success")
+
+    def failed(self, event):
+        self._finish(event, "failure")
@@ -0,0 +1,29 @@
+"""
+Fonctions TOTP (MFA) et génération du QR code d'enrôlement.
+
+`pyotp` et `qrcode` (qui tire Pillow) sont importés au premier usage.
+"""
+import io
+import base64
+
+
+def new_secret() -> str:
+    import pyotp
+    return pyotp.random_base32()
+
+def verify_mfa_code(secret_key: str, mfa_code: str) -> bool:
+    import pyotp
+    totp = pyotp.TOTP(secret_key)
+    return totp.verify(mfa_code)
+
+def generate_qr_code_data_uri(email: str, secret_key: str) -> str:
+    import pyotp
+    import qrcode
+    provisioning_uri = pyotp.totp.TOTP(secret_key).provisioning_uri(
+        name=email, issuer_name="Budget Tracker"
+    )
+    img = qrcode.make(provisioning_uri)
+    buffered = io.BytesIO()
+    img.save(buffered, format="PNG")
+    img_str = base64.b64encode(buffered.getvalue()).decode("utf-8")
+    return f"data:image/png;base64,{img_str}"
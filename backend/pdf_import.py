@@ -0,0 +1,252 @@
+"""
+Analyse de relevés bancaires PDF : extraction du texte et des mots positionnés
+(pdfplumber), lecture déterministe si la mise en page est connue
+(statement_parsers.py), sinon extraction des transactions par Google Gemini.
+
+Les longs relevés sont découpés en morceaux de pages entières
+(LLM_CHUNK_PAGES), envoyés en parallèle (au plus LLM_CONCURRENCY appels en
+cours dans le processus) : la latence est celle du morceau le plus lent, une
+réponse tronquée ou illisible ne coûte que son morceau, qui seul est relancé
+(LLM_RETRIES fois). Les pages d'un morceau définitivement en échec sont
+signalées à l'appelant avec les transactions des autres.
+
+Le modèle est derrière l'interface LLMClient (generate) : use_client() la
+remplace, par exemple par un faux client local en test.
+
+`pdfplumber` et `google.generativeai` sont importés (et Gemini configuré) au
+premier import PDF seulement : ce sont les imports les plus coûteux du backend.
+"""
+import io
+import os
+import abc
+import json
+import time
+import asyncio
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import List, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+
+import statement_parsers
+from metrics import GEMINI_CALLS, STATEMENT_PARSES
+
+logger = logging.getLogger(__name__)
+
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GEMINI_MODEL = "gemini-2.5-flash"
+LLM_CHUNK_PAGES = int(os.getenv("LLM_CHUNK_PAGES", "4"))
+LLM_CHUNK_CHARS = int(os.getenv("LLM_CHUNK_CHARS", "24000"))
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "8"))
+LLM_RETRIES = int(os.getenv("LLM_RETRIES", "2"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "90"))
+MERGE_WINDOW = 5  # lignes comparées de part et d'autre d'une frontière entre morceaux
+
+_genai = None
+_client = None
+_semaphore = None
+
+def gemini_configured() -> bool:
+    return bool(GEMINI_API_KEY) or _client is not None
+
+def _gemini():
+    """Importe et configure le SDK Gemini au premier appel."""
+    global _genai
+    if _genai is None:
+        import google.generativeai as genai
+        genai.configure(api_key=GEMINI_API_KEY)
+        _genai = genai
+    return _genai
+
+def read_statement(contents: bytes) -> statement_parsers.Statement:
+    """Texte brut (pour Gemini) et lignes de mots positionnés (pour les analyseurs), en une lecture."""
+    import pdfplumber
+    pages = []
+    lines = []
+    with pdfplumber.open(io.BytesIO(contents)) as pdf:
+        for page in pdf.pages:
+            pages.append(page.extract_text() or "")
+            lines.extend(statement_parsers.group_lines(page.extract_words()))
+            lines.append([])
+    raw_text = "".join(text + "\n" for text in pages if text)
+    return statement_parsers.Statement(raw_text, lines, pages)
+
+# --- Client LLM ---
+
+class LLMClient(abc.ABC):
+    """Interface du modèle : un prompt -> le texte de la réponse."""
+
+    @abc.abstractmethod
+    async def generate(self, prompt: str) -> str:
+        ...
+
+class GeminiClient(LLMClient):
+    def __init__(self, model: str = GEMINI_MODEL):
+        self.model = _gemini().GenerativeModel(model)
+
+    async def generate(self, prompt: str) -> str:
+        started = time.perf_counter()
+        try:
+            response = await self.model.generate_content_async(prompt)
+            text = response.text
+        except Exception:
+            GEMINI_CALLS.observe(time.perf_counter() - started, "failure")
+            raise
+        GEMINI_CALLS.observe(time.perf_counter() - started, "success")
+        return text
+
+def use_client(client: Optional[LLMClient]):
+    """Remplace le client du modèle (None : Gemini)."""
+    global _client
+    _client = client
+
+def _llm() -> LLMClient:
+    global _client
+    if _client is None:
+        _client = GeminiClient()
+    return _client
+
+def _limit() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(LLM_CONCURRENCY)
+    return _semaphore
+
+def build_prompt(raw_text: str) -> str:
+    # Le Prompt Strict
+    return f"""
+        Tu es un expert comptable spécialisé dans l'extraction de données financières.
+        Analyse le texte brut de ce relevé bancaire et extrais UNIQUEMENT les transactions bancaires.
+        Ignore le texte informatif, les soldes de début/fin, et les publicités.
+
+        Renvoie les données STRICTEMENT sous la forme d'un tableau JSON valide, sans aucun texte avant ou après.
+        Ne mets PAS de balise Markdown (comme ```json).
+
+        Chaque objet JSON doit avoir la structure suivante :
+        [
+          {{
+            "date": "YYYY-MM-DD",
+            "amount": 12.50,
+            "type": "Dépense",
+            "description": "Nom propre du marchand"
+          }}
+        ]
+
+        Règles :
+        - 'amount' DOIT être un nombre positif.
+        - Si la ligne est un crédit ou revenu, 'type' est "Revenu", sinon c'est "Dépense".
+
+        TEXTE À ANALYSER :
+        {raw_text}
+        """
+
+def parse_llm_json(response_text: str) -> list:
+    """Décode la réponse JSON de Gemini (avec ou sans bloc Markdown)."""
+    response_text = response_text.strip()
+    # Nettoyage au cas où Gemini rajoute le block markdown malgré les consignes
+    if response_text.startswith("```json"):
+        response_text = response_text[7:]
+    if response_text.startswith("```"):
+        response_text = response_text[3:]
+    if response_text.endswith("```"):
+        response_text = response_text[:-3]
+    return json.loads(response_text.strip())
+
+def normalize_transactions(transactions: list) -> list:
+    """Re-formattage sécurisé pour le frontend."""
+    extracted_transactions = []
+    for t in transactions:
+        extracted_transactions.append({
+            "date": t.get("date", datetime.now().strftime("%Y-%m-%d")),
+            "amount": abs(float(t.get("amount", 0))),
+            "type": t.get("type", "Dépense"),
+            "description": t.get("description", "Transaction PDF"),
+            "category_id": None,
+            "subcategory_id": None
+        })
+    return extracted_transactions
+
+class Chunk(NamedTuple):
+    first_page: int  # numérotées à partir de 1
+    last_page: int
+    text: str
+
+class ParseResult(NamedTuple):
+    transactions: list
+    failed_pages: List[Tuple[int, int]]  # pages des morceaux non analysés
+
+def chunk_pages(pages: List[str], max_pages: int = LLM_CHUNK_PAGES, max_chars: int = LLM_CHUNK_CHARS) -> List[Chunk]:
+    """Regroupe des pages entières et consécutives, dans la limite de max_pages et max_chars."""
+    chunks, current, first = [], [], 1
+    for number, text in enumerate(pages, 1):
+        if current and (len(current) >= max_pages or sum(map(len, current)) + len(text) > max_chars):
+            chunks.append(Chunk(first, number - 1, "\n".join(current)))
+            current, first = [], number
+        current.append(text)
+    if current:
+        chunks.append(Chunk(first, len(pages), "\n".join(current)))
+    return [c for c in chunks if c.text.strip()]
+
+def _key(t: dict) -> tuple:
+    return (t["date"], t["amount"], t["type"], " ".join(str(t["description"]).lower().split()))
+
+def merge_chunks(results: List[Optional[list]]) -> list:
+    """Concatène les morceaux dans l'ordre des pages. Les premières lignes d'un
+    morceau qui répètent les MERGE_WINDOW dernières du précédent (report en haut
+    de page) sont retirées, une fois par occurrence : deux achats identiques plus
+    éloignés de la frontière sont tous deux gardés."""
+    merged, tail = [], Counter()
+    for rows in results:
+        if rows is None:
+            tail = Counter()
+            continue
+        start = 0
+        while start < min(len(rows), MERGE_WINDOW) and tail[_key(rows[start])]:
+            tail[_key(rows[start])] -= 1
+            start += 1
+        merged.extend(rows[start:])
+        tail = Counter(_key(t) for t in rows[-MERGE_WINDOW:])
+    return merged
+
+async def _extract_chunk(chunk: Chunk) -> Optional[list]:
+    """Transactions du morceau, ou None après LLM_RETRIES relances infructueuses."""
+    for attempt in range(LLM_RETRIES + 1):
+        try:
+            async with _limit():
+                text = await asyncio.wait_for(_llm().generate(build_prompt(chunk.text)), LLM_TIMEOUT)
+            return normalize_transactions(parse_llm_json(text))
+        except (json.JSONDecodeError, TypeError, ValueError, AttributeError) as e:
+            logger.warning(f"Pages {chunk.first_page}-{chunk.last_page} : réponse illisible ({e}), essai {attempt + 1}")
+        except Exception as e:
+            logger.warning(f"Pages {chunk.first_page}-{chunk.last_page} : échec de l'appel ({e!r}), essai {attempt + 1}")
+        if attempt < LLM_RETRIES:
+            await asyncio.sleep(2 ** attempt)
+    return None
+
+async def extract_with_llm(pages: List[str]) -> ParseResult:
+    chunks = chunk_pages(pages)
+    results = await asyncio.gather(*(_extract_chunk(c) for c in chunks))
+    failed = [(c.first_page, c.last_page) for c, rows in zip(chunks, results) if rows is None]
+    if chunks and len(failed) == len(chunks):
+        raise HTTPException(status_code=502, detail="L'intelligence artificielle n'a pas pu analyser ce relevé. Réessayez plus tard.")
+    if failed:
+        logger.error(f"Relevé analysé partiellement, pages en échec : {failed}")
+    return ParseResult(merge_chunks(results), failed)
+
+async def parse_statement(contents: bytes) -> ParseResult:
+    """PDF brut -> transactions prêtes pour l'aperçu d'import (et pages non analysées)."""
+    statement = await run_in_threadpool(read_statement, contents)
+    if not statement.text.strip():
+        raise HTTPException(status_code=400, detail="Impossible d'extraire du texte de ce PDF.")
+
+    known = statement_parsers.parse_known(statement)
+    if known:
+        name, transactions = known
+        STATEMENT_PARSES.inc(name)
+        return ParseResult(normalize_transactions(transactions), [])
+    if not gemini_configured():
+        raise HTTPException(status_code=422, detail="Format de relevé non reconnu et analyse IA (Gemini) non configurée sur le serveur.")
+    STATEMENT_PARSES.inc("gemini")
+    return await extract_with_llm(statement.pages)
@@ -0,0 +1,198 @@
+"""
+Profilage à la demande d'une requête (cProfile).
+
+Déclenchement :
+- en-tête `X-Profile: <expiration>.<signature>` signé avec PROFILE_SECRET
+  (générer avec `python profiling.py sign --ttl 3600`) ;
+- ou échantillonnage aléatoire avec PROFILE_SAMPLE_RATE (0.0 - 1.0).
+
+Si ni PROFILE_SECRET ni PROFILE_SAMPLE_RATE ne sont définis, le middleware
+n'est pas installé : aucun coût par requête.
+
+Chaque profil est enregistré dans PROFILE_DIR (`<id>.prof` lisible par pstats /
+snakeviz, `<id>.json` résumé). Le résumé sépare le temps CPU du thread de la
+boucle asyncio, le temps des commandes Mongo observées pendant la requête et le
+reste (attente réseau, executor...). Avec des requêtes concurrentes, le CPU et
+Mongo des autres requêtes sont inclus : c'est un ordre de grandeur.
+"""
+import argparse
+import cProfile
+import hashlib
+import hmac
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Optional
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+PROFILE_SECRET = os.getenv("PROFILE_SECRET")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "budget-profiles"))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "50"))
+PROFILE_HEADER = b"x-profile"
+# Les routes d'administration des profils ne sont jamais profilées
+EXCLUDED_PREFIX = "/api/admin/profiles"
+
+_active = threading.Lock()
+
+
+def enabled() -> bool:
+    return bool(PROFILE_SECRET) or PROFILE_SAMPLE_RATE > 0
+
+
+def sign_token(ttl_seconds: int, secret: Optional[str] = None) -> str:
+    expires = int(time.time()) + ttl_seconds
+    signature = hmac.new((secret or PROFILE_SECRET).encode("utf-8"), f"profile:{expires}".encode("utf-8"), hashlib.sha256).hexdigest()
+    return f"{expires}.{signature}"
+
+
+def verify_token(token: Optional[str]) -> bool:
+    if not PROFILE_SECRET or not token:
+        return False
+    expires, _, signature = token.partition(".")
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    expected = hmac.new(PROFILE_SECRET.encode("utf-8"), f"profile:{expires}".encode("utf-8"), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(signature, expected)
+
+
+def _path(profile_id: str, ext: str) -> str:
+    return os.path.join(PROFILE_DIR, f"{profile_id}.{ext}")
+
+
+def profile_path(profile_id: str) -> Optional[str]:
+    """Chemin du .prof si l'identifiant est valide et existe."""
+    if not all(c in "0123456789abcdef" for c in profile_id):
+        return None
+    path = _path(profile_id, "prof")
+    return path if os.path.exists(path) else None
+
+
+def load_summary(profile_id: str) -> Optional[dict]:
+    if profile_path(profile_id) is None:
+        return None
+    with open(_path(profile_id, "json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def list_summaries() -> list:
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    summaries = []
+    for name in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        if name.endswith(".json"):
+            with open(os.path.join(PROFILE_DIR, name), "r", encoding="utf-8") as f:
+                summary = json.load(f)
+            summary.pop("top_functions", None)
+            summaries.append(summary)
+    return sorted(summaries, key=lambda s: s["created_at"], reverse=True)
+
+
+def _prune():
+    profiles = sorted(
+        (os.path.join(PROFILE_DIR, n) for n in os.listdir(PROFILE_DIR) if n.endswith(".prof")),
+        key=os.path.getmtime,
+    )
+    for path in profiles[:-PROFILE_MAX_FILES]:
+        for ext in ("prof", "json"):
+            try:
+                os.remove(path[:-len("prof")] + ext)
+            except OSError:
+                pass
+
+
+def _save(profiler: cProfile.Profile, summary: dict):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    profiler.dump_stats(_path(summary["id"], "prof"))
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(25)
+    summary["top_functions"] = out.getvalue()
+    with open(_path(summary["id"], "json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=1)
+    _prune()
+
+
+class ProfilingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    def _triggered(self, scope) -> Optional[str]:
+        if scope["path"].startswith(EXCLUDED_PREFIX):
+            return None
+        if PROFILE_SECRET:
+            for name, value in scope["headers"]:
+                if name == PROFILE_HEADER:
+                    return "header" if verify_token(value.decode("latin-1")) else None
+        if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+            return "sample"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        trigger = self._triggered(scope)
+        # Un seul profil à la fois : cProfile est global au thread de la boucle
+        if trigger is None or not _active.acquire(blocking=False):
+            return await self.app(scope, receive, send)
+
+        profile_id = uuid.uuid4().hex
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-profile-id", profile_id.encode("ascii"))]
+            await send(message)
+
+        profiler = cProfile.Profile()
+        mongo_before = metrics.mongo_seconds_total()
+        cpu_before, wall_before = time.thread_time(), time.perf_counter()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.disable()
+            wall = time.perf_counter() - wall_before
+            cpu = time.thread_time() - cpu_before
+            mongo = metrics.mongo_seconds_total() - mongo_before
+            _active.release()
+            summary = {
+                "id": profile_id,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "trigger": trigger,
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": metrics.route_label(scope),
+                "status": status["code"],
+                "wall_ms": round(wall * 1000, 2),
+                "cpu_ms": round(cpu * 1000, 2),
+                "mongo_ms": round(mongo * 1000, 2),
+                "other_wait_ms": round(max(0.0, wall - cpu - mongo) * 1000, 2),
+            }
+            try:
+                _save(profiler, summary)
+            except OSError as e:
+                logger.warning(f"Profil {profile_id} non enregistré : {e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Outils de profilage à la demande.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sign = sub.add_parser("sign", help="génère une valeur d'en-tête X-Profile")
+    sign.add_argument("--ttl", type=int, default=3600, help="validité en secondes")
+    args = parser.parse_args()
+    if not PROFILE_SECRET:
+        parser.error("PROFILE_SECRET n'est pas défini")
+    print(sign_token(args.ttl))
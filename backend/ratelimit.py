@@ -0,0 +1,312 @@
+"""
+Rate limiting avec backends interchangeables.
+
+- `memory` : seaux à jetons dans le processus (un seul worker) ;
+- `shm` : seaux à jetons dans un fichier mappé en mémoire partagé par tous les
+  workers d'une même machine (verrou fcntl) ;
+- `redis` : fenêtre fixe via INCR + EXPIRE, sur n'importe quel serveur parlant
+  le protocole Redis (RESP). Chaque échange est borné par
+  RATE_LIMIT_REDIS_TIMEOUT : un serveur qui ne répond plus fait échouer
+  l'appel (et le limiter laisse passer) au lieu de bloquer les routes.
+
+Usage (même forme que slowapi) :
+
+    limiter = Limiter(build_backend(), key_func=key_by_ip)
+
+    @app.post("/api/auth/token")
+    @limiter.limit("5/minute")
+    async def login(request: Request, ...): ...
+"""
+import asyncio
+import fcntl
+import functools
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import time
+from typing import Callable, Optional, Tuple
+from urllib.parse import urlparse
+
+from fastapi import HTTPException, Request
+
+from metrics import RATE_LIMIT_REJECTIONS
+
+logger = logging.getLogger(__name__)
+
+REDIS_TIMEOUT = float(os.getenv("RATE_LIMIT_REDIS_TIMEOUT", "0.5"))
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+def parse_rate(rate: str) -> Tuple[int, int]:
+    """'5/minute' -> (5, 60)."""
+    count, _, period = rate.partition("/")
+    period = period.strip().rstrip("s")
+    if period not in PERIODS:
+        raise ValueError(f"Période de rate limit inconnue : {rate}")
+    return int(count), PERIODS[period]
+
+
+class RateLimitExceeded(HTTPException):
+    def __init__(self, rate: str, retry_after: float):
+        super().__init__(
+            status_code=429,
+            detail=f"Rate limit exceeded: {rate}",
+            headers={"Retry-After": str(max(1, int(retry_after + 0.999)))},
+        )
+
+
+# --- Fonctions de clé ---
+
+def key_by_ip(request: Request) -> str:
+    return request.client.host if request.client else "127.0.0.1"
+
+
+def key_by_credential(request: Request) -> str:
+    """Empreinte du Bearer (jeton utilisateur ou clé API), sinon l'adresse IP."""
+    auth = request.headers.get("authorization", "")
+    scheme, _, credential = auth.partition(" ")
+    if scheme.lower() == "bearer" and credential:
+        return "cred:" + hashlib.sha256(credential.encode("utf-8")).hexdigest()[:32]
+    return key_by_ip(request)
+
+
+# --- Backends ---
+
+class MemoryBackend:
+    """Seaux à jetons locaux au processus."""
+
+    MAX_KEYS = 10000
+
+    def __init__(self):
+        self._buckets = {}
+
+    async def hit(self, key: str, capacity: int, period: int) -> float:
+        now = time.monotonic()
+        rate = capacity / period
+        if len(self._buckets) > self.MAX_KEYS:
+            # Purge grossière : les seaux non touchés depuis une période sont pleins.
+            self._buckets = {k: v for k, v in self._buckets.items() if now - v[1] < period}
+        tokens, last = self._buckets.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - last) * rate)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) / rate
+        self._buckets[key] = (tokens - 1, now)
+        return 0.0
+
+
+class SharedMemoryBackend:
+    """
+    Seaux à jetons dans un fichier mappé partagé entre processus.
+
+    Table de hachage à adressage ouvert : chaque case contient l'empreinte de la
+    clé (uint64), les jetons restants et la date de dernière mise à jour
+    (float64, horloge murale). Une case dont le seau est plein (clé inactive)
+    peut être réutilisée.
+    """
+
+    SLOT = struct.Struct("<Qdd")
+    PROBES = 8
+
+    def __init__(self, path: str, slots: int = 8192):
+        self.slots = slots
+        size = self.SLOT.size * slots
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self._fd).st_size < size:
+            os.ftruncate(self._fd, size)
+        self._mm = mmap.mmap(self._fd, size)
+
+    def _hit(self, key: str, capacity: int, period: int) -> float:
+        digest = int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little") or 1
+        now = time.time()
+        rate = capacity / period
+        start = digest % self.slots
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            victim, tokens = None, capacity
+            for i in range(self.PROBES):
+                offset = ((start + i) % self.slots) * self.SLOT.size
+                slot_key, slot_tokens, slot_ts = self.SLOT.unpack_from(self._mm, offset)
+                if slot_key == digest:
+                    victim, tokens = offset, min(capacity, slot_tokens + (now - slot_ts) * rate)
+                    break
+                if victim is None and (slot_key == 0 or slot_tokens + (now - slot_ts) * rate >= capacity):
+                    victim = offset
+            if victim is None:
+                # Table saturée autour de cette clé : on n'empêche pas la requête.
+                return 0.0
+            if tokens < 1:
+                self.SLOT.pack_into(self._mm, victim, digest, tokens, now)
+                return (1 - tokens) / rate
+            self.SLOT.pack_into(self._mm, victim, digest, tokens - 1, now)
+            return 0.0
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    async def hit(self, key: str, capacity: int, period: int) -> float:
+        return self._hit(key, capacity, period)
+
+
+class RedisError(Exception):
+    pass
+
+
+class RedisBackend:
+    """Fenêtre fixe via INCR + EXPIRE, client RESP minimal sur asyncio."""
+
+    def __init__(self, url: str, prefix: str = "rl:", timeout: float = REDIS_TIMEOUT):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.prefix = prefix
+        self.timeout = timeout
+        self._conn = None
+        self._lock = None
+
+    @staticmethod
+    def _encode(*args) -> bytes:
+        out = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            out.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(out)
+
+    @staticmethod
+    async def _read_reply(reader: asyncio.StreamReader):
+        line = await reader.readline()
+        if not line:
+            raise ConnectionError("Connexion Redis fermée")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode("utf-8")
+        if kind == b"-":
+            # Renvoyée et non levée : les réponses suivantes du pipeline doivent être lues.
+            return RedisError(payload.decode("utf-8"))
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            size = int(payload)
+            if size < 0:
+                return None
+            data = await reader.readexactly(size + 2)
+            return data[:-2]
+        if kind == b"*":
+            return [await RedisBackend._read_reply(reader) for _ in range(int(payload))]
+        raise RuntimeError(f"Réponse RESP inattendue : {line!r}")
+
+    async def _connect(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        if self.password:
+            writer.write(self._encode("AUTH", self.password))
+            await writer.drain()
+            reply = await self._read_reply(reader)
+            if isinstance(reply, RedisError):
+                raise reply
+        if self.db:
+            writer.write(self._encode("SELECT", self.db))
+            await writer.drain()
+            reply = await self._read_reply(reader)
+            if isinstance(reply, RedisError):
+                raise reply
+        return reader, writer
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn[1].close()
+            self._conn = None
+
+    async def _roundtrip(self, commands):
+        for attempt in range(2):
+            try:
+                if self._conn is None:
+                    self._conn = await self._connect()
+                reader, writer = self._conn
+                writer.write(b"".join(self._encode(*c) for c in commands))
+                await writer.drain()
+                return [await self._read_reply(reader) for _ in commands]
+            except (ConnectionError, OSError, asyncio.IncompleteReadError):
+                # Connexion périmée (serveur redémarré...) : une seule reconnexion
+                self._close()
+                if attempt:
+                    raise
+
+    async def _locked_roundtrip(self, commands):
+        async with self._lock:
+            try:
+                return await self._roundtrip(commands)
+            except BaseException:
+                # Échange interrompu (délai, annulation, réponse illisible) : des
+                # réponses peuvent rester sur la socket et seraient lues par
+                # l'appel suivant. On repart d'une connexion neuve.
+                self._close()
+                raise
+
+    async def execute(self, *commands):
+        """Envoie les commandes en pipeline et renvoie leurs réponses."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        try:
+            replies = await asyncio.wait_for(self._locked_roundtrip(commands), self.timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Pas de réponse de Redis en {self.timeout}s") from None
+        for reply in replies:
+            if isinstance(reply, RedisError):
+                raise reply
+        return replies
+
+    async def hit(self, key: str, capacity: int, period: int) -> float:
+        now = time.time()
+        window = int(now // period)
+        redis_key = f"{self.prefix}{key}:{window}"
+        count, _ = await self.execute(("INCR", redis_key), ("EXPIRE", redis_key, period))
+        if count > capacity:
+            return (window + 1) * period - now
+        return 0.0
+
+
+def build_backend():
+    """Backend choisi par RATE_LIMIT_BACKEND (memory, shm, redis)."""
+    kind = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+    if kind == "shm":
+        default_dir = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+        return SharedMemoryBackend(os.getenv("RATE_LIMIT_SHM_PATH", os.path.join(default_dir, "budget-ratelimit")))
+    if kind == "redis":
+        return RedisBackend(os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0"))
+    return MemoryBackend()
+
+
+class Limiter:
+    def __init__(self, backend, key_func: Callable[[Request], str] = key_by_ip):
+        self.backend = backend
+        self.key_func = key_func
+
+    def limit(self, rate: str, key_func: Optional[Callable[[Request], str]] = None):
+        """Décorateur de route. La route doit recevoir un paramètre `request: Request`."""
+        capacity, period = parse_rate(rate)
+        key_func = key_func or self.key_func
+
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                request = kwargs.get("request")
+                if request is None:
+                    request = next(a for a in args if isinstance(a, Request))
+                key = f"{func.__name__}:{key_func(request)}"
+                try:
+                    retry_after = await self.backend.hit(key, capacity, period)
+                except Exception as e:
+                    # Backend indisponible : on laisse passer plutôt que de bloquer l'auth.
+                    logger.warning(f"Rate limiter indisponible ({e}), requête autorisée.")
+                    retry_after = 0.0
+                if retry_after > 0:
+                    RATE_LIMIT_REJECTIONS.inc(func.__name__)
+                    raise RateLimitExceeded(rate, retry_after)
+                return await func(*args, **kwargs)
+            return wrapper
+        return decorator
@@ -0,0 +1,96 @@
+"""
+Routage des lectures analytiques vers les secondaires d'un replica set.
+
+Les lectures lourdes (liste et export des transactions, tableau de bord,
+revue mensuelle, comparaison de périodes, séries) passent par
+ReadRouter.reads() ; les écritures et les lectures qui les précèdent restent
+sur le primaire.
+
+    ANALYTICS_READ_PREFERENCE        primary (défaut, routage désactivé) |
+                                     secondaryPreferred | secondary | nearest
+    ANALYTICS_MAX_STALENESS_SECONDS  retard maximal d'un secondaire éligible
+                                     (>= 90, minimum imposé par MongoDB)
+    READ_YOUR_WRITES_SECONDS         fenêtre après une écriture (défaut : le
+                                     retard maximal + 10 s de heartbeat)
+
+Lire ses propres écritures : chaque écriture de transactions horodate le
+compte (`tx_written_at`, voir mark_transactions_changed) ; pendant la fenêtre,
+les lectures analytiques du compte restent sur le primaire. Passé ce délai,
+tout secondaire éligible a vu l'écriture : les caches indexés par tx_version
+restent justes. Les snapshots colonnaires sont toujours construits depuis le
+primaire.
+
+Essai local (replica set à un nœud) :
+    mongod --replSet rs0 --dbpath /tmp/rs0 && mongosh --eval "rs.initiate()"
+    MONGO_URL="mongodb://localhost:27017/budget_tracker?replicaSet=rs0"
+    ANALYTICS_READ_PREFERENCE=secondaryPreferred
+Sans secondaire, `secondaryPreferred` retombe sur le primaire ; `secondary`
+échoue (ServerSelectionTimeoutError) et montre les lectures routées.
+"""
+import os
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple, Optional
+
+from pymongo.read_preferences import Nearest, Secondary, SecondaryPreferred
+
+from compact import TransactionCollection
+from metrics import ANALYTICS_READS
+
+ANALYTICS_READ_PREFERENCE = os.getenv("ANALYTICS_READ_PREFERENCE", "primary")
+ANALYTICS_MAX_STALENESS_SECONDS = int(os.getenv("ANALYTICS_MAX_STALENESS_SECONDS", "90"))
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", str(ANALYTICS_MAX_STALENESS_SECONDS + 10)))
+
+MODES = {"secondaryPreferred": SecondaryPreferred, "secondary": Secondary, "nearest": Nearest}
+
+
+def read_preference(mode: str, max_staleness: int):
+    """Préférence de lecture pymongo ; None pour le primaire."""
+    if mode == "primary":
+        return None
+    if mode not in MODES:
+        raise ValueError(f"ANALYTICS_READ_PREFERENCE inconnue : {mode} (primary, {', '.join(MODES)})")
+    if max_staleness < 90:
+        raise ValueError("ANALYTICS_MAX_STALENESS_SECONDS doit être >= 90.")
+    return MODES[mode](max_staleness=max_staleness)
+
+
+class Reads(NamedTuple):
+    """Collections à utiliser pour une lecture analytique."""
+    transactions: TransactionCollection
+    archive: TransactionCollection
+    database: object  # pour archive.summary_totals / summaries_by_month
+
+
+class ReadRouter:
+    def __init__(self, mode: str = ANALYTICS_READ_PREFERENCE, max_staleness: int = ANALYTICS_MAX_STALENESS_SECONDS,
+                 window: float = READ_YOUR_WRITES_SECONDS):
+        self.mode = mode
+        self.preference = read_preference(mode, max_staleness)
+        self.window = timedelta(seconds=window)
+        self.primary: Optional[Reads] = None
+        self.secondary: Optional[Reads] = None
+
+    def bind(self, database, transactions: TransactionCollection, archive: TransactionCollection):
+        self.primary = Reads(transactions, archive, database)
+        if self.preference is None:
+            self.secondary = None
+            return
+        routed = database.with_options(read_preference=self.preference)
+        self.secondary = Reads(
+            TransactionCollection(routed[transactions.name], transactions.mode),
+            TransactionCollection(routed[archive.name], archive.mode),
+            routed,
+        )
+
+    def reads(self, written_at: Optional[datetime] = None, now: Optional[datetime] = None) -> Reads:
+        """Secondaires, sauf si le compte a écrit des transactions pendant la fenêtre."""
+        if self.secondary is None:
+            return self.primary
+        if written_at is not None:
+            if written_at.tzinfo is None:
+                written_at = written_at.replace(tzinfo=timezone.utc)
+            if (now or datetime.now(timezone.utc)) - written_at < self.window:
+                ANALYTICS_READS.inc("primary")
+                return self.primary
+        ANALYTICS_READS.inc(self.mode)
+        return self.secondary
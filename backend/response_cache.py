@@ -0,0 +1,82 @@
+"""
+Cache de réponses indexé par la version des données de l'utilisateur.
+
+Le champ `data_version` du compte est incrémenté par toute route qui écrit des
+transactions, budgets, catégories, récurrences ou objectifs d'épargne
+(server.mark_data_changed, mark_transactions_changed). Les clés contiennent
+cette version : après une écriture, les anciennes entrées ne sont plus jamais
+lues, sans invalidation. Le compte étant déjà lu par l'authentification, une
+vue répétée ne coûte aucune autre requête MongoDB.
+
+Deux niveaux :
+- LRU en mémoire du processus (cache.LRUCache) ;
+- optionnel, partagé entre workers et machines : un serveur parlant le
+  protocole Redis (RESP), via RESPONSE_CACHE_URL. Les réponses y sont en JSON,
+  avec le même TTL. En cas de panne, le niveau partagé est ignoré pendant
+  SHARED_RETRY_SECONDS.
+
+Métriques : cache_lookups_total{cache="<nom>"} (mémoire) et
+{cache="<nom>:shared"} (partagé).
+"""
+import json
+import logging
+import os
+import time
+from typing import Any, Hashable, Optional, Tuple
+
+from cache import LRUCache
+from metrics import CACHE_LOOKUPS
+from ratelimit import RedisBackend, RedisError
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "2048"))
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+RESPONSE_CACHE_URL = os.getenv("RESPONSE_CACHE_URL")  # ex: redis://localhost:6379/1
+SHARED_RETRY_SECONDS = 30
+
+
+class ResponseCache:
+    def __init__(self, name: str, maxsize: int = RESPONSE_CACHE_SIZE, ttl: int = RESPONSE_CACHE_TTL,
+                 url: Optional[str] = RESPONSE_CACHE_URL):
+        self.name = name
+        self.ttl = ttl
+        self.local = LRUCache(name, maxsize, ttl=ttl)
+        self.shared = RedisBackend(url, prefix=f"rc:{name}:") if url else None
+        self._shared_down_until = 0.0
+
+    def _shared_key(self, key: Tuple[Hashable, ...]) -> str:
+        return self.shared.prefix + ":".join("" if part is None else str(part) for part in key)
+
+    def _shared_available(self) -> bool:
+        return self.shared is not None and time.monotonic() >= self._shared_down_until
+
+    def _shared_failed(self, error: Exception):
+        logger.warning(f"Cache partagé {self.name} indisponible ({error}), ignoré {SHARED_RETRY_SECONDS}s")
+        self._shared_down_until = time.monotonic() + SHARED_RETRY_SECONDS
+
+    async def get(self, key: Tuple[Hashable, ...]) -> Any:
+        value = self.local.get(key)
+        if value is not None or not self._shared_available():
+            return value
+        try:
+            (raw,) = await self.shared.execute(("GET", self._shared_key(key)))
+        except (OSError, EOFError, RedisError) as e:
+            self._shared_failed(e)
+            return None
+        if raw is None:
+            CACHE_LOOKUPS.inc(self.name + ":shared", "miss")
+            return None
+        CACHE_LOOKUPS.inc(self.name + ":shared", "hit")
+        value = json.loads(raw)
+        self.local.set(key, value)
+        return value
+
+    async def set(self, key: Tuple[Hashable, ...], value: Any):
+        self.local.set(key, value)
+        if not self._shared_available():
+            return
+        try:
+            await self.shared.execute(("SET", self._shared_key(key), json.dumps(value), "EX", self.ttl))
+        except (OSError, EOFError, RedisError) as e:
+            self._shared_failed(e)
@@ -1,52 +1,60 @@
-from fastapi import FastAPI, HTTPException, Depends, status, UploadFile, File, Request
+from fastapi import FastAPI, HTTPException, Depends, status, UploadFile, File, Request, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm, HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, FileResponse, StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
 from pydantic import BaseModel, EmailStr, Field
 from typing import Optional, List, Any
+from contextlib import asynccontextmanager
 from datetime import datetime, timezone, timedelta, date
 import os
+import time
+import asyncio
 import uuid
-import re
-import io
 import logging
-import pdfplumber
 import json
 import secrets
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from bson import ObjectId
 
-# --- NOUVEAUX IMPORTS POUR LE RATE LIMITING (SÉCURITÉ) ---
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
-
-# --- IMPORTS POUR SENDGRID / RESEND ---
-import resend
-
-# --- IMPORTS POUR GEMINI (PDF PARSING IA) ---
-import google.generativeai as genai
-
-# --- NOUVEAUX IMPORTS POUR MFA (TOTP) ---
-import pyotp
-import qrcode
-import base64
-# --- FIN DES NOUVEAUX IMPORTS ---
+# --- OBSERVABILITÉ ---
+import metrics
+import profiling
+
+# --- RATE LIMITING (SÉCURITÉ) ---
+from ratelimit import Limiter, build_backend, key_by_ip, key_by_credential
+
+# --- CACHES (JWT VÉRIFIÉS, RÉSULTATS CALCULÉS) ---
+from jwt_cache import ClaimsCache
+from cache import LRUCache
+
+# --- SOUS-SYSTÈMES OPTIONNELS (dépendances lourdes importées au premier usage) ---
+import mfa
+import mailer
+import pdf_import
+
+# --- ARCHIVAGE (STOCKAGE FROID) ---
+import archive
+import compact
+import export
+import backup
+import events
+import merchants
+import category_templates
+import read_routing
+import response_cache
+import singleflight
+import wire
 
 # Configuration Logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# ==============================================================================
-# CONFIGURATION GEMINI API
-# ==============================================================================
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
-else:
-    logger.warning("ATTENTION: GEMINI_API_KEY non configurée. L'import PDF plantera.")
+if not pdf_import.gemini_configured():
+    logger.warning("ATTENTION: GEMINI_API_KEY non configurée. Seuls les relevés PDF aux formats connus seront importés.")
 
 # ==============================================================================
 # CORRECTIF SÉRIALISATION JSON
@@ -62,7 +70,23 @@ def json_serial(obj):
     raise TypeError(f"Type {type(obj)} non sérialisable")
 
 class UnifiedJSONResponse(JSONResponse):
+    """JSON par défaut ; MessagePack, disposition colonnaire et compression négociés (wire.py)."""
+
+    def __init__(self, content: Any = None, status_code: int = 200, headers=None, media_type=None, background=None):
+        self.wire = wire.current()
+        self.columnar = False
+        super().__init__(content, status_code, headers, media_type, background)
+        wire.finish(self, self.wire, self.columnar)
+
     def render(self, content: Any) -> bytes:
+        fmt = getattr(self, "wire", wire.WireFormat())
+        if fmt.columnar:
+            columns = wire.to_columnar(content)
+            if columns is not None:
+                content, self.columnar = columns, True
+        if fmt.msgpack:
+            self.media_type = wire.MSGPACK
+            return wire.packb(content, default=json_serial)
         return json.dumps(
             content,
             ensure_ascii=False,
@@ -72,10 +96,14 @@ class UnifiedJSONResponse(JSONResponse):
             default=json_serial,
         ).encode("utf-8")
 
+def model_response(model: BaseModel) -> UnifiedJSONResponse:
+    """Rend le modèle sans jsonable_encoder : en MessagePack, les dates restent des Timestamp natifs."""
+    return UnifiedJSONResponse(model.model_dump())
+
 # --- Configuration de la Sécurité ---
 
-# Initialisation du Limiter (identifie par adresse IP)
-limiter = Limiter(key_func=get_remote_address)
+# Initialisation du Limiter (par adresse IP par défaut, backend choisi par RATE_LIMIT_BACKEND)
+limiter = Limiter(build_backend(), key_func=key_by_ip)
 
 # Contexte de hachage pour les mots de passe
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -94,17 +122,132 @@ MFA_TOKEN_EXPIRE_MINUTES = 5
 # Token de réinitialisation de mot de passe (15 min)
 PASSWORD_RESET_TOKEN_EXPIRE_MINUTES = 15
 
+# Claims des jetons déjà vérifiés (par empreinte, jusqu'à leur expiration)
+claims_cache = ClaimsCache()
+
+# Index marchand -> catégorie par utilisateur (catégorisation automatique)
+merchant_indexes = merchants.MerchantIndexes()
+
 # Schéma OAuth2 pour la récupération du token
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/token")
 # Schéma HTTPBearer pour l'API Key (Apple Pay Webhook)
 bearer_scheme = HTTPBearer(auto_error=False)
 
+# --- CONNEXION MONGODB ---
+MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017/budget_tracker")
+# Réglages du pool (voir les options de pymongo du même nom)
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_MAX_IDLE_TIME_MS = os.getenv("MONGO_MAX_IDLE_TIME_MS")
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "30000"))
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS")  # ex: "zstd,snappy,zlib"
+# Nombre de connexions ouvertes avant d'accepter du trafic
+MONGO_WARMUP_CONNECTIONS = int(os.getenv("MONGO_WARMUP_CONNECTIONS", str(max(MONGO_MIN_POOL_SIZE, 4))))
+
+# Créés dans le lifespan (bind_database)
+client = None
+db = None
+users_collection = None
+transactions_collection = None
+categories_collection = None
+subcategories_collection = None
+recurring_transactions_collection = None
+budgets_collection = None
+savings_goals_collection = None
+savings_contributions_collection = None
+pending_transactions_collection = None
+transactions_archive_collection = None
+
+# Lectures analytiques : primaire ou secondaires (ANALYTICS_READ_PREFERENCE)
+read_router = read_routing.ReadRouter()
+
+# --- SNAPSHOTS COLONNAIRES (ANALYTICS) ---
+# Désactivés tant que SNAPSHOT_DIR n'est pas défini.
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR")
+snapshot_store = None
+if SNAPSHOT_DIR:
+    from snapshots import SnapshotStore  # numpy n'est chargé que si les snapshots sont actifs
+    snapshot_store = SnapshotStore(SNAPSHOT_DIR, None)
+
+def mongo_client_options() -> dict:
+    """Options du client Motor, lues depuis l'environnement."""
+    options = {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "event_listeners": [metrics.MongoCommandListener()],
+    }
+    if MONGO_MAX_IDLE_TIME_MS:
+        options["maxIdleTimeMS"] = int(MONGO_MAX_IDLE_TIME_MS)
+    if MONGO_COMPRESSORS:
+        options["compressors"] = MONGO_COMPRESSORS
+    return options
+
+def bind_database(database):
+    """Rattache les collections globales à une base (client réel ou substitut en mémoire)."""
+    global db, users_collection, transactions_collection, categories_collection, subcategories_collection
+    global recurring_transactions_collection, budgets_collection, savings_goals_collection, pending_transactions_collection
+    global savings_contributions_collection, transactions_archive_collection
+    db = database
+    users_collection = db.users
+    transactions_collection = compact.TransactionCollection(db.transactions)
+    categories_collection = db.categories
+    subcategories_collection = db.subcategories
+    recurring_transactions_collection = db.recurring_transactions
+    budgets_collection = db.budgets
+    savings_goals_collection = db.savings_goals
+    savings_contributions_collection = db.savings_contributions
+    pending_transactions_collection = db.pending_transactions
+    transactions_archive_collection = compact.TransactionCollection(db.transactions_archive)
+    read_router.bind(db, transactions_collection, transactions_archive_collection)
+    if snapshot_store:
+        snapshot_store.collection = transactions_collection
+        snapshot_store.archive_collection = transactions_archive_collection
+
+# --- INITIALISATION DES INDEX ---
+async def ensure_indexes():
+    """Crée les index nécessaires au démarrage."""
+    try:
+        await transactions_collection.create_index([("user_id", 1), ("date", -1)])
+        await categories_collection.create_index([("user_id", 1)])
+        await budgets_collection.create_index([("user_id", 1), ("category_id", 1)], unique=True)
+        await savings_goals_collection.create_index([("user_id", 1)])
+        await savings_contributions_collection.create_index([("user_id", 1), ("goal_id", 1), ("created_at", 1)])
+        await pending_transactions_collection.create_index([("user_id", 1)])
+        await archive.ensure_indexes(db)
+        logger.info("Index MongoDB synchronisés.")
+    except Exception as e:
+        logger.warning(f"Indexation Warning: {e}")
+
+async def warmup_pool(connections: int):
+    """Ouvre `connections` connexions du pool via des pings concurrents."""
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(db.command("ping") for _ in range(connections)))
+        logger.info(f"Pool MongoDB préchauffé ({connections} connexions) en {(time.perf_counter() - started) * 1000:.0f} ms.")
+    except Exception as e:
+        logger.warning(f"Préchauffage MongoDB impossible : {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global client
+    client = AsyncIOMotorClient(MONGO_URL, **mongo_client_options())
+    bind_database(client.budget_tracker)
+    await ensure_indexes()
+    if MONGO_WARMUP_CONNECTIONS > 0:
+        await warmup_pool(MONGO_WARMUP_CONNECTIONS)
+    await events.hub.start(db)
+    yield
+    await events.hub.stop()
+    client.close()
+
 # --- Initialisation de FastAPI ---
-app = FastAPI(default_response_class=UnifiedJSONResponse)
+app = FastAPI(default_response_class=UnifiedJSONResponse, lifespan=lifespan)
+# Doit précéder la déclaration des routes : jauge des requêtes en cours par route
+app.router.route_class = metrics.MetricsRoute
 
 # Configuration du Rate Limiter
 app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
 # --- CONFIGURATION CORS ---
 origins = [
@@ -119,36 +262,21 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Unparsed-Pages", "X-Layout"],
 )
 
-# --- CONNEXION MONGODB ---
-MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017/budget_tracker")
-client = AsyncIOMotorClient(MONGO_URL)
-db = client.budget_tracker
-
-# Collections
-users_collection = db.users
-transactions_collection = db.transactions
-categories_collection = db.categories
-subcategories_collection = db.subcategories
-recurring_transactions_collection = db.recurring_transactions
-budgets_collection = db.budgets
-savings_goals_collection = db.savings_goals
-pending_transactions_collection = db.pending_transactions
+# Profilage à la demande (non installé s'il est désactivé : coût nul)
+if profiling.enabled():
+    app.add_middleware(profiling.ProfilingMiddleware)
 
-# --- INITIALISATION DES INDEX ---
-@app.on_event("startup")
-async def startup_db_client():
-    """Crée les index nécessaires au démarrage."""
-    try:
-        await transactions_collection.create_index([("user_id", 1), ("date", -1)])
-        await categories_collection.create_index([("user_id", 1)])
-        await budgets_collection.create_index([("user_id", 1), ("category_id", 1)], unique=True)
-        await savings_goals_collection.create_index([("user_id", 1)])
-        await pending_transactions_collection.create_index([("user_id", 1)])
-        logger.info("Index MongoDB synchronisés.")
-    except Exception as e:
-        logger.warning(f"Indexation Warning: {e}")
+# Format de réponse négocié (JSON/MessagePack, colonnes, compression), lu par UnifiedJSONResponse
+app.add_middleware(wire.WireMiddleware)
+
+# Ajouté en dernier = le plus externe : mesure aussi le temps passé dans les autres middlewares
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Jeton optionnel protégeant /metrics (Authorization: Bearer <METRICS_TOKEN>)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
 
 # --- Modèles Pydantic ---
 
@@ -170,6 +298,14 @@ class UserInDB(UserPublic):
     is_verified: Optional[bool] = None
     mfa_secret: Optional[str] = None
     api_key: Optional[str] = None
+    tx_version: int = 0
+    tx_epoch: int = 0
+    tx_written_at: Optional[datetime] = None
+    data_version: int = 0
+    tokens_valid_after: Optional[int] = None  # ancienne révocation (secondes), voir issued_before_revocation
+    token_generation: int = 0
+    archived_before: Optional[datetime] = None
+    uses_default_categories: bool = False
 
 class TokenResponse(BaseModel):
     access_token: Optional[str] = None
@@ -277,6 +413,13 @@ class SavingsGoalAdjust(BaseModel):
     amount: float = Field(..., gt=0)
     action: str 
 
+class SavingsContribution(BaseModel):
+    id: str
+    goal_id: str
+    amount: float  # positif pour un ajout, négatif pour un retrait
+    balance: float  # current_amount de l'objectif après le mouvement
+    created_at: datetime
+
 # Modèles pour la Revue Mensuelle
 class BiggestExpense(BaseModel):
     description: Optional[str]
@@ -299,6 +442,37 @@ class MonthlyReviewResponse(BaseModel):
     respected_budgets: List[BudgetReviewDetail]
     exceeded_budgets: List[BudgetReviewDetail]
 
+# Modèles pour la comparaison de périodes
+class PeriodSummary(BaseModel):
+    period: str
+    display_period: str
+    start_date: datetime
+    end_date: datetime
+    total_income: float
+    total_expense: float
+    total_saved: float
+    savings_rate: float
+    respected_budgets: List[BudgetReviewDetail]
+    exceeded_budgets: List[BudgetReviewDetail]
+
+class PeriodComparisonResponse(BaseModel):
+    granularity: str
+    periods: List[PeriodSummary]
+
+# Modèles pour les séries temporelles
+class SeriesPoint(BaseModel):
+    date: datetime
+    revenus: float
+    depenses: float
+    count: int
+
+class TimeSeriesResponse(BaseModel):
+    granularity: str
+    start_date: datetime
+    end_date: datetime
+    category_id: Optional[str] = None
+    points: List[SeriesPoint]
+
 # Modèles de Requête CRUD
 class CategoryCreate(BaseModel):
     name: str
@@ -362,6 +536,10 @@ class PendingTransactionResponse(BaseModel):
     merchant: str
     date: datetime
     created_at: datetime
+    # Suggestion de l'index marchand (voir merchants.py)
+    category_id: Optional[str] = None
+    subcategory_id: Optional[str] = None
+    confidence: Optional[float] = None
 
 class ResolvePendingRequest(BaseModel):
     type: str # "Revenu" ou "Dépense"
@@ -377,18 +555,41 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+def decode_token(token: str) -> dict:
+    """Vérifie le JWT (signature, expiration) ; le résultat est mis en cache jusqu'à `exp`."""
+    return claims_cache.decode(token, lambda t: jwt.decode(t, SECRET_KEY, algorithms=[ALGORITHM]))
+
+def issued_before_revocation(payload: dict, user: "UserInDB") -> bool:
+    """Jeton émis avant le dernier changement de mot de passe de l'utilisateur.
+
+    Les jetons portent la génération (`gen`) du compte lue à leur émission, dans
+    le même document que le mot de passe vérifié : un jeton obtenu avec l'ancien
+    mot de passe, même dans la seconde du changement, a une génération périmée.
+    """
+    if "gen" in payload:
+        return payload["gen"] < user.token_generation
+    # Jetons émis avant le compteur : tous invalidés par une révocation, ou ancienne règle sur `iat`
+    return user.token_generation > 0 or (
+        bool(user.tokens_valid_after) and payload.get("iat", 0) < user.tokens_valid_after
+    )
+
+def revoke_tokens(email: str) -> dict:
+    """Invalide les jetons déjà émis pour cet utilisateur ; renvoie l'opérateur à appliquer à l'utilisateur."""
+    claims_cache.revoke(email)
+    return {"$inc": {"token_generation": 1}}
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.now(timezone.utc) + expires_delta
     else:
         expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "iat": int(time.time())})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 def create_verification_token(email: str) -> str:
     expires = datetime.now(timezone.utc) + timedelta(minutes=VERIFICATION_TOKEN_EXPIRE_MINUTES)
-    to_encode = { "sub": email, "exp": expires, "scope": "email_verification" }
+    to_encode = { "sub": email, "exp": expires, "iat": int(time.time()), "scope": "email_verification" }
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 async def get_email_from_verification_token(token: str) -> str:
@@ -396,7 +597,7 @@ async def get_email_from_verification_token(token: str) -> str:
         status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid verification token",
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(token)
         if payload.get("scope") != "email_verification": raise credentials_exception
         email: str = payload.get("sub")
         if email is None: raise credentials_exception
@@ -406,9 +607,9 @@ async def get_email_from_verification_token(token: str) -> str:
             status_code=status.HTTP_400_BAD_REQUEST, detail="Verification token expired or invalid",
         )
 
-def create_mfa_token(email: str) -> str:
+def create_mfa_token(email: str, generation: int) -> str:
     expires = datetime.now(timezone.utc) + timedelta(minutes=MFA_TOKEN_EXPIRE_MINUTES)
-    to_encode = { "sub": email, "exp": expires, "scope": "mfa_login" }
+    to_encode = { "sub": email, "exp": expires, "iat": int(time.time()), "gen": generation, "scope": "mfa_login" }
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 async def get_email_from_mfa_token(token: str) -> str:
@@ -416,7 +617,7 @@ async def get_email_from_mfa_token(token: str) -> str:
         status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired MFA session. Please log in again.",
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(token)
         if payload.get("scope") != "mfa_login": raise credentials_exception
         email: str = payload.get("sub")
         if email is None: raise credentials_exception
@@ -424,9 +625,9 @@ async def get_email_from_mfa_token(token: str) -> str:
     except JWTError:
         raise credentials_exception
 
-def create_password_reset_token(email: str) -> str:
+def create_password_reset_token(email: str, generation: int) -> str:
     expires = datetime.now(timezone.utc) + timedelta(minutes=PASSWORD_RESET_TOKEN_EXPIRE_MINUTES)
-    to_encode = { "sub": email, "exp": expires, "scope": "password_reset" }
+    to_encode = { "sub": email, "exp": expires, "iat": int(time.time()), "gen": generation, "scope": "password_reset" }
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 async def get_email_from_password_reset_token(token: str) -> str:
@@ -434,7 +635,7 @@ async def get_email_from_password_reset_token(token: str) -> str:
         status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid or expired password reset token.",
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(token)
         if payload.get("scope") != "password_reset": raise credentials_exception
         email: str = payload.get("sub")
         if email is None: raise credentials_exception
@@ -442,104 +643,6 @@ async def get_email_from_password_reset_token(token: str) -> str:
     except JWTError: 
         raise credentials_exception
 
-# --- Fonctions TOTP ---
-def verify_mfa_code(secret_key: str, mfa_code: str) -> bool:
-    totp = pyotp.TOTP(secret_key)
-    return totp.verify(mfa_code)
-
-def generate_qr_code_data_uri(email: str, secret_key: str) -> str:
-    provisioning_uri = pyotp.totp.TOTP(secret_key).provisioning_uri(
-        name=email, issuer_name="Budget Tracker"
-    )
-    img = qrcode.make(provisioning_uri)
-    buffered = io.BytesIO()
-    img.save(buffered, format="PNG")
-    img_str = base64.b64encode(buffered.getvalue()).decode("utf-8")
-    return f"data:image/png;base64,{img_str}"
-
-# --- Fonctions d'envoi d'e-mail (RESEND) ---
-def send_verification_email(email: str, token: str):
-    frontend_url = os.getenv("FRONTEND_URL")
-    sender_email = os.getenv("SENDER_EMAIL")
-    resend_api_key = os.getenv("RESEND_API_KEY")
-
-    if not all([frontend_url, sender_email, resend_api_key]):
-        logger.error("CONFIG RESEND MANQUANTE : Vérifiez FRONTEND_URL, SENDER_EMAIL, RESEND_API_KEY")
-        raise HTTPException(status_code=500, detail="Email service is not configured.")
-
-    resend.api_key = resend_api_key
-    verification_link = f"{frontend_url}/verify-email?token={token}"
-    
-    html_content = f"""
-        <div style="font-family: Arial, sans-serif; line-height: 1.6; max-width: 600px; margin: auto; padding: 20px; border: 1px solid #ddd; border-radius: 10px;">
-            <h2 style="color: #333;">Bienvenue sur Budget Tracker !</h2>
-            <p>Merci de vous être inscrit. Pour finaliser la création de votre compte, veuillez cliquer sur le bouton ci-dessous :</p>
-            <p style="text-align: center; margin: 25px 0;">
-                <a href="{verification_link}" 
-                    style="background-color: #0d6efd; color: white; padding: 12px 25px; text-decoration: none; border-radius: 5px; display: inline-block; font-weight: bold;">
-                    Vérifier mon compte
-                </a>
-            </p>
-            <p>Ce lien est valide pendant 24 heures.</p>
-            <p style="font-size: 0.9em; color: #777;">Si vous n'avez pas créé ce compte, vous pouvez ignorer cet e-mail en toute sécurité.</p>
-        </div>
-    """
-
-    params = {
-        "from": f"Budget Tracker <{sender_email}>",
-        "to": [email],
-        "subject": "Budget Tracker - Vérifiez votre adresse e-mail",
-        "html": html_content,
-    }
-
-    try:
-        response = resend.Emails.send(params)
-        logger.info(f"Email Resend envoyé à {email}. Response: {response}")
-        return response
-    except Exception as e:
-        logger.error(f"Erreur Resend lors de l'envoi de l'e-mail: {str(e)}")
-        raise HTTPException(status_code=500, detail="Failed to send verification email.")
-
-def send_password_reset_email(email: str, token: str):
-    frontend_url = os.getenv("FRONTEND_URL")
-    sender_email = os.getenv("SENDER_EMAIL")
-    resend_api_key = os.getenv("RESEND_API_KEY")
-
-    if not all([frontend_url, sender_email, resend_api_key]):
-        logger.error("Variables Resend manquantes pour Reset Password")
-        raise HTTPException(status_code=500, detail="Email service is not configured.")
-
-    resend.api_key = resend_api_key
-    reset_link = f"{frontend_url}/reset-password?token={token}"
-    
-    html_content = f"""
-        <div style="font-family: Arial, sans-serif; line-height: 1.6; max-width: 600px; margin: auto; padding: 20px; border: 1px solid #ddd; border-radius: 10px;">
-            <h2 style="color: #333;">Réinitialisation de mot de passe</h2>
-            <p>Vous avez demandé à réinitialiser votre mot de passe pour Budget Tracker. Cliquez sur le bouton ci-dessous pour continuer :</p>
-            <p style="text-align: center; margin: 25px 0;">
-                <a href="{reset_link}" style="background-color: #dc3545; color: white; padding: 12px 25px; text-decoration: none; border-radius: 5px; display: inline-block; font-weight: bold;">
-                    Réinitialiser mon mot de passe
-                </a>
-            </p>
-            <p>Ce lien est valide pendant {PASSWORD_RESET_TOKEN_EXPIRE_MINUTES} minutes.</p>
-            <p style="font-size: 0.9em; color: #777;">Si vous n'êtes pas à l'origine de cette demande, vous pouvez ignorer cet e-mail.</p>
-        </div>
-    """
-
-    params = {
-        "from": f"Budget Tracker <{sender_email}>",
-        "to": [email],
-        "subject": "Budget Tracker - Réinitialisation de votre mot de passe",
-        "html": html_content,
-    }
-
-    try:
-        response = resend.Emails.send(params)
-        logger.info(f"Email Reset Resend envoyé à {email}. Response: {response}")
-    except Exception as e:
-        logger.error(f"Erreur critique lors de l'envoi de l'e-mail de réinitialisation: {e}")
-        raise HTTPException(status_code=500, detail="Failed to send password reset email.")
-
 # --- Fonctions de l'Utilisateur & Auth ---
 
 async def get_user(email: str) -> Optional[UserInDB]:
@@ -558,7 +661,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserInDB:
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(token)
         if payload.get("scope") != "access": raise credentials_exception
         email: str = payload.get("sub")
         if email is None: raise credentials_exception
@@ -568,8 +671,22 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserInDB:
     
     user = await get_user(token_data.email)
     if user is None: raise credentials_exception
+    if issued_before_revocation(payload, user): raise credentials_exception
     return user
 
+def key_by_user(request: Request) -> str:
+    """Clé de rate limit par utilisateur authentifié (jeton vérifié), sinon par IP."""
+    auth = request.headers.get("authorization", "")
+    scheme, _, token = auth.partition(" ")
+    if scheme.lower() == "bearer" and token:
+        try:
+            payload = decode_token(token)
+            if payload.get("scope") == "access" and payload.get("sub"):
+                return "user:" + payload["sub"]
+        except JWTError:
+            pass
+    return key_by_ip(request)
+
 async def get_user_by_api_key(credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)) -> UserInDB:
     """Authentification spécifique pour le webhook (Machine to Machine via API Key)"""
     if not credentials or not credentials.credentials:
@@ -584,29 +701,121 @@ async def get_user_by_api_key(credentials: HTTPAuthorizationCredentials = Depend
     user["has_api_key"] = True
     return UserInDB(**user)
 
-# --- Gestion des Catégories par Défaut ---
-
-DEFAULT_CATEGORIES = [
-    {"name": "Salaire", "type": "Revenu"}, {"name": "Aide Papa", "type": "Revenu"},
-    {"name": "Autres revenu", "type": "Revenu"}, {"name": "Logement", "type": "Dépense"},
-    {"name": "Alimentation", "type": "Dépense"}, {"name": "Transport", "type": "Dépense"},
-    {"name": "Santé", "type": "Dépense"}, {"name": "Loisirs", "type": "Dépense"},
-    {"name": "Abonnements", "type": "Dépense"}, {"name": "Shopping", "type": "Dépense"},
-    {"name": "Autre dépense", "type": "Dépense"}, {"name": "Cadeaux", "type": "Dépense"},
-    {"name": "Coiffeur", "type": "Dépense"}, {"name": "Prêt", "type": "Dépense"},
-    {"name": "Restaurant", "type": "Dépense"}, {"name": "Investissement", "type": "Dépense"},
-    {"name": "Etudes", "type": "Dépense"}, {"name": "Vacances", "type": "Dépense"},
-]
+async def merchant_index(user: UserInDB) -> merchants.MerchantIndex:
+    return await merchant_indexes.get(transactions_collection, user.id)
 
-async def initialize_default_categories(user_id: str):
-    existing_count = await categories_collection.count_documents({"user_id": user_id})
-    if existing_count == 0:
-        for cat in DEFAULT_CATEGORIES:
-            category_id = str(uuid.uuid4())
-            await categories_collection.insert_one({
-                "id": category_id, "user_id": user_id, "name": cat["name"],
-                "type": cat["type"], "created_at": datetime.now(timezone.utc)
-            })
+async def user_categories(user: UserInDB) -> List[dict]:
+    """Catégories visibles : modèles partagés superposés aux catégories propres."""
+    return await category_templates.user_categories(categories_collection, user.id, user.uses_default_categories)
+
+async def find_category(user: UserInDB, category_id: str) -> Optional[dict]:
+    return await category_templates.find_one(categories_collection, user.id, user.uses_default_categories, category_id)
+
+# --- Versions des données (fraîcheur des snapshots) ---
+
+async def mark_transactions_changed(user_id: str, rewrite: bool = False, months=None):
+    """Incrémente tx_version (et tx_epoch si l'écriture n'est pas un simple ajout).
+
+    `months` : dates touchées, pour l'événement en direct (None : portée inconnue).
+    """
+    inc = {"tx_version": 1, "data_version": 1}
+    if rewrite:
+        inc["tx_epoch"] = 1
+    # tx_written_at : lectures analytiques sur le primaire le temps que les secondaires rattrapent
+    await users_collection.update_one({"id": user_id}, {"$inc": inc, "$set": {"tx_written_at": datetime.now(timezone.utc)}})
+    events.hub.notify(user_id, events.transactions_event(months))
+
+async def mark_data_changed(user_id: str):
+    """Incrémente data_version (budgets, catégories, récurrences, objectifs) : les réponses en cache sont périmées."""
+    await users_collection.update_one({"id": user_id}, {"$inc": {"data_version": 1}})
+
+def analytics_reads(user: UserInDB) -> read_routing.Reads:
+    """Collections des lectures analytiques de l'utilisateur (secondaires si possible)."""
+    return read_router.reads(user.tx_written_at)
+
+def get_fresh_snapshot(user: UserInDB):
+    """Snapshot colonnaire de l'utilisateur s'il est à jour, sinon None."""
+    if snapshot_store is None:
+        return None
+    return snapshot_store.get(user.id, user.tx_version, user.tx_epoch)
+
+# --- Archivage : routage des lectures ---
+
+def reaches_archive(user: UserInDB, start: Optional[datetime]) -> bool:
+    """Vrai si la période (début `start`, None = sans borne) commence avant l'horizon d'archivage de l'utilisateur."""
+    if user.archived_before is None:
+        return False
+    if start is None:
+        return True
+    archived_before = user.archived_before if user.archived_before.tzinfo else user.archived_before.replace(tzinfo=timezone.utc)
+    return (start if start.tzinfo else start.replace(tzinfo=timezone.utc)) < archived_before
+
+async def find_transactions(user: UserInDB, query: dict, start: Optional[datetime], newest_first: bool = False) -> list:
+    """find() sur les transactions, complété par l'archive si la période l'atteint."""
+    reads = analytics_reads(user)
+    cursor = reads.transactions.find(query)
+    if newest_first:
+        cursor = cursor.sort("date", -1)
+    transactions = await cursor.to_list(None)
+    if reaches_archive(user, start):
+        archived = await reads.archive.find(archive.settled(query)).to_list(None)
+        # Une transaction déplacée de l'archive vers la collection chaude (update_transaction) y reste un instant
+        merged = {t["_id"]: t for t in archived}
+        merged.update((t["_id"], t) for t in transactions)
+        transactions = list(merged.values())
+        if newest_first:
+            transactions.sort(key=lambda t: t["date"], reverse=True)
+    return transactions
+
+def stream_transactions(user: UserInDB, query: dict, start: Optional[datetime]):
+    """Transactions triées par date, lues par lots ; chaudes et archivées fusionnées au fil de l'eau."""
+    reads = analytics_reads(user)
+    sources = [reads.transactions.find(query).sort("date", 1).batch_size(export.EXPORT_BATCH_SIZE)]
+    if reaches_archive(user, start):
+        sources.append(reads.archive.find(archive.settled(query)).sort("date", 1).batch_size(export.EXPORT_BATCH_SIZE))
+    return compact.merge_sorted(sources, key=lambda t: t["date"])
+
+async def find_transaction_for_update(user: UserInDB, transaction_id: str):
+    """(document, collection) de la transaction, chaude ou archivée ; (None, None) si absente."""
+    query = {"id": transaction_id, "user_id": user.id}
+    existing = await transactions_collection.find_one(query)
+    if existing:
+        return existing, transactions_collection
+    if user.archived_before is not None:
+        existing = await transactions_archive_collection.find_one(query)
+        if existing:
+            return existing, transactions_archive_collection
+    return None, None
+
+# --- Agrégations côté Python (chemin sans snapshot) ---
+
+def summarize_transactions(transactions: list):
+    """Un seul passage : (revenus, dépenses, dépenses par catégorie, plus grosse dépense)."""
+    revenus, depenses = 0, 0
+    spending_by_cat = {}
+    biggest = None
+    for t in transactions:
+        amount = t["amount"]
+        if t["type"] == "Revenu":
+            revenus += amount
+        elif t["type"] == "Dépense":
+            depenses += amount
+            if biggest is None or amount > biggest["amount"]:
+                biggest = t
+            cid = t.get("category_id")
+            if cid:
+                spending_by_cat[cid] = spending_by_cat.get(cid, 0) + amount
+    # Montants au centime : on élimine la dérive des sommes de flottants
+    spending_by_cat = {cid: round(value, 2) for cid, value in spending_by_cat.items()}
+    return round(revenus, 2), round(depenses, 2), spending_by_cat, biggest
+
+def transaction_row(t: dict) -> dict:
+    """Document Mongo -> ligne renvoyée par GET /api/transactions."""
+    return {
+        "id": t["id"], "date": t["date"], "amount": t["amount"], "type": t["type"],
+        "description": t.get("description"), "category_id": t.get("category_id"),
+        "subcategory_id": t.get("subcategory_id"), "created_at": t["created_at"]
+    }
 
 # --- FONCTION SMART RECURRING (AMÉLIORÉE) ---
 async def internal_generate_recurring(user_id: str):
@@ -638,7 +847,10 @@ async def internal_generate_recurring(user_id: str):
                     "description": recurring.get("description"), "category_id": recurring.get("category_id"),
                     "subcategory_id": recurring.get("subcategory_id"), "created_at": datetime.now(timezone.utc)
                 })
+                merchant_indexes.learn(user_id, recurring.get("description"), recurring.get("category_id"), recurring.get("subcategory_id"))
                 generated_count += 1
+    if generated_count:
+        await mark_transactions_changed(user_id, months=[now])
     return generated_count
 
 # --- Routes d'Authentification (Avec Rate Limiting) ---
@@ -663,7 +875,8 @@ async def register_user(request: Request, user: UserCreate):
         "mfa_enabled": False, 
         "mfa_secret": None,
         "currency": "EUR",
-        "api_key": None
+        "api_key": None,
+        category_templates.FLAG: not is_first_user,
     }
     
     if is_first_user:
@@ -672,10 +885,11 @@ async def register_user(request: Request, user: UserCreate):
         await categories_collection.update_many({"user_id": {"$exists": False}}, {"$set": {"user_id": user_id}})
         await subcategories_collection.update_many({"user_id": {"$exists": False}}, {"$set": {"user_id": user_id}})
         await recurring_transactions_collection.update_many({"user_id": {"$exists": False}}, {"$set": {"user_id": user_id}})
+        await mark_transactions_changed(user_id, rewrite=True)
     else:
         try:
             verification_token = create_verification_token(user.email)
-            send_verification_email(user.email, verification_token) 
+            mailer.send_verification_email(user.email, verification_token) 
         except HTTPException as he:
             raise he
         except Exception as e:
@@ -683,7 +897,6 @@ async def register_user(request: Request, user: UserCreate):
             raise HTTPException(status_code=500, detail="Impossible d'envoyer l'e-mail de vérification.")
         
         await users_collection.insert_one(new_user_data)
-        await initialize_default_categories(user_id)
             
     return UserPublic(**new_user_data)
 
@@ -709,12 +922,12 @@ async def login_for_access_token(request: Request, form_data: OAuth2PasswordRequ
         await internal_generate_recurring(user.id)
 
     if user.mfa_enabled:
-        mfa_token = create_mfa_token(user.email)
+        mfa_token = create_mfa_token(user.email, user.token_generation)
         return TokenResponse(mfa_required=True, mfa_token=mfa_token)
     else:
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = create_access_token(
-            data={"sub": user.email, "scope": "access"}, 
+            data={"sub": user.email, "gen": user.token_generation, "scope": "access"},
             expires_delta=access_token_expires
         )
         return TokenResponse(access_token=access_token, token_type="bearer", mfa_required=False)
@@ -726,12 +939,14 @@ async def mfa_login(request: Request, mfa_data: MfaLoginRequest):
     user = await get_user(email)
     if not user or not user.mfa_enabled or not user.mfa_secret:
         raise HTTPException(status_code=400, detail="MFA is not enabled.")
+    if issued_before_revocation(decode_token(mfa_data.mfa_token), user):
+        raise HTTPException(status_code=401, detail="Invalid or expired MFA session. Please log in again.")
         
-    if not verify_mfa_code(user.mfa_secret, mfa_data.mfa_code):
+    if not mfa.verify_mfa_code(user.mfa_secret, mfa_data.mfa_code):
         raise HTTPException(status_code=401, detail="Invalid MFA code.")
         
     await internal_generate_recurring(user.id)
-    access_token = create_access_token(data={"sub": user.email, "scope": "access"})
+    access_token = create_access_token(data={"sub": user.email, "gen": user.token_generation, "scope": "access"})
     return Token(access_token=access_token, token_type="bearer")
 
 @app.get("/api/auth/verify-email")
@@ -749,8 +964,8 @@ async def forgot_password(request: Request, data: ForgotPasswordRequest):
     user = await get_user(data.email)
     if user:
         try:
-            password_reset_token = create_password_reset_token(user.email)
-            send_password_reset_email(user.email, password_reset_token)
+            password_reset_token = create_password_reset_token(user.email, user.token_generation)
+            mailer.send_password_reset_email(user.email, password_reset_token, PASSWORD_RESET_TOKEN_EXPIRE_MINUTES)
         except Exception as e:
             logger.error(f"Error sending forgot password email: {e}")
     return {"message": "If an account exists, a reset link has been sent."}
@@ -760,11 +975,14 @@ async def reset_password(data: ResetPasswordRequest):
     email = await get_email_from_password_reset_token(data.token)
     user = await get_user(email)
     if not user: raise HTTPException(status_code=404, detail="User not found")
+    # Le lien de réinitialisation n'est utilisable qu'une fois
+    if issued_before_revocation(decode_token(data.token), user):
+        raise HTTPException(status_code=400, detail="Invalid or expired password reset token.")
     if len(data.new_password) < 8:
          raise HTTPException(status_code=400, detail="Password too short")
             
     new_hashed_password = get_password_hash(data.new_password)
-    await users_collection.update_one({"id": user.id}, {"$set": {"hashed_password": new_hashed_password}})
+    await users_collection.update_one({"id": user.id}, {"$set": {"hashed_password": new_hashed_password}, **revoke_tokens(user.email)})
     return {"message": "Password updated successfully."}
 
 @app.get("/api/users/me", response_model=UserPublic)
@@ -778,8 +996,16 @@ async def change_password(password_data: PasswordChangeRequest, current_user: Us
     if len(password_data.new_password) < 8:
          raise HTTPException(status_code=400, detail="Password too short")
     new_hashed_password = get_password_hash(password_data.new_password)
-    await users_collection.update_one({"id": current_user.id}, {"$set": {"hashed_password": new_hashed_password}})
-    return {"message": "Password updated successfully"}
+    updated = await users_collection.find_one_and_update(
+        {"id": current_user.id}, {"$set": {"hashed_password": new_hashed_password}, **revoke_tokens(current_user.email)},
+        projection={"token_generation": 1}, return_document=ReturnDocument.AFTER,
+    )
+    # Les autres sessions sont déconnectées ; la session courante reçoit un nouveau jeton
+    access_token = create_access_token(
+        data={"sub": current_user.email, "gen": updated["token_generation"], "scope": "access"},
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
+    )
+    return {"message": "Password updated successfully", "access_token": access_token, "token_type": "bearer"}
 
 @app.put("/api/users/me/currency")
 async def update_user_currency(currency_data: CurrencyUpdateRequest, current_user: UserInDB = Depends(get_current_user)):
@@ -802,14 +1028,41 @@ async def revoke_api_key(current_user: UserInDB = Depends(get_current_user)):
     await users_collection.update_one({"id": current_user.id}, {"$set": {"api_key": None}})
     return {"message": "API key révoquée avec succès."}
 
+# --- Sauvegarde / Restauration du compte ---
+
+@app.get("/api/users/me/backup")
+@limiter.limit("2/minute", key_func=key_by_user)
+async def backup_account(request: Request, current_user: UserInDB = Depends(get_current_user)):
+    """Archive NDJSON gzip de toutes les données du compte (sans identifiants de connexion), en flux."""
+    headers = {"Content-Disposition": f'attachment; filename="{backup.filename()}"'}
+    return StreamingResponse(backup.backup_stream(db, current_user.id), media_type="application/gzip", headers=headers)
+
+@app.post("/api/users/me/restore")
+@limiter.limit("2/minute", key_func=key_by_user)
+async def restore_account(request: Request, file: UploadFile = File(...), confirm: bool = False,
+                          current_user: UserInDB = Depends(get_current_user)):
+    """Remplace toutes les données du compte par celles de l'archive (validée entièrement au préalable)."""
+    if not confirm:
+        raise HTTPException(status_code=400, detail="La restauration remplace toutes les données du compte : confirm=true requis.")
+    try:
+        await run_in_threadpool(backup.validate, file.file)
+        file.file.seek(0)
+        _, restored = await backup.restore(db, file.file, current_user.id)
+    except backup.BackupError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    logger.info(f"Compte {current_user.email} restauré : {restored}")
+    merchant_indexes.invalidate(current_user.id)
+    events.hub.notify(current_user.id, events.RESYNC)
+    return {"message": "Sauvegarde restaurée.", "restored": restored}
+
 
 # --- Routes MFA ---
 
 @app.get("/api/mfa/setup", response_model=MfaSetupResponse)
 async def mfa_setup_generate(current_user: UserInDB = Depends(get_current_user)):
     if current_user.mfa_enabled: raise HTTPException(status_code=400, detail="MFA already enabled.")
-    secret_key = pyotp.random_base32()
-    qr_code_uri = generate_qr_code_data_uri(current_user.email, secret_key)
+    secret_key = mfa.new_secret()
+    qr_code_uri = mfa.generate_qr_code_data_uri(current_user.email, secret_key)
     await users_collection.update_one({"id": current_user.id}, {"$set": {"mfa_secret": secret_key, "mfa_enabled": False}})
     return MfaSetupResponse(secret_key=secret_key, qr_code_data_uri=qr_code_uri)
 
@@ -817,7 +1070,7 @@ async def mfa_setup_generate(current_user: UserInDB = Depends(get_current_user))
 async def mfa_setup_verify(mfa_data: MfaVerifyRequest, current_user: UserInDB = Depends(get_current_user)):
     if current_user.mfa_enabled: raise HTTPException(status_code=400, detail="MFA already enabled.")
     if not current_user.mfa_secret: raise HTTPException(status_code=400, detail="Setup not initiated.")
-    if not verify_mfa_code(current_user.mfa_secret, mfa_data.mfa_code):
+    if not mfa.verify_mfa_code(current_user.mfa_secret, mfa_data.mfa_code):
         raise HTTPException(status_code=400, detail="Invalid MFA code.")
     await users_collection.update_one({"id": current_user.id}, {"$set": {"mfa_enabled": True}})
     return {"message": "MFA enabled successfully."}
@@ -827,7 +1080,7 @@ async def mfa_disable(mfa_data: MfaDisableRequest, current_user: UserInDB = Depe
     if not current_user.mfa_enabled: raise HTTPException(status_code=400, detail="MFA not enabled.")
     if not verify_password(mfa_data.password, current_user.hashed_password):
         raise HTTPException(status_code=401, detail="Incorrect password.")
-    if not verify_mfa_code(current_user.mfa_secret, mfa_data.mfa_code):
+    if not mfa.verify_mfa_code(current_user.mfa_secret, mfa_data.mfa_code):
         raise HTTPException(status_code=401, detail="Invalid MFA code.")
     await users_collection.update_one({"id": current_user.id}, {"$set": {"mfa_enabled": False, "mfa_secret": None}})
     return {"message": "MFA disabled successfully."}
@@ -838,10 +1091,89 @@ async def mfa_disable(mfa_data: MfaDisableRequest, current_user: UserInDB = Depe
 async def health():
     return {"status": "ok"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint(request: Request):
+    if METRICS_TOKEN and not secrets.compare_digest(request.headers.get("authorization", ""), f"Bearer {METRICS_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return PlainTextResponse(metrics.render_latest(), media_type="text/plain; version=0.0.4")
+
+# --- PROFILS DE REQUÊTES (ADMIN) ---
+
+def require_profile_admin(request: Request):
+    """Accès aux profils : même en-tête signé X-Profile que pour les déclencher."""
+    if not profiling.verify_token(request.headers.get("x-profile")):
+        raise HTTPException(status_code=403, detail="Invalid or expired profiling token")
+
+@app.get("/api/admin/profiles", dependencies=[Depends(require_profile_admin)])
+async def list_profiles():
+    return profiling.list_summaries()
+
+@app.get("/api/admin/profiles/{profile_id}", dependencies=[Depends(require_profile_admin)])
+async def get_profile(profile_id: str):
+    summary = profiling.load_summary(profile_id)
+    if not summary: raise HTTPException(status_code=404, detail="Profile not found")
+    return summary
+
+@app.get("/api/admin/profiles/{profile_id}/download", dependencies=[Depends(require_profile_admin)])
+async def download_profile(profile_id: str):
+    path = profiling.profile_path(profile_id)
+    if not path: raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.prof")
+
+@app.get("/api/ready")
+async def ready():
+    """Sonde de disponibilité : vérifie MongoDB et mesure la latence du ping."""
+    started = time.perf_counter()
+    try:
+        await db.command("ping")
+    except Exception as e:
+        logger.warning(f"Readiness : MongoDB injoignable ({e})")
+        return UnifiedJSONResponse(status_code=503, content={"status": "unavailable", "mongo": "unreachable"})
+    return {"status": "ready", "mongo_ping_ms": round((time.perf_counter() - started) * 1000, 2)}
+
+# --- ÉVÉNEMENTS EN DIRECT (SSE) ---
+
+@app.post("/api/events/token")
+async def create_events_token(token: str = Depends(oauth2_scheme), current_user: UserInDB = Depends(get_current_user)):
+    """Jeton de flux de courte durée, à passer à /api/events (voir events.py)."""
+    expires = datetime.now(timezone.utc) + timedelta(seconds=events.TOKEN_SECONDS)
+    to_encode = {
+        "sub": current_user.email, "exp": expires, "iat": int(time.time()), "gen": current_user.token_generation,
+        "session_exp": decode_token(token)["exp"], "scope": "events",
+    }
+    return {"token": jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM), "expires_in": events.TOKEN_SECONDS}
+
+@app.get("/api/events")
+async def stream_events(request: Request, token: str = Query(...)):
+    """Deltas en direct de l'utilisateur (voir events.py). Jeton de flux en paramètre : EventSource n'envoie pas d'en-têtes."""
+    credentials_exception = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
+    try:
+        payload = decode_token(token)
+    except JWTError:
+        raise credentials_exception
+    if payload.get("scope") != "events" or not payload.get("sub"):
+        raise credentials_exception
+    current_user = await get_user(payload["sub"])
+    if current_user is None or issued_before_revocation(payload, current_user):
+        raise credentials_exception
+
+    async def still_valid() -> bool:
+        user = await get_user(payload["sub"])
+        return user is not None and not issued_before_revocation(payload, user)
+
+    try:
+        subscription = events.hub.subscribe(current_user.id)
+    except events.TooManyConnections:
+        raise HTTPException(status_code=429, detail="Trop de connexions ouvertes.")
+    body = events.sse_stream(subscription, request.is_disconnected, payload.get("session_exp"), still_valid)
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(body, media_type="text/event-stream", headers=headers)
+
 # --- WEBHOOKS & INBOX (PENDING TRANSACTIONS) ---
 
 @app.post("/api/webhooks/apple-pay")
-async def webhook_apple_pay(payload: WebhookPayload, current_user: UserInDB = Depends(get_user_by_api_key)):
+@limiter.limit("60/minute", key_func=key_by_credential)
+async def webhook_apple_pay(request: Request, payload: WebhookPayload, current_user: UserInDB = Depends(get_user_by_api_key)):
     pending_id = str(uuid.uuid4())
     doc = {
         "id": pending_id,
@@ -851,7 +1183,11 @@ async def webhook_apple_pay(payload: WebhookPayload, current_user: UserInDB = De
         "date": payload.date,
         "created_at": datetime.now(timezone.utc)
     }
+    suggestion = (await merchant_index(current_user)).lookup(payload.merchant)
+    if suggestion:
+        doc.update(suggestion._asdict())
     await pending_transactions_collection.insert_one(doc)
+    events.hub.notify(current_user.id, events.pending_added(doc))
     return {"message": "Transaction logged as pending successfully.", "id": pending_id}
 
 @app.get("/api/transactions/pending", response_model=List[PendingTransactionResponse])
@@ -862,12 +1198,16 @@ async def get_pending_transactions(current_user: UserInDB = Depends(get_current_
         "amount": p["amount"],
         "merchant": p["merchant"],
         "date": p["date"],
-        "created_at": p["created_at"]
+        "created_at": p["created_at"],
+        "category_id": p.get("category_id"),
+        "subcategory_id": p.get("subcategory_id"),
+        "confidence": p.get("confidence")
     } for p in pending]
 
 @app.post("/api/transactions/pending/{pending_id}/resolve")
 async def resolve_pending_transaction(pending_id: str, payload: ResolvePendingRequest, current_user: UserInDB = Depends(get_current_user)):
-    pending = await pending_transactions_collection.find_one({"id": pending_id, "user_id": current_user.id})
+    # Réservé par sa suppression : une validation concurrente (ou auto-categorize) ne le traite pas une 2e fois
+    pending = await pending_transactions_collection.find_one_and_delete({"id": pending_id, "user_id": current_user.id})
     if not pending: 
         raise HTTPException(status_code=404, detail="Pending transaction not found")
 
@@ -887,21 +1227,54 @@ async def resolve_pending_transaction(pending_id: str, payload: ResolvePendingRe
     }
     
     await transactions_collection.insert_one(new_tx)
-    await pending_transactions_collection.delete_one({"id": pending_id})
+    merchant_indexes.learn(current_user.id, final_desc, payload.category_id, payload.subcategory_id)
+    events.hub.notify(current_user.id, events.pending_removed(pending_id))
+    await mark_transactions_changed(current_user.id, months=[pending["date"]])
     
     return {"message": "Pending transaction resolved and inserted.", "transaction_id": transaction_id}
 
+@app.post("/api/transactions/pending/auto-categorize")
+async def auto_categorize_pending(min_confidence: float = Query(merchants.MIN_CONFIDENCE, ge=0, le=1),
+                                  current_user: UserInDB = Depends(get_current_user)):
+    """Valide d'un coup les éléments de l'inbox dont la catégorie est connue avec assez de confiance."""
+    index = await merchant_index(current_user)
+    pending = await pending_transactions_collection.find({"user_id": current_user.id}).to_list(None)
+    now = datetime.now(timezone.utc)
+    resolved, new_txs = [], []
+    for p in pending:
+        suggestion = index.lookup(p["merchant"])
+        if not suggestion or suggestion.confidence < min_confidence:
+            continue
+        # Réservation : un appel concurrent (double clic, autre onglet) ne crée pas la transaction une 2e fois
+        if not await pending_transactions_collection.find_one_and_delete({"id": p["id"], "user_id": current_user.id}, projection={"_id": 1}):
+            continue
+        resolved.append(p["id"])
+        new_txs.append({
+            "id": str(uuid.uuid4()), "user_id": current_user.id, "date": p["date"], "amount": p["amount"],
+            "type": "Dépense", "description": p["merchant"], "category_id": suggestion.category_id,
+            "subcategory_id": suggestion.subcategory_id, "created_at": now
+        })
+    if new_txs:
+        await transactions_collection.insert_many(new_txs)
+        for t in new_txs:
+            index.learn(t["description"], t["category_id"], t["subcategory_id"])
+        for pending_id in resolved:
+            events.hub.notify(current_user.id, events.pending_removed(pending_id))
+        await mark_transactions_changed(current_user.id, months=[t["date"] for t in new_txs])
+    return {"resolved": len(new_txs), "remaining": len(pending) - len(new_txs)}
+
 @app.delete("/api/transactions/pending/{pending_id}")
 async def delete_pending_transaction(pending_id: str, current_user: UserInDB = Depends(get_current_user)):
     res = await pending_transactions_collection.delete_one({"id": pending_id, "user_id": current_user.id})
     if res.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Pending transaction not found")
+    events.hub.notify(current_user.id, events.pending_removed(pending_id))
     return {"message": "Pending transaction deleted."}
 
 # Category Routes
 @app.get("/api/categories")
 async def get_categories(current_user: UserInDB = Depends(get_current_user)):
-    categories = await categories_collection.find({"user_id": current_user.id}).to_list(None)
+    categories = await user_categories(current_user)
     return [{"id": cat["id"], "name": cat["name"], "type": cat["type"], "created_at": cat["created_at"]} for cat in categories]
 
 @app.post("/api/categories")
@@ -912,29 +1285,38 @@ async def create_category(category: CategoryCreate, current_user: UserInDB = Dep
         "type": category.type, "created_at": datetime.now(timezone.utc)
     }
     await categories_collection.insert_one(new_category_data.copy())
+    await mark_data_changed(current_user.id)
     return new_category_data
 
 @app.put("/api/categories/{category_id}")
 async def update_category(category_id: str, category: CategoryUpdate, current_user: UserInDB = Depends(get_current_user)):
-    existing = await categories_collection.find_one({"id": category_id, "user_id": current_user.id})
+    existing = await find_category(current_user, category_id)
     if not existing: raise HTTPException(status_code=404, detail="Category not found")
     
     update_data = {k: v for k, v in category.dict(exclude_unset=True).items()}
     if update_data:
-        await categories_collection.update_one({"id": category_id, "user_id": current_user.id}, {"$set": update_data})
+        await category_templates.update(categories_collection, current_user.id, category_id, update_data)
+        await mark_data_changed(current_user.id)
     
-    updated = await categories_collection.find_one({"id": category_id, "user_id": current_user.id})
+    updated = await find_category(current_user, category_id)
     updated.pop("_id", None) # Nettoyage JSON
     return updated
 
 @app.delete("/api/categories/{category_id}")
 async def delete_category(category_id: str, current_user: UserInDB = Depends(get_current_user)):
-    existing = await categories_collection.find_one({"id": category_id, "user_id": current_user.id})
+    existing = await find_category(current_user, category_id)
     if not existing: raise HTTPException(status_code=404, detail="Category not found")
     await subcategories_collection.delete_many({"category_id": category_id, "user_id": current_user.id})
     await transactions_collection.update_many({"category_id": category_id, "user_id": current_user.id}, {"$set": {"category_id": None, "subcategory_id": None}})
+    if current_user.archived_before is not None:
+        result = await transactions_archive_collection.update_many({"category_id": category_id, "user_id": current_user.id}, {"$set": {"category_id": None, "subcategory_id": None}})
+        if result.modified_count:
+            await archive.rebuild_summaries(db, current_user.id)
     await budgets_collection.delete_many({"category_id": category_id, "user_id": current_user.id})
-    await categories_collection.delete_one({"id": category_id, "user_id": current_user.id})
+    await pending_transactions_collection.update_many({"category_id": category_id, "user_id": current_user.id}, {"$set": {"category_id": None, "subcategory_id": None, "confidence": None}})
+    await category_templates.delete(categories_collection, current_user.id, category_id)
+    merchant_indexes.invalidate(current_user.id)
+    await mark_transactions_changed(current_user.id, rewrite=True)
     return {"message": "Category deleted successfully"}
 
 # SubCategory Routes
@@ -945,7 +1327,7 @@ async def get_subcategories(current_user: UserInDB = Depends(get_current_user)):
 
 @app.post("/api/subcategories")
 async def create_subcategory(subcategory: SubCategoryCreate, current_user: UserInDB = Depends(get_current_user)):
-    category = await categories_collection.find_one({"id": subcategory.category_id, "user_id": current_user.id})
+    category = await find_category(current_user, subcategory.category_id)
     if not category: raise HTTPException(status_code=404, detail="Category not found")
     subcategory_id = str(uuid.uuid4())
     new_subcategory_data = {
@@ -971,18 +1353,39 @@ async def delete_subcategory(subcategory_id: str, current_user: UserInDB = Depen
     existing = await subcategories_collection.find_one({"id": subcategory_id, "user_id": current_user.id})
     if not existing: raise HTTPException(status_code=404, detail="SubCategory not found")
     await transactions_collection.update_many({"subcategory_id": subcategory_id, "user_id": current_user.id}, {"$set": {"subcategory_id": None}})
+    if current_user.archived_before is not None:
+        await transactions_archive_collection.update_many({"subcategory_id": subcategory_id, "user_id": current_user.id}, {"$set": {"subcategory_id": None}})
+    await pending_transactions_collection.update_many({"subcategory_id": subcategory_id, "user_id": current_user.id}, {"$set": {"subcategory_id": None}})
     await subcategories_collection.delete_one({"id": subcategory_id, "user_id": current_user.id})
+    merchant_indexes.invalidate(current_user.id)
+    await mark_transactions_changed(current_user.id, rewrite=True)
     return {"message": "SubCategory deleted successfully"}
 
 # --- Transactions ---
 
+# Requêtes identiques concurrentes de la liste : un seul calcul
+transactions_flight = singleflight.SingleFlight("transactions")
+
 @app.get("/api/transactions")
 async def get_transactions(
     start_date: Optional[str] = None, end_date: Optional[str] = None,
     category_id: Optional[str] = None, search: Optional[str] = None,
     current_user: UserInDB = Depends(get_current_user)
 ):
-    query = {"user_id": current_user.id} 
+    query = transactions_query(current_user, start_date, end_date, category_id, search)
+    start = query["date"]["$gte"] if "date" in query else None
+
+    async def load():
+        transactions = await find_transactions(current_user, query, start, newest_first=True)
+        return [transaction_row(t) for t in transactions]
+    key = (current_user.id, current_user.data_version, start_date, end_date, category_id, search)
+    # Réponse directe : pas de jsonable_encoder sur chaque ligne, dates natives en MessagePack
+    return UnifiedJSONResponse(await transactions_flight.do(key, load))
+
+def transactions_query(user: UserInDB, start_date: Optional[str], end_date: Optional[str],
+                       category_id: Optional[str], search: Optional[str]) -> dict:
+    """Filtres communs de la liste et de l'export des transactions."""
+    query = {"user_id": user.id}
     if start_date and end_date:
         query["date"] = {
             "$gte": datetime.fromisoformat(start_date.replace('Z', '+00:00')),
@@ -990,13 +1393,36 @@ async def get_transactions(
         }
     if category_id: query["category_id"] = category_id
     if search: query["description"] = {"$regex": search, "$options": "i"}
-    
-    transactions = await transactions_collection.find(query).sort("date", -1).to_list(None)
-    return [{
-        "id": t["id"], "date": t["date"], "amount": t["amount"], "type": t["type"],
-        "description": t.get("description"), "category_id": t.get("category_id"),
-        "subcategory_id": t.get("subcategory_id"), "created_at": t["created_at"]
-    } for t in transactions]
+    return query
+
+@app.get("/api/transactions/export")
+@limiter.limit("5/minute", key_func=key_by_user)
+async def export_transactions(
+    request: Request, fmt: str = Query("csv", alias="format"),
+    start_date: Optional[str] = None, end_date: Optional[str] = None,
+    category_id: Optional[str] = None, search: Optional[str] = None,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """Export CSV (gzip si accepté) ou XLSX, en flux : mémoire constante quel que soit l'historique."""
+    if fmt not in export.MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="Format inconnu (csv ou xlsx).")
+    query = transactions_query(current_user, start_date, end_date, category_id, search)
+    start = query["date"]["$gte"] if "date" in query else None
+    cats = await user_categories(current_user)
+    subs = await subcategories_collection.find({"user_id": current_user.id}, {"_id": 0, "id": 1, "name": 1}).to_list(None)
+    cat_map = {c["id"]: c["name"] for c in cats}
+    sub_map = {s["id"]: s["name"] for s in subs}
+    transactions = stream_transactions(current_user, query, start)
+
+    headers = {"Content-Disposition": f'attachment; filename="{export.filename(fmt)}"'}
+    if fmt == "csv":
+        compress = "gzip" in request.headers.get("accept-encoding", "")
+        if compress:
+            headers["Content-Encoding"] = "gzip"
+        body = export.csv_stream(transactions, cat_map, sub_map, compress)
+    else:
+        body = export.xlsx_stream(transactions, cat_map, sub_map)
+    return StreamingResponse(body, media_type=export.MEDIA_TYPES[fmt], headers=headers)
 
 @app.post("/api/transactions")
 async def create_transaction(transaction: TransactionCreate, current_user: UserInDB = Depends(get_current_user)):
@@ -1008,27 +1434,48 @@ async def create_transaction(transaction: TransactionCreate, current_user: UserI
         "created_at": datetime.now(timezone.utc)
     }
     await transactions_collection.insert_one(new_transaction_data.copy())
+    merchant_indexes.learn(current_user.id, transaction.description, transaction.category_id, transaction.subcategory_id)
+    await mark_transactions_changed(current_user.id, months=[transaction.date])
     return new_transaction_data
 
 @app.put("/api/transactions/{transaction_id}")
 async def update_transaction(transaction_id: str, transaction: TransactionUpdate, current_user: UserInDB = Depends(get_current_user)):
-    existing = await transactions_collection.find_one({"id": transaction_id, "user_id": current_user.id})
+    existing, collection = await find_transaction_for_update(current_user, transaction_id)
     if not existing: raise HTTPException(status_code=404, detail="Transaction not found")
     
     update_data = {k: v for k, v in transaction.dict(exclude_unset=True).items()}
     if update_data:
-        await transactions_collection.update_one({"id": transaction_id, "user_id": current_user.id}, {"$set": update_data})
+        await collection.update_one({"id": transaction_id, "user_id": current_user.id}, {"$set": update_data})
+        if collection is transactions_collection:
+            merchant_indexes.forget(current_user.id, existing.get("description"), existing.get("category_id"), existing.get("subcategory_id"))
+            merged = {**existing, **update_data}
+            merchant_indexes.learn(current_user.id, merged.get("description"), merged.get("category_id"), merged.get("subcategory_id"))
+        if collection is transactions_archive_collection:
+            new_date = update_data.get("date", existing["date"])
+            if not reaches_archive(current_user, new_date):
+                # Déplacée après l'horizon : elle redevient une transaction « chaude »
+                moved = await transactions_archive_collection.find_one({"id": transaction_id, "user_id": current_user.id})
+                await transactions_collection.insert_one(moved)
+                await transactions_archive_collection.delete_one({"_id": moved["_id"]})
+                collection = transactions_collection
+            await archive.rebuild_summaries(db, current_user.id, [existing["date"], new_date])
+        await mark_transactions_changed(current_user.id, rewrite=True, months=[existing["date"], update_data.get("date")])
     
-    updated = await transactions_collection.find_one({"id": transaction_id, "user_id": current_user.id})
+    updated = await collection.find_one({"id": transaction_id, "user_id": current_user.id})
     if updated:
         updated.pop("_id", None)
     return updated
 
 @app.delete("/api/transactions/{transaction_id}")
 async def delete_transaction(transaction_id: str, current_user: UserInDB = Depends(get_current_user)):
-    existing = await transactions_collection.find_one({"id": transaction_id, "user_id": current_user.id})
+    existing, collection = await find_transaction_for_update(current_user, transaction_id)
     if not existing: raise HTTPException(status_code=404, detail="Transaction not found")
-    await transactions_collection.delete_one({"id": transaction_id, "user_id": current_user.id})
+    await collection.delete_one({"id": transaction_id, "user_id": current_user.id})
+    if collection is transactions_collection:
+        merchant_indexes.forget(current_user.id, existing.get("description"), existing.get("category_id"), existing.get("subcategory_id"))
+    if collection is transactions_archive_collection:
+        await archive.rebuild_summaries(db, current_user.id, [existing["date"]])
+    await mark_transactions_changed(current_user.id, rewrite=True, months=[existing["date"]])
     return {"message": "Transaction deleted successfully"}
 
 @app.post("/api/transactions/bulk")
@@ -1044,98 +1491,35 @@ async def create_bulk_transactions(data: TransactionBulk, current_user: UserInDB
         }
         new_transactions_data.append(new_transaction_doc) 
     if not new_transactions_data: raise HTTPException(status_code=400, detail="No transactions.")
+    index = await merchant_index(current_user)
+    index.apply(new_transactions_data)
     try:
         await transactions_collection.insert_many(new_transactions_data, ordered=False)
+        for t in new_transactions_data:
+            index.learn(t["description"], t["category_id"], t["subcategory_id"])
         return {"message": f"{len(new_transactions_data)} transactions imported."}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        # Même un insert_many partiel modifie les données
+        await mark_transactions_changed(current_user.id, months=[t["date"] for t in new_transactions_data])
 
-# --- ANALYSE PDF PAR LLM GEMINI ---
+# --- ANALYSE PDF (FORMATS CONNUS, SINON LLM GEMINI) ---
 
 @app.post("/api/transactions/parse-pdf")
-@limiter.limit("2/minute")
-async def parse_pdf_transactions(request: Request, file: UploadFile = File(...), current_user: UserInDB = Depends(get_current_user)):
-    """Analyse un relevé bancaire PDF via Google Gemini pour en extraire les transactions."""
-    if not GEMINI_API_KEY:
-        raise HTTPException(status_code=500, detail="L'analyse IA (Gemini) n'est pas configurée sur le serveur.")
+@limiter.limit("2/minute", key_func=key_by_user)
+async def parse_pdf_transactions(request: Request, response: Response, file: UploadFile = File(...), current_user: UserInDB = Depends(get_current_user)):
+    """Analyse un relevé bancaire PDF (format connu, sinon Google Gemini) pour en extraire les transactions.
 
+    Les pages qu'un morceau en échec n'a pas permis d'analyser sont listées dans X-Unparsed-Pages (« 5-8,13-16 »).
+    """
     try:
         contents = await file.read()
-        pdf_file = io.BytesIO(contents)
-        raw_text = ""
-
-        # Extraction brutale du texte sans chercher de format
-        with pdfplumber.open(pdf_file) as pdf:
-            for page in pdf.pages:
-                text = page.extract_text()
-                if text:
-                    raw_text += text + "\n"
-                    
-        if not raw_text.strip():
-            raise HTTPException(status_code=400, detail="Impossible d'extraire du texte de ce PDF.")
-
-        # Le Prompt Strict
-        prompt = f"""
-        Tu es un expert comptable spécialisé dans l'extraction de données financières.
-        Analyse le texte brut de ce relevé bancaire et extrais UNIQUEMENT les transactions bancaires.
-        Ignore le texte informatif, les soldes de début/fin, et les publicités.
-        
-        Renvoie les données STRICTEMENT sous la forme d'un tableau JSON valide, sans aucun texte avant ou après. 
-        Ne mets PAS de balise Markdown (comme ```json).
-        
-        Chaque objet JSON doit avoir la structure suivante :
-        [
-          {{
-            "date": "YYYY-MM-DD",
-            "amount": 12.50,
-            "type": "Dépense",
-            "description": "Nom propre du marchand"
-          }}
-        ]
-        
-        Règles :
-        - 'amount' DOIT être un nombre positif.
-        - Si la ligne est un crédit ou revenu, 'type' est "Revenu", sinon c'est "Dépense".
-        
-        TEXTE À ANALYSER :
-        {raw_text}
-        """
-
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        response = model.generate_content(prompt)
-        
-        response_text = response.text.strip()
-        
-        # Nettoyage au cas où Gemini rajoute le block markdown malgré les consignes
-        if response_text.startswith("```json"):
-            response_text = response_text[7:]
-        if response_text.startswith("```"):
-            response_text = response_text[3:]
-        if response_text.endswith("```"):
-            response_text = response_text[:-3]
-            
-        response_text = response_text.strip()
-        
-        try:
-            transactions = json.loads(response_text)
-        except json.JSONDecodeError:
-            logger.error(f"Echec du parsing JSON retourné par Gemini : {response_text}")
-            raise HTTPException(status_code=500, detail="L'intelligence artificielle n'a pas pu formatter correctement les données.")
-
-        # Re-formattage sécurisé pour le frontend
-        extracted_transactions = []
-        for t in transactions:
-            extracted_transactions.append({
-                "date": t.get("date", datetime.now().strftime("%Y-%m-%d")),
-                "amount": abs(float(t.get("amount", 0))),
-                "type": t.get("type", "Dépense"),
-                "description": t.get("description", "Transaction PDF"),
-                "category_id": None,
-                "subcategory_id": None
-            })
-
-        return extracted_transactions
-
+        transactions, failed_pages = await pdf_import.parse_statement(contents)
+        (await merchant_index(current_user)).apply(transactions)
+        if failed_pages:
+            response.headers["X-Unparsed-Pages"] = ",".join(f"{first}-{last}" for first, last in failed_pages)
+        return transactions
     except HTTPException as he:
         raise he
     except Exception as e:
@@ -1165,6 +1549,7 @@ async def create_recurring_transaction(recurring: RecurringTransactionCreate, cu
         "created_at": datetime.now(timezone.utc)
     }
     await recurring_transactions_collection.insert_one(new_recurring_data.copy())
+    await mark_data_changed(current_user.id)
     return new_recurring_data
 
 @app.put("/api/recurring-transactions/{recurring_id}")
@@ -1174,6 +1559,7 @@ async def update_recurring_transaction(recurring_id: str, recurring: RecurringTr
     update_data = {k: v for k, v in recurring.dict(exclude_unset=True).items()}
     if update_data:
         await recurring_transactions_collection.update_one({"id": recurring_id, "user_id": current_user.id}, {"$set": update_data})
+        await mark_data_changed(current_user.id)
     updated = await recurring_transactions_collection.find_one({"id": recurring_id, "user_id": current_user.id})
     if updated: updated.pop("_id", None)
     return updated
@@ -1183,6 +1569,7 @@ async def delete_recurring_transaction(recurring_id: str, current_user: UserInDB
     existing = await recurring_transactions_collection.find_one({"id": recurring_id, "user_id": current_user.id})
     if not existing: raise HTTPException(status_code=404, detail="Not found")
     await recurring_transactions_collection.delete_one({"id": recurring_id, "user_id": current_user.id})
+    await mark_data_changed(current_user.id)
     return {"message": "Recurring transaction deleted successfully"}
 
 @app.post("/api/recurring-transactions/generate")
@@ -1199,7 +1586,7 @@ async def get_budgets(current_user: UserInDB = Depends(get_current_user)):
 
 @app.post("/api/budgets")
 async def create_budget(budget: BudgetCreate, current_user: UserInDB = Depends(get_current_user)):
-    category = await categories_collection.find_one({"id": budget.category_id, "user_id": current_user.id})
+    category = await find_category(current_user, budget.category_id)
     if not category: raise HTTPException(status_code=404, detail="Category not found")
     existing_budget = await budgets_collection.find_one({"user_id": current_user.id, "category_id": budget.category_id})
     if existing_budget: raise HTTPException(status_code=400, detail="Budget already exists.")
@@ -1208,6 +1595,7 @@ async def create_budget(budget: BudgetCreate, current_user: UserInDB = Depends(g
         "amount": budget.amount, "created_at": datetime.now(timezone.utc)
     }
     await budgets_collection.insert_one(new_budget_data.copy())
+    await mark_data_changed(current_user.id)
     return new_budget_data
 
 @app.put("/api/budgets/{budget_id}")
@@ -1215,6 +1603,7 @@ async def update_budget(budget_id: str, budget: BudgetUpdate, current_user: User
     existing = await budgets_collection.find_one({"id": budget_id, "user_id": current_user.id})
     if not existing: raise HTTPException(status_code=404, detail="Budget not found")
     await budgets_collection.update_one({"id": budget_id, "user_id": current_user.id}, {"$set": {"amount": budget.amount}})
+    await mark_data_changed(current_user.id)
     updated = await budgets_collection.find_one({"id": budget_id, "user_id": current_user.id})
     if updated: updated.pop("_id", None)
     return updated
@@ -1224,6 +1613,7 @@ async def delete_budget(budget_id: str, current_user: UserInDB = Depends(get_cur
     existing = await budgets_collection.find_one({"id": budget_id, "user_id": current_user.id})
     if not existing: raise HTTPException(status_code=404, detail="Budget not found")
     await budgets_collection.delete_one({"id": budget_id, "user_id": current_user.id})
+    await mark_data_changed(current_user.id)
     return {"message": "Budget deleted successfully"}
 
 # --- Objectifs d'Épargne ---
@@ -1247,48 +1637,76 @@ async def create_savings_goal(goal: SavingsGoalCreate, current_user: UserInDB =
         "target_amount": goal.target_amount, "current_amount": 0.0, "created_at": datetime.now(timezone.utc)
     }
     await savings_goals_collection.insert_one(new_goal_data.copy())
+    await mark_data_changed(current_user.id)
     return new_goal_data
 
 @app.put("/api/savings-goals/{goal_id}")
 async def update_savings_goal(goal_id: str, goal: SavingsGoalUpdate, current_user: UserInDB = Depends(get_current_user)):
-    existing = await savings_goals_collection.find_one({"id": goal_id, "user_id": current_user.id})
-    if not existing: raise HTTPException(status_code=404, detail="Not found")
+    query = {"id": goal_id, "user_id": current_user.id}
     update_data = {k: v for k, v in goal.dict(exclude_unset=True).items()}
     if update_data:
-        await savings_goals_collection.update_one({"id": goal_id, "user_id": current_user.id}, {"$set": update_data})
-    
-    updated = await savings_goals_collection.find_one({"id": goal_id, "user_id": current_user.id})
-    if updated:
-        updated.pop("_id", None)
+        updated = await savings_goals_collection.find_one_and_update(
+            query, {"$set": update_data}, projection={"_id": 0}, return_document=ReturnDocument.AFTER
+        )
+        if updated: await mark_data_changed(current_user.id)
+    else:
+        updated = await savings_goals_collection.find_one(query, {"_id": 0})
+    if not updated: raise HTTPException(status_code=404, detail="Not found")
     return updated
 
 @app.post("/api/savings-goals/{goal_id}/adjust")
 async def adjust_savings_goal(goal_id: str, adjust: SavingsGoalAdjust, current_user: UserInDB = Depends(get_current_user)):
-    existing = await savings_goals_collection.find_one({"id": goal_id, "user_id": current_user.id})
-    if not existing: raise HTTPException(status_code=404, detail="Not found")
-    current_amount = existing.get("current_amount", 0.0)
-    if adjust.action == "add": current_amount += adjust.amount
-    elif adjust.action == "remove":
-        current_amount -= adjust.amount
-        if current_amount < 0: raise HTTPException(status_code=400, detail="Cannot remove more than balance.")
-    else: raise HTTPException(status_code=400, detail="Invalid action.")
-
-    await savings_goals_collection.update_one({"id": goal_id, "user_id": current_user.id}, {"$set": {"current_amount": current_amount}})
-    
-    updated = await savings_goals_collection.find_one({"id": goal_id, "user_id": current_user.id})
-    if updated:
-        updated.pop("_id", None)
+    if adjust.action not in ("add", "remove"): raise HTTPException(status_code=400, detail="Invalid action.")
+    query = {"id": goal_id, "user_id": current_user.id}
+    delta = adjust.amount
+    if adjust.action == "remove":
+        # Garde-fou dans la même opération atomique : jamais de solde négatif
+        query["current_amount"] = {"$gte": adjust.amount}
+        delta = -adjust.amount
+
+    updated = await savings_goals_collection.find_one_and_update(
+        query, {"$inc": {"current_amount": delta}}, projection={"_id": 0}, return_document=ReturnDocument.AFTER
+    )
+    if updated is None:
+        if adjust.action == "remove" and await savings_goals_collection.count_documents({"id": goal_id, "user_id": current_user.id}, limit=1):
+            raise HTTPException(status_code=400, detail="Cannot remove more than balance.")
+        raise HTTPException(status_code=404, detail="Not found")
+    await mark_data_changed(current_user.id)
+
+    try:
+        await savings_contributions_collection.insert_one({
+            "id": str(uuid.uuid4()), "user_id": current_user.id, "goal_id": goal_id,
+            "amount": delta, "balance": updated["current_amount"], "created_at": datetime.now(timezone.utc)
+        })
+    except Exception as e:
+        # Le solde fait foi : un historique incomplet ne doit pas faire échouer l'ajustement
+        logger.error(f"Historique d'épargne non enregistré pour l'objectif {goal_id} : {e}")
     return updated
 
+@app.get("/api/savings-goals/{goal_id}/contributions", response_model=List[SavingsContribution])
+async def get_savings_contributions(goal_id: str, current_user: UserInDB = Depends(get_current_user)):
+    contributions = await savings_contributions_collection.find(
+        {"user_id": current_user.id, "goal_id": goal_id}, {"_id": 0, "user_id": 0}
+    ).sort("created_at", 1).to_list(None)
+    if not contributions and not await savings_goals_collection.count_documents({"id": goal_id, "user_id": current_user.id}, limit=1):
+        raise HTTPException(status_code=404, detail="Not found")
+    return contributions
+
 @app.delete("/api/savings-goals/{goal_id}")
 async def delete_savings_goal(goal_id: str, current_user: UserInDB = Depends(get_current_user)):
-    existing = await savings_goals_collection.find_one({"id": goal_id, "user_id": current_user.id})
-    if not existing: raise HTTPException(status_code=404, detail="Not found")
-    await savings_goals_collection.delete_one({"id": goal_id, "user_id": current_user.id})
+    result = await savings_goals_collection.delete_one({"id": goal_id, "user_id": current_user.id})
+    if result.deleted_count == 0: raise HTTPException(status_code=404, detail="Not found")
+    await savings_contributions_collection.delete_many({"user_id": current_user.id, "goal_id": goal_id})
+    await mark_data_changed(current_user.id)
     return {"message": "Goal deleted successfully"}
 
 # --- Dashboard Statistics ---
 
+# Réponses par (utilisateur, data_version, période, jour) : le jour compte pour
+# la période par défaut et les récurrences à venir
+stats_cache = response_cache.ResponseCache("dashboard_stats")
+stats_flight = singleflight.SingleFlight("dashboard_stats")
+
 @app.get("/api/dashboard/stats")
 async def get_dashboard_stats(
     start_date_str: Optional[str] = None, 
@@ -1296,12 +1714,33 @@ async def get_dashboard_stats(
     current_user: UserInDB = Depends(get_current_user)
 ):
     now = datetime.now(timezone.utc)
+    cache_key = (current_user.id, current_user.data_version, start_date_str, end_date_str, now.date().isoformat())
+    stats = await stats_cache.get(cache_key)
+    if stats is None:
+        async def load():
+            computed = await compute_dashboard_stats(current_user, start_date_str, end_date_str, now)
+            await stats_cache.set(cache_key, computed)
+            return computed
+        stats = await stats_flight.do(cache_key, load)
+    return stats
+
+async def compute_dashboard_stats(current_user: UserInDB, start_date_str: Optional[str], end_date_str: Optional[str], now: datetime) -> dict:
+    snapshot = get_fresh_snapshot(current_user)
     
     global_revenus, global_depenses = 0, 0
-    res_rev = await transactions_collection.aggregate([{"$match": {"type": "Revenu", "user_id": current_user.id}}, {"$group": {"_id": None, "total": {"$sum": "$amount"}}}]).to_list(None)
-    if res_rev: global_revenus = res_rev[0]['total']
-    res_dep = await transactions_collection.aggregate([{"$match": {"type": "Dépense", "user_id": current_user.id}}, {"$group": {"_id": None, "total": {"$sum": "$amount"}}}]).to_list(None)
-    if res_dep: global_depenses = res_dep[0]['total']
+    if snapshot:
+        totals = snapshot.sum_by_type()
+        global_revenus, global_depenses = totals.get("Revenu", 0), totals.get("Dépense", 0)
+    else:
+        reads = analytics_reads(current_user)
+        res_rev = await reads.transactions.aggregate([{"$match": {"type": "Revenu", "user_id": current_user.id}}, {"$group": {"_id": None, "total": {"$sum": "$amount"}}}]).to_list(None)
+        if res_rev: global_revenus = res_rev[0]['total']
+        res_dep = await reads.transactions.aggregate([{"$match": {"type": "Dépense", "user_id": current_user.id}}, {"$group": {"_id": None, "total": {"$sum": "$amount"}}}]).to_list(None)
+        if res_dep: global_depenses = res_dep[0]['total']
+        if current_user.archived_before is not None:
+            archived = await archive.summary_totals(reads.database, current_user.id)
+            global_revenus += archived["Revenu"]
+            global_depenses += archived["Dépense"]
     global_epargne_totale = global_revenus - global_depenses
     
     month_names_full = ["Janvier", "Février", "Mars", "Avril", "Mai", "Juin", "Juillet", "Août", "Septembre", "Octobre", "Novembre", "Décembre"]
@@ -1316,37 +1755,37 @@ async def get_dashboard_stats(
         else: end_date = datetime(now.year, now.month + 1, 1, tzinfo=timezone.utc)
         display_period = f"{month_names_full[now.month - 1]} {now.year}"
     
-    period_transactions = await transactions_collection.find({"date": {"$gte": start_date, "$lt": end_date}, "user_id": current_user.id}).to_list(None)
-    revenus = sum(t["amount"] for t in period_transactions if t["type"] == "Revenu")
-    depenses = sum(t["amount"] for t in period_transactions if t["type"] == "Dépense")
-    epargne = revenus - depenses
-    
-    expense_breakdown = await transactions_collection.aggregate([
-        {"$match": {"date": {"$gte": start_date, "$lt": end_date}, "type": "Dépense", "user_id": current_user.id}},
-        {"$group": { "_id": "$category_id", "value": {"$sum": "$amount"} } },
-        {"$lookup": { "from": "categories", "localField": "_id", "foreignField": "id", "as": "cat" } },
-        {"$unwind": "$cat"},
-        {"$project": { "_id": 0, "name": "$cat.name", "value": "$value" } }
-    ]).to_list(None)
-
-    monthly_data = []
     month_names = ["Jan", "Fév", "Mar", "Avr", "Mai", "Jun", "Jul", "Aoû", "Sep", "Oct", "Nov", "Déc"]
-    for i in range(12):
-        m_start = datetime(start_date.year, i + 1, 1, tzinfo=timezone.utc)
-        if i == 11: m_end = datetime(start_date.year + 1, 1, 1, tzinfo=timezone.utc)
-        else: m_end = datetime(start_date.year, i + 2, 1, tzinfo=timezone.utc)
-        m_trans = await transactions_collection.find({"date": {"$gte": m_start, "$lt": m_end}, "user_id": current_user.id}).to_list(None)
-        monthly_data.append({"month": month_names[i], "revenus": sum(t["amount"] for t in m_trans if t["type"] == "Revenu"), "depenses": sum(t["amount"] for t in m_trans if t["type"] == "Dépense")})
-    
-    budget_progress = []
     user_budgets = await budgets_collection.find({"user_id": current_user.id}).to_list(None)
-    cats = await categories_collection.find({"user_id": current_user.id}).to_list(None)
+    cats = await user_categories(current_user)
     cat_map = {cat["id"]: cat["name"] for cat in cats}
-    spending_by_cat = {}
-    for t in period_transactions:
-        if t["type"] == "Dépense" and t.get("category_id"):
-            cid = t["category_id"]
-            spending_by_cat[cid] = spending_by_cat.get(cid, 0) + t["amount"]
+
+    if snapshot:
+        period_totals = snapshot.sum_by_type(start_date, end_date)
+        revenus, depenses = period_totals.get("Revenu", 0), period_totals.get("Dépense", 0)
+        spending_by_cat = snapshot.sum_by_category(start_date, end_date, "Dépense")
+        # Même sémantique que le $lookup + $unwind : les catégories inconnues sont ignorées
+        expense_breakdown = [{"name": cat_map[cid], "value": value} for cid, value in spending_by_cat.items() if cid in cat_map]
+        by_month = snapshot.sum_by_month(start_date.year)
+        monthly_data = [{"month": month_names[i], "revenus": by_month[i + 1].get("Revenu", 0), "depenses": by_month[i + 1].get("Dépense", 0)} for i in range(12)]
+    else:
+        period_transactions = await find_transactions(current_user, {"date": {"$gte": start_date, "$lt": end_date}, "user_id": current_user.id}, start_date)
+        revenus, depenses, spending_by_cat, _ = summarize_transactions(period_transactions)
+        
+        # Déjà calculé par summarize_transactions (transactions chaudes et archivées, tous formats)
+        expense_breakdown = [{"name": cat_map[cid], "value": value} for cid, value in spending_by_cat.items() if cid in cat_map]
+
+        monthly_data = []
+        for i in range(12):
+            m_start = datetime(start_date.year, i + 1, 1, tzinfo=timezone.utc)
+            if i == 11: m_end = datetime(start_date.year + 1, 1, 1, tzinfo=timezone.utc)
+            else: m_end = datetime(start_date.year, i + 2, 1, tzinfo=timezone.utc)
+            m_trans = await find_transactions(current_user, {"date": {"$gte": m_start, "$lt": m_end}, "user_id": current_user.id}, m_start)
+            m_revenus, m_depenses, _, _ = summarize_transactions(m_trans)
+            monthly_data.append({"month": month_names[i], "revenus": m_revenus, "depenses": m_depenses})
+    epargne = revenus - depenses
+    
+    budget_progress = []
     for b in user_budgets:
         budget_progress.append({
             "id": b["id"], "category_id": b["category_id"], "category_name": cat_map.get(b["category_id"], "Inconnu"),
@@ -1379,10 +1818,11 @@ async def get_dashboard_stats(
 
 # --- Revue Mensuelle ---
 
+review_flight = singleflight.SingleFlight("monthly_review")
+
 @app.get("/api/dashboard/monthly-review", response_model=MonthlyReviewResponse)
 async def get_monthly_review(month: Optional[int] = None, year: Optional[int] = None, current_user: UserInDB = Depends(get_current_user)):
     now = datetime.now(timezone.utc)
-    month_names_full = ["Janvier", "Février", "Mars", "Avril", "Mai", "Juin", "Juillet", "Août", "Septembre", "Octobre", "Novembre", "Décembre"]
     if month is None or year is None:
         today = now.replace(day=1)
         last_day_prev = today - timedelta(days=1)
@@ -1392,24 +1832,30 @@ async def get_monthly_review(month: Optional[int] = None, year: Optional[int] =
         start_date = datetime(year, month, 1, tzinfo=timezone.utc)
         if month == 12: end_date = datetime(year + 1, 1, 1, tzinfo=timezone.utc)
         else: end_date = datetime(year, month + 1, 1, tzinfo=timezone.utc)
+    key = (current_user.id, current_user.data_version, start_date.isoformat())
+    return model_response(await review_flight.do(key, lambda: compute_monthly_review(current_user, start_date, end_date)))
 
-    transactions = await transactions_collection.find({"date": {"$gte": start_date, "$lt": end_date}, "user_id": current_user.id}).to_list(None)
-    total_income = sum(t["amount"] for t in transactions if t["type"] == "Revenu")
-    total_expense = sum(t["amount"] for t in transactions if t["type"] == "Dépense")
-    total_saved = total_income - total_expense
-    
-    exp_trans = [t for t in transactions if t["type"] == "Dépense"]
+async def compute_monthly_review(current_user: UserInDB, start_date: datetime, end_date: datetime) -> MonthlyReviewResponse:
+    month_names_full = ["Janvier", "Février", "Mars", "Avril", "Mai", "Juin", "Juillet", "Août", "Septembre", "Octobre", "Novembre", "Décembre"]
+    snapshot = get_fresh_snapshot(current_user)
     biggest_exp = None
-    if exp_trans:
-        b = max(exp_trans, key=lambda t: t["amount"])
-        biggest_exp = BiggestExpense(description=b.get("description"), amount=b["amount"], date=b["date"])
+    if snapshot:
+        totals = snapshot.sum_by_type(start_date, end_date)
+        total_income, total_expense = totals.get("Revenu", 0), totals.get("Dépense", 0)
+        biggest = snapshot.biggest(start_date, end_date, "Dépense")
+        if biggest:
+            biggest_exp = BiggestExpense(description=biggest[0], amount=biggest[1], date=biggest[2])
+        spent_by_cat = snapshot.sum_by_category(start_date, end_date, "Dépense")
+    else:
+        transactions = await find_transactions(current_user, {"date": {"$gte": start_date, "$lt": end_date}, "user_id": current_user.id}, start_date)
+        total_income, total_expense, spent_by_cat, b = summarize_transactions(transactions)
+        if b:
+            biggest_exp = BiggestExpense(description=b.get("description"), amount=b["amount"], date=b["date"])
+    total_saved = total_income - total_expense
         
     user_budgets = await budgets_collection.find({"user_id": current_user.id}).to_list(None)
-    cats = await categories_collection.find({"user_id": current_user.id}).to_list(None)
+    cats = await user_categories(current_user)
     cat_map = {cat["id"]: cat["name"] for cat in cats}
-    spent_by_cat = {}
-    for t in exp_trans:
-        if t.get("category_id"): spent_by_cat[t["category_id"]] = spent_by_cat.get(t["category_id"], 0) + t["amount"]
 
     respected, exceeded = [], []
     for b in user_budgets:
@@ -1425,6 +1871,269 @@ async def get_monthly_review(month: Optional[int] = None, year: Optional[int] =
         biggest_expense=biggest_exp, respected_budgets=respected, exceeded_budgets=exceeded
     )
 
+# --- Comparaison de Périodes ---
+
+MONTH_NAMES_FULL = ["Janvier", "Février", "Mars", "Avril", "Mai", "Juin", "Juillet", "Août", "Septembre", "Octobre", "Novembre", "Décembre"]
+# Nombre de mois par période, et nombre de périodes renvoyées par défaut
+PERIOD_GRANULARITIES = {"month": 1, "quarter": 3, "year": 12}
+DEFAULT_PERIOD_COUNTS = {"month": 12, "quarter": 4, "year": 5}
+MAX_COMPARISON_PERIODS = 120
+
+def add_months(year: int, month: int, count: int):
+    index = year * 12 + (month - 1) + count
+    return index // 12, index % 12 + 1
+
+def period_start(granularity: str, year: int, month: int):
+    """Premier mois (année, mois) de la période contenant ce mois."""
+    if granularity == "quarter": return year, (month - 1) // 3 * 3 + 1
+    if granularity == "year": return year, 1
+    return year, month
+
+def period_key(granularity: str, start: tuple) -> str:
+    if granularity == "month": return f"{start[0]:04d}-{start[1]:02d}"
+    if granularity == "quarter": return f"{start[0]:04d}-Q{(start[1] + 2) // 3}"
+    return f"{start[0]:04d}"
+
+def parse_period(granularity: str, key: str):
+    """'2025-03' (mois), '2025-Q1' (trimestre) ou '2025' (année) -> (année, mois de début)."""
+    key = key.strip().upper()
+    try:
+        if granularity == "month":
+            year, month = (int(part) for part in key.split("-"))
+            if not 1 <= month <= 12: raise ValueError
+            return year, month
+        if granularity == "quarter":
+            year, quarter = (int(part) for part in key.split("-Q"))
+            if not 1 <= quarter <= 4: raise ValueError
+            return year, 3 * quarter - 2
+        return int(key), 1
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Période invalide pour '{granularity}' : {key}")
+
+def period_months(granularity: str, start: tuple):
+    """Mois (année, mois) couverts par une période."""
+    return [add_months(start[0], start[1], i) for i in range(PERIOD_GRANULARITIES[granularity])]
+
+def period_label(granularity: str, key: str, start: tuple) -> str:
+    if granularity == "month": return f"{MONTH_NAMES_FULL[start[1] - 1]} {start[0]}"
+    if granularity == "quarter": return f"T{(start[1] + 2) // 3} {start[0]}"
+    return key
+
+@app.get("/api/dashboard/compare", response_model=PeriodComparisonResponse)
+async def compare_periods(
+    granularity: str = "month",
+    periods: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    year: Optional[int] = None,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """
+    Revenus, dépenses, taux d'épargne et respect des budgets pour plusieurs périodes.
+
+    Périodes : liste `periods=2025-01,2025-03`, intervalle `start=2025-01&end=2025-12`,
+    ou `year=2025` (les 12 mois, ou les 4 trimestres avec granularity=quarter).
+    Par défaut, les 12 derniers mois. Les budgets (mensuels) sont multipliés par
+    le nombre de mois de la période.
+    """
+    if granularity not in PERIOD_GRANULARITIES:
+        raise HTTPException(status_code=400, detail="granularity doit valoir month, quarter ou year.")
+    step = PERIOD_GRANULARITIES[granularity]
+    now = datetime.now(timezone.utc)
+
+    if periods:
+        starts = [parse_period(granularity, key) for key in periods.split(",") if key.strip()]
+    else:
+        if start and end:
+            first, last = parse_period(granularity, start), parse_period(granularity, end)
+        elif year is not None:
+            first, last = (year, 1), period_start(granularity, year, 12)
+        else:
+            last = period_start(granularity, now.year, now.month)
+            first = add_months(*last, -step * (DEFAULT_PERIOD_COUNTS[granularity] - 1))
+        count = ((last[0] - first[0]) * 12 + last[1] - first[1]) // step + 1
+        if count > MAX_COMPARISON_PERIODS:
+            raise HTTPException(status_code=400, detail=f"Au plus {MAX_COMPARISON_PERIODS} périodes par requête.")
+        starts = [add_months(*first, step * i) for i in range(max(count, 0))]
+    if not starts:
+        raise HTTPException(status_code=400, detail="Aucune période demandée.")
+    if len(starts) > MAX_COMPARISON_PERIODS:
+        raise HTTPException(status_code=400, detail=f"Au plus {MAX_COMPARISON_PERIODS} périodes par requête.")
+
+    bounds = []
+    for first_month in starts:
+        key = period_key(granularity, first_month)
+        months = period_months(granularity, first_month)
+        after = add_months(months[-1][0], months[-1][1], 1)
+        bounds.append((key, first_month, months, datetime(first_month[0], first_month[1], 1, tzinfo=timezone.utc), datetime(after[0], after[1], 1, tzinfo=timezone.utc)))
+
+    # Totaux par mois, type et catégorie sur toute l'étendue demandée
+    by_month = {}
+    snapshot = get_fresh_snapshot(current_user)
+    if snapshot:
+        for _key, _first, months, _start, _end in bounds:
+            for y, m in months:
+                if (y, m) in by_month: continue
+                m_start = datetime(y, m, 1, tzinfo=timezone.utc)
+                m_end = datetime(*add_months(y, m, 1), 1, tzinfo=timezone.utc)
+                totals = snapshot.sum_by_type(m_start, m_end)
+                by_month[(y, m)] = {"Revenu": totals.get("Revenu", 0), "Dépense": totals.get("Dépense", 0), "categories": snapshot.sum_by_category(m_start, m_end, "Dépense")}
+    else:
+        reads = analytics_reads(current_user)
+        rows = await reads.transactions.aggregate([
+            {"$match": {"user_id": current_user.id, "date": {"$gte": min(b[3] for b in bounds), "$lt": max(b[4] for b in bounds)}}},
+            {"$group": {
+                "_id": {"y": {"$year": "$date"}, "m": {"$month": "$date"}, "type": "$type", "cat": "$category_id"},
+                "total": {"$sum": "$amount"}
+            }}
+        ]).to_list(None)
+        for row in rows:
+            g = row["_id"]
+            month_totals = by_month.setdefault((g["y"], g["m"]), {"Revenu": 0, "Dépense": 0, "categories": {}})
+            month_totals[g["type"]] = month_totals.get(g["type"], 0) + row["total"]
+            if g["type"] == "Dépense" and g.get("cat"):
+                month_totals["categories"][g["cat"]] = month_totals["categories"].get(g["cat"], 0) + row["total"]
+        span_start = min(b[3] for b in bounds)
+        if reaches_archive(current_user, span_start):
+            # Mois archivés : résumés pré-agrégés plutôt qu'un parcours de l'archive
+            archived = await archive.summaries_by_month(reads.database, current_user.id, span_start, max(b[4] for b in bounds))
+            for month, summary in archived.items():
+                month_totals = by_month.setdefault(month, {"Revenu": 0, "Dépense": 0, "categories": {}})
+                month_totals["Revenu"] += summary["Revenu"]
+                month_totals["Dépense"] += summary["Dépense"]
+                for cid, value in summary["categories"].items():
+                    month_totals["categories"][cid] = month_totals["categories"].get(cid, 0) + value
+
+    user_budgets = await budgets_collection.find({"user_id": current_user.id}).to_list(None)
+    cats = await user_categories(current_user)
+    cat_map = {cat["id"]: cat["name"] for cat in cats}
+
+    summaries = []
+    for key, first_month, months, start_date, end_date in bounds:
+        income, expense, spent_by_cat = 0, 0, {}
+        for month in months:
+            month_totals = by_month.get(month)
+            if not month_totals: continue
+            income += month_totals["Revenu"]
+            expense += month_totals["Dépense"]
+            for cid, value in month_totals["categories"].items():
+                spent_by_cat[cid] = spent_by_cat.get(cid, 0) + value
+        respected, exceeded = [], []
+        for b in user_budgets:
+            budgeted = b["amount"] * len(months)
+            spent = spent_by_cat.get(b["category_id"], 0)
+            detail = BudgetReviewDetail(category_name=cat_map.get(b["category_id"], "Inconnu"), amount_budgeted=budgeted, amount_spent=spent, difference=budgeted - spent)
+            if spent > budgeted: exceeded.append(detail)
+            else: respected.append(detail)
+        saved = income - expense
+        summaries.append(PeriodSummary(
+            period=key, display_period=period_label(granularity, key, first_month),
+            start_date=start_date, end_date=end_date,
+            total_income=income, total_expense=expense, total_saved=saved,
+            savings_rate=(saved / income) * 100 if income > 0 else 0.0,
+            respected_budgets=respected, exceeded_budgets=exceeded
+        ))
+    return model_response(PeriodComparisonResponse(granularity=granularity, periods=summaries))
+
+# --- Séries Temporelles ---
+
+SERIES_GRANULARITIES = ("day", "week", "month", "year")
+# Nombre de points renvoyés quand aucun intervalle n'est donné
+SERIES_DEFAULT_POINTS = {"day": 30, "week": 12, "month": 12, "year": 5}
+MAX_SERIES_POINTS = 1000
+SERIES_CACHE_SIZE = int(os.getenv("SERIES_CACHE_SIZE", "1024"))
+SERIES_CACHE_TTL = int(os.getenv("SERIES_CACHE_TTL", "3600"))
+
+series_cache = LRUCache("timeseries", SERIES_CACHE_SIZE, ttl=SERIES_CACHE_TTL)
+
+def series_bucket(granularity: str, dt: datetime) -> datetime:
+    """Début de l'intervalle contenant `dt` (semaines commençant le lundi, UTC), comme $dateTrunc."""
+    dt = dt.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularity == "week": return dt - timedelta(days=dt.weekday())
+    if granularity == "month": return dt.replace(day=1)
+    if granularity == "year": return dt.replace(month=1, day=1)
+    return dt
+
+def series_shift(granularity: str, bucket: datetime, count: int) -> datetime:
+    if granularity == "day": return bucket + timedelta(days=count)
+    if granularity == "week": return bucket + timedelta(weeks=count)
+    if granularity == "month":
+        year, month = add_months(bucket.year, bucket.month, count)
+        return bucket.replace(year=year, month=month)
+    return bucket.replace(year=bucket.year + count)
+
+@app.get("/api/dashboard/timeseries", response_model=TimeSeriesResponse)
+async def get_time_series(
+    granularity: str = "month",
+    start_date_str: Optional[str] = None,
+    end_date_str: Optional[str] = None,
+    category_id: Optional[str] = None,
+    current_user: UserInDB = Depends(get_current_user)
+):
+    """
+    Revenus, dépenses et nombre de transactions par jour, semaine, mois ou année.
+
+    `start_date_str` / `end_date_str` (inclus) au même format que /api/dashboard/stats ;
+    par défaut les 30 derniers jours, 12 dernières semaines, 12 derniers mois ou 5 dernières années.
+    Les intervalles sans transaction sont renvoyés à zéro.
+    """
+    if granularity not in SERIES_GRANULARITIES:
+        raise HTTPException(status_code=400, detail="granularity doit valoir day, week, month ou year.")
+    if start_date_str and end_date_str:
+        start_date = datetime.fromisoformat(start_date_str).replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=timezone.utc)
+        end_date = datetime.fromisoformat(end_date_str).replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=timezone.utc) + timedelta(days=1)
+        if end_date <= start_date:
+            raise HTTPException(status_code=400, detail="La date de fin doit suivre la date de début.")
+    else:
+        end_date = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        start_date = series_shift(granularity, series_bucket(granularity, end_date - timedelta(days=1)), 1 - SERIES_DEFAULT_POINTS[granularity])
+
+    edges = [series_bucket(granularity, start_date)]
+    while edges[-1] < end_date:
+        if len(edges) > MAX_SERIES_POINTS:
+            raise HTTPException(status_code=400, detail=f"Au plus {MAX_SERIES_POINTS} points par série.")
+        edges.append(series_shift(granularity, edges[-1], 1))
+
+    # La version des transactions fait partie de la clé : toute écriture invalide implicitement
+    cache_key = (current_user.id, current_user.tx_version, current_user.tx_epoch, granularity, start_date, end_date, category_id)
+    cached = series_cache.get(cache_key)
+    if cached is not None:
+        return model_response(cached)
+
+    # Les intervalles partiels en bordure ne comptent que les transactions de [start_date, end_date)
+    snapshot = get_fresh_snapshot(current_user)
+    if snapshot:
+        sums = snapshot.sum_by_buckets([start_date] + edges[1:-1] + [end_date], category_id)
+        points = [SeriesPoint(date=bucket, revenus=t.get("Revenu", 0), depenses=t.get("Dépense", 0), count=t["count"]) for bucket, t in zip(edges, sums)]
+    else:
+        match = {"user_id": current_user.id, "date": {"$gte": start_date, "$lt": end_date}}
+        if category_id: match["category_id"] = category_id
+        trunc = {"date": "$date", "unit": granularity, "timezone": "UTC"}
+        if granularity == "week": trunc["startOfWeek"] = "monday"
+        pipeline = [
+            {"$match": match},
+            {"$group": {"_id": {"bucket": {"$dateTrunc": trunc}, "type": "$type"}, "total": {"$sum": "$amount"}, "count": {"$sum": 1}}}
+        ]
+        reads = analytics_reads(current_user)
+        rows = await reads.transactions.aggregate(pipeline).to_list(None)
+        if reaches_archive(current_user, start_date):
+            # Lots en cours d'archivage exclus : ils sont encore comptés dans la collection chaude
+            rows += await reads.archive.aggregate([{"$match": archive.settled(match)}] + pipeline[1:]).to_list(None)
+        by_bucket = {}
+        for row in rows:
+            bucket = row["_id"]["bucket"].replace(tzinfo=timezone.utc)
+            totals = by_bucket.setdefault(bucket, {"count": 0})
+            totals[row["_id"]["type"]] = totals.get(row["_id"]["type"], 0) + row["total"]
+            totals["count"] += row["count"]
+        points = []
+        for bucket in edges[:-1]:
+            totals = by_bucket.get(bucket, {})
+            points.append(SeriesPoint(date=bucket, revenus=totals.get("Revenu", 0), depenses=totals.get("Dépense", 0), count=totals.get("count", 0)))
+
+    response = TimeSeriesResponse(granularity=granularity, start_date=start_date, end_date=end_date, category_id=category_id, points=points)
+    series_cache.set(cache_key, response)
+    return model_response(response)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
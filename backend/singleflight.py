@@ -0,0 +1,48 @@
+"""
+Regroupement des calculs identiques concurrents (« single flight »).
+
+Au montage du tableau de bord, ou lors des reprises du client, un même
+utilisateur envoie souvent plusieurs requêtes identiques en même temps. La
+première lance le calcul dans une tâche ; les suivantes, tant qu'il est en
+cours, attendent cette tâche au lieu de refaire toutes les requêtes MongoDB.
+
+Les clés contiennent l'utilisateur, la version de ses données (data_version)
+et les paramètres : une requête arrivée après une écriture ne rejoint pas un
+calcul commencé avant.
+
+La tâche est protégée (asyncio.shield) : un client qui se déconnecte n'annule
+pas le calcul attendu par les autres. Rien n'est gardé une fois la tâche
+terminée (voir response_cache.py pour la mise en cache).
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+from metrics import SINGLEFLIGHT_CALLS
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+            SINGLEFLIGHT_CALLS.inc(self.name, "leader")
+        else:
+            SINGLEFLIGHT_CALLS.inc(self.name, "coalesced")
+        return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # évite « exception was never retrieved » si tous les clients sont partis
+
+    def __len__(self):
+        return len(self._inflight)
@@ -0,0 +1,386 @@
+"""
+Snapshots colonnaires des transactions, par utilisateur.
+
+Chaque utilisateur possède un répertoire `<SNAPSHOT_DIR>/<user_id>/` contenant :
+- `manifest.json` : versions, watermark, liste des segments et dictionnaires
+  (types, catégories, sous-catégories, descriptions) ;
+- `seg-*.bin` : segments colonnaires à largeur fixe, relus par mmap sans copie.
+
+Format d'un segment :
+    MAGIC (8 octets) | longueur de l'en-tête (uint32) | en-tête JSON | colonnes alignées sur 8 octets
+
+Colonnes : date (int64, secondes epoch UTC), amount (int64, centimes),
+type (int8), category / subcategory / description (int32, -1 = None).
+
+La fraîcheur repose sur deux compteurs portés par le document utilisateur :
+- `tx_version` : incrémenté à chaque écriture sur les transactions ;
+- `tx_epoch` : incrémenté quand une écriture n'est pas un simple ajout
+  (modification, suppression, mise à jour de masse).
+Si seul `tx_version` a bougé, on ajoute un segment avec les nouveaux documents
+(incrémental) ; sinon on reconstruit tout.
+
+Une reconstruction lit aussi `transactions_archive` (voir archive.py) dans un
+segment à part, sans les lots en cours de déplacement ; l'archivage incrémente
+`tx_epoch`.
+"""
+import asyncio
+import json
+import logging
+import mmap
+import os
+import struct
+import uuid
+from datetime import datetime, timezone
+from typing import Optional, Dict, List, Tuple
+
+import numpy as np
+from bson import ObjectId
+
+import archive
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"BTSNAP01"
+FORMAT_VERSION = 1
+MAX_SEGMENTS = 8
+READ_BATCH_SIZE = 2000
+
+COLUMNS = [
+    ("date", "<i8"),
+    ("amount", "<i8"),
+    ("type", "<i1"),
+    ("category", "<i4"),
+    ("subcategory", "<i4"),
+    ("description", "<i4"),
+]
+
+PROJECTION = {"_id": 1, "date": 1, "amount": 1, "type": 1, "category_id": 1, "subcategory_id": 1, "description": 1}
+
+
+def to_epoch(dt: datetime) -> int:
+    """Convertit une date (naïve = UTC, comme renvoyé par Mongo) en secondes epoch."""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+
+def from_epoch(seconds: int) -> datetime:
+    """Inverse de to_epoch : date naïve en UTC, comme celles lues depuis Mongo."""
+    return datetime.fromtimestamp(int(seconds), tz=timezone.utc).replace(tzinfo=None)
+
+
+class _Dictionary:
+    """Dictionnaire d'encodage valeur -> code, en ajout seul."""
+
+    def __init__(self, values: Optional[List[str]] = None):
+        self.values = list(values or [])
+        self.codes = {v: i for i, v in enumerate(self.values)}
+
+    def encode(self, value) -> int:
+        if value is None:
+            return -1
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            self.codes[value] = code
+        return code
+
+
+class Segment:
+    """Segment colonnaire mappé en mémoire. Les colonnes sont des vues numpy sur le mmap."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:8] != MAGIC:
+            raise ValueError(f"Segment invalide : {path}")
+        (header_len,) = struct.unpack_from("<I", self._mm, 8)
+        header = json.loads(self._mm[12:12 + header_len])
+        self.rows = header["rows"]
+        self.columns: Dict[str, np.ndarray] = {}
+        for name, (dtype, offset) in header["columns"].items():
+            self.columns[name] = np.frombuffer(self._mm, dtype=dtype, count=self.rows, offset=offset)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+
+def _write_segment(path: str, arrays: Dict[str, np.ndarray]):
+    rows = len(arrays["date"])
+    # L'en-tête contient les offsets, qui dépendent de sa propre taille : on le
+    # dimensionne avec des offsets provisoires puis on recalcule.
+    header = {"rows": rows, "columns": {name: [dtype, 0] for name, dtype in COLUMNS}}
+    for _ in range(2):
+        header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+        offset = 12 + len(header_bytes)
+        offset += (-offset) % 8
+        for name, dtype in COLUMNS:
+            header["columns"][name] = [dtype, offset]
+            offset += arrays[name].nbytes
+            offset += (-offset) % 8
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(header_bytes)))
+        f.write(header_bytes)
+        for name, _dtype in COLUMNS:
+            f.write(b"\0" * (header["columns"][name][1] - f.tell()))
+            f.write(arrays[name].tobytes())
+    os.replace(tmp, path)
+
+
+class Snapshot:
+    """Vue en lecture seule sur l'historique d'un utilisateur."""
+
+    def __init__(self, directory: str, manifest: dict):
+        self.manifest = manifest
+        self.version = manifest["version"]
+        self.epoch = manifest["epoch"]
+        self.rows = manifest["rows"]
+        self.dicts = manifest["dicts"]
+        self.segments = [Segment(os.path.join(directory, name)) for name in manifest["segments"]]
+
+    def _type_code(self, type_name: str) -> int:
+        try:
+            return self.dicts["types"].index(type_name)
+        except ValueError:
+            return -2
+
+    def _masks(self, start: Optional[datetime], end: Optional[datetime]):
+        lo = to_epoch(start) if start else None
+        hi = to_epoch(end) if end else None
+        for seg in self.segments:
+            if seg.rows == 0:
+                continue
+            mask = np.ones(seg.rows, dtype=bool)
+            if lo is not None:
+                mask &= seg["date"] >= lo
+            if hi is not None:
+                mask &= seg["date"] < hi
+            yield seg, mask
+
+    def sum_by_type(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> Dict[str, float]:
+        """Totaux par type de transaction sur [start, end)."""
+        cents = np.zeros(len(self.dicts["types"]), dtype=np.int64)
+        for seg, mask in self._masks(start, end):
+            mask &= seg["type"] >= 0
+            cents += np.bincount(seg["type"][mask], weights=seg["amount"][mask], minlength=len(cents)).astype(np.int64)
+        return {name: int(c) / 100 for name, c in zip(self.dicts["types"], cents)}
+
+    def sum_by_category(self, start: Optional[datetime], end: Optional[datetime], type_name: str) -> Dict[str, float]:
+        """Totaux par category_id pour un type donné (transactions sans catégorie exclues)."""
+        code = self._type_code(type_name)
+        size = len(self.dicts["categories"])
+        cents = np.zeros(size, dtype=np.int64)
+        for seg, mask in self._masks(start, end):
+            mask &= (seg["type"] == code) & (seg["category"] >= 0)
+            if size:
+                cents += np.bincount(seg["category"][mask], weights=seg["amount"][mask], minlength=size).astype(np.int64)
+        return {cid: int(c) / 100 for cid, c in zip(self.dicts["categories"], cents) if c}
+
+    def sum_by_month(self, year: int) -> Dict[int, Dict[str, float]]:
+        """Totaux par mois (1-12) et par type pour une année civile."""
+        result = {}
+        for month in range(1, 13):
+            m_start = datetime(year, month, 1, tzinfo=timezone.utc)
+            m_end = datetime(year + 1, 1, 1, tzinfo=timezone.utc) if month == 12 else datetime(year, month + 1, 1, tzinfo=timezone.utc)
+            result[month] = self.sum_by_type(m_start, m_end)
+        return result
+
+    def sum_by_buckets(self, edges: List[datetime], category_id: Optional[str] = None) -> List[Dict[str, float]]:
+        """Totaux par type et nombre de transactions pour chaque intervalle [edges[i], edges[i+1])."""
+        bounds = np.array([to_epoch(e) for e in edges], dtype=np.int64)
+        buckets = len(edges) - 1
+        types = len(self.dicts["types"])
+        cents = np.zeros((buckets, types), dtype=np.int64)
+        counts = np.zeros(buckets, dtype=np.int64)
+        category = None
+        if category_id is not None:
+            if category_id not in self.dicts["categories"]:
+                return [{"count": 0} for _ in range(buckets)]
+            category = self.dicts["categories"].index(category_id)
+        for seg, mask in self._masks(edges[0], edges[-1]):
+            mask &= seg["type"] >= 0
+            if category is not None:
+                mask &= seg["category"] == category
+            index = np.searchsorted(bounds, seg["date"][mask], side="right") - 1
+            flat = index * types + seg["type"][mask]
+            cents += np.bincount(flat, weights=seg["amount"][mask], minlength=buckets * types).astype(np.int64).reshape(buckets, types)
+            counts += np.bincount(index, minlength=buckets)
+        result = []
+        for i in range(buckets):
+            totals = {name: int(c) / 100 for name, c in zip(self.dicts["types"], cents[i])}
+            totals["count"] = int(counts[i])
+            result.append(totals)
+        return result
+
+    def biggest(self, start: Optional[datetime], end: Optional[datetime], type_name: str) -> Optional[Tuple[Optional[str], float, datetime]]:
+        """Plus grosse transaction d'un type sur la période : (description, montant, date)."""
+        code = self._type_code(type_name)
+        best = None
+        for seg, mask in self._masks(start, end):
+            idx = np.flatnonzero(mask & (seg["type"] == code))
+            if idx.size == 0:
+                continue
+            i = idx[np.argmax(seg["amount"][idx])]
+            if best is None or seg["amount"][i] > best[0]["amount"][best[1]]:
+                best = (seg, i)
+        if best is None:
+            return None
+        seg, i = best
+        desc_code = int(seg["description"][i])
+        description = self.dicts["descriptions"][desc_code] if desc_code >= 0 else None
+        return description, int(seg["amount"][i]) / 100, from_epoch(seg["date"][i])
+
+
+class SnapshotStore:
+    """Stockage des snapshots sur disque local, avec mise à jour incrémentale."""
+
+    def __init__(self, root: str, collection, archive_collection=None):
+        self.root = root
+        self.collection = collection
+        self.archive_collection = archive_collection
+        self._open: Dict[str, Snapshot] = {}
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        os.makedirs(root, exist_ok=True)
+
+    def _dir(self, user_id: str) -> str:
+        return os.path.join(self.root, user_id)
+
+    def _read_manifest(self, user_id: str) -> Optional[dict]:
+        try:
+            with open(os.path.join(self._dir(user_id), "manifest.json"), "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if manifest.get("format") != FORMAT_VERSION:
+            return None
+        return manifest
+
+    def _write_manifest(self, user_id: str, manifest: dict):
+        path = os.path.join(self._dir(user_id), "manifest.json")
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    def get(self, user_id: str, tx_version: int, tx_epoch: int) -> Optional[Snapshot]:
+        """Renvoie le snapshot s'il est à jour, sinon None (et planifie un rafraîchissement)."""
+        snapshot = self._open.get(user_id)
+        if snapshot is None or snapshot.version != tx_version or snapshot.epoch != tx_epoch:
+            manifest = self._read_manifest(user_id)
+            if manifest and manifest["version"] == tx_version and manifest["epoch"] == tx_epoch:
+                try:
+                    snapshot = Snapshot(self._dir(user_id), manifest)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Snapshot illisible pour {user_id}: {e}")
+                    snapshot = None
+                if snapshot:
+                    self._open[user_id] = snapshot
+            else:
+                snapshot = None
+        if snapshot is None:
+            self.schedule_refresh(user_id, tx_version, tx_epoch)
+        return snapshot
+
+    def schedule_refresh(self, user_id: str, tx_version: int, tx_epoch: int):
+        task = self._refreshing.get(user_id)
+        if task and not task.done():
+            return
+        task = asyncio.create_task(self.refresh(user_id, tx_version, tx_epoch))
+        self._refreshing[user_id] = task
+        task.add_done_callback(lambda t, uid=user_id: self._refreshing.pop(uid, None))
+
+    async def refresh(self, user_id: str, tx_version: int, tx_epoch: int):
+        """Met le snapshot au niveau de (tx_version, tx_epoch), lus AVANT les transactions."""
+        try:
+            manifest = self._read_manifest(user_id)
+            if manifest and manifest["epoch"] == tx_epoch and manifest["version"] <= tx_version:
+                if manifest["version"] == tx_version:
+                    return
+                if await self._append(user_id, manifest, tx_version):
+                    return
+            await self._rebuild(user_id, tx_version, tx_epoch)
+        except Exception as e:
+            logger.warning(f"Rafraîchissement du snapshot impossible pour {user_id}: {e}")
+
+    async def _encode(self, query: dict, dicts: Dict[str, _Dictionary], collection=None):
+        columns = {name: [] for name, _ in COLUMNS}
+        last_id = None
+        cursor = (collection or self.collection).find(query, PROJECTION).sort("_id", 1).batch_size(READ_BATCH_SIZE)
+        async for t in cursor:
+            columns["date"].append(to_epoch(t["date"]))
+            columns["amount"].append(round(t["amount"] * 100))
+            columns["type"].append(dicts["types"].encode(t["type"]))
+            columns["category"].append(dicts["categories"].encode(t.get("category_id")))
+            columns["subcategory"].append(dicts["subcategories"].encode(t.get("subcategory_id")))
+            columns["description"].append(dicts["descriptions"].encode(t.get("description")))
+            last_id = t["_id"]
+        arrays = {name: np.array(columns[name], dtype=dtype) for name, dtype in COLUMNS}
+        return arrays, last_id
+
+    async def _append(self, user_id: str, manifest: dict, tx_version: int) -> bool:
+        if len(manifest["segments"]) >= MAX_SEGMENTS:
+            return False
+        dicts = {name: _Dictionary(values) for name, values in manifest["dicts"].items()}
+        query = {"user_id": user_id}
+        if manifest["watermark"]:
+            query["_id"] = {"$gt": ObjectId(manifest["watermark"])}
+        arrays, last_id = await self._encode(query, dicts)
+        rows = manifest["rows"] + len(arrays["date"])
+        # Les ObjectId ne sont pas strictement monotones entre processus : si le
+        # compte ne tombe pas juste, un document a échappé au watermark.
+        if rows - manifest.get("archived_rows", 0) != await self.collection.count_documents({"user_id": user_id}):
+            return False
+        segments = list(manifest["segments"])
+        if len(arrays["date"]):
+            name = f"seg-{uuid.uuid4().hex}.bin"
+            await asyncio.to_thread(_write_segment, os.path.join(self._dir(user_id), name), arrays)
+            segments.append(name)
+        self._write_manifest(user_id, {
+            **manifest,
+            "version": tx_version,
+            "watermark": str(last_id) if last_id else manifest["watermark"],
+            "rows": rows,
+            "segments": segments,
+            "dicts": {name: d.values for name, d in dicts.items()},
+        })
+        return True
+
+    async def _rebuild(self, user_id: str, tx_version: int, tx_epoch: int):
+        directory = self._dir(user_id)
+        os.makedirs(directory, exist_ok=True)
+        dicts = {name: _Dictionary() for name in ("types", "categories", "subcategories", "descriptions")}
+        segments, archived_rows = [], 0
+        if self.archive_collection is not None:
+            # Sans les lots en cours d'archivage, encore lus depuis la collection chaude
+            archived, _ = await self._encode(archive.settled({"user_id": user_id}), dicts, self.archive_collection)
+            archived_rows = len(archived["date"])
+            if archived_rows:
+                segments.append(f"seg-{uuid.uuid4().hex}.bin")
+                await asyncio.to_thread(_write_segment, os.path.join(directory, segments[-1]), archived)
+        arrays, last_id = await self._encode({"user_id": user_id}, dicts)
+        segments.append(f"seg-{uuid.uuid4().hex}.bin")
+        await asyncio.to_thread(_write_segment, os.path.join(directory, segments[-1]), arrays)
+        previous = self._read_manifest(user_id)
+        self._write_manifest(user_id, {
+            "format": FORMAT_VERSION,
+            "version": tx_version,
+            "epoch": tx_epoch,
+            "watermark": str(last_id) if last_id else None,
+            "rows": archived_rows + len(arrays["date"]),
+            "archived_rows": archived_rows,
+            "segments": segments,
+            "dicts": {n: d.values for n, d in dicts.items()},
+        })
+        # Les anciens segments restent lisibles par les mmap déjà ouverts (POSIX).
+        if previous:
+            for old in previous["segments"]:
+                try:
+                    os.remove(os.path.join(directory, old))
+                except OSError:
+                    pass
+        logger.info(f"Snapshot reconstruit pour {user_id}: {archived_rows + len(arrays['date'])} transactions.")
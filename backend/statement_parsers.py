@@ -0,0 +1,278 @@
+"""
+Lecture déterministe des relevés bancaires aux mises en page connues.
+
+Les mots du PDF (pdfplumber, avec leur position) sont regroupés en lignes ;
+chaque analyseur enregistré reconnaît une mise en page à son en-tête de tableau
+puis extrait les opérations par expressions régulières et position des
+colonnes, en quelques millisecondes. Les relevés non reconnus partent chez
+Gemini (pdf_import.py).
+
+Mises en page fournies :
+- `debit_credit` : colonnes Date / Libellé / Débit / Crédit (la plupart des
+  banques françaises : BNP Paribas, Société Générale, Crédit Agricole, LCL,
+  La Banque Postale, Boursorama...). Le sens d'un montant est donné par la
+  colonne sous laquelle il est aligné ;
+- `signed_amount` : colonnes Date / Libellé / Montant signé (néobanques).
+
+Un nouvel analyseur s'ajoute avec register() (avant les mises en page
+génériques s'il doit primer).
+"""
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+LINE_TOLERANCE = 3     # écart vertical (pt) entre mots d'une même ligne
+THOUSANDS_GAP = 4      # écart horizontal max entre « 1 » et « 234,56 »
+CONTINUATION_GAP = 14  # écart vertical max entre une opération et la suite de son libellé
+
+_DATE = re.compile(r"^(\d{2})[/.-](\d{2})(?:[/.-](\d{2}|\d{4}))?$")
+_AMOUNT = re.compile(r"^([+-]?)(\d{1,3}(?:[. \u00a0\u202f]\d{3})*|\d+),(\d{2})([+-]?)$")
+_THOUSANDS = re.compile(r"^[+-]?\d{1,3}$")
+_PERIOD = re.compile(r"(\d{2})[/.](\d{2})[/.](\d{4})\D{1,12}?(\d{2})[/.](\d{2})[/.](\d{4})")
+_FULL_DATE = re.compile(r"\b(\d{2})[/.](\d{2})[/.](\d{4})\b")
+# Lignes de totaux et de soldes, jamais des opérations : reconnues en tête du libellé
+# seulement (« CB TOTALENERGIES », « SOLDES HIVER », « Total Energies » sont des opérations)
+_SKIP = re.compile(
+    r"solde(?:\s|$)|sous-total\b|montant net\b|report(?:\s+a\s+nouveau\b|\s*$)"
+    r"|total(?:\s+(?:des|du|general|operations|mouvements)\b|\s*$)"
+)
+
+
+class Word(NamedTuple):
+    text: str
+    x0: float
+    x1: float
+    top: float
+
+
+@dataclass
+class Statement:
+    text: str
+    lines: List[List[Word]]  # mots de chaque ligne, de gauche à droite ; [] entre deux pages
+    pages: List[str] = field(default_factory=list)  # texte de chaque page
+
+
+def fold(text: str) -> str:
+    """Minuscules sans accents, pour comparer les en-têtes."""
+    return unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii").lower()
+
+
+def group_lines(words: List[dict]) -> List[List[Word]]:
+    """Mots pdfplumber d'une page -> lignes (mots de même hauteur), de haut en bas."""
+    lines: List[Tuple[float, List[Word]]] = []
+    for w in sorted(words, key=lambda w: (round(w["top"]), w["x0"])):
+        word = Word(w["text"], w["x0"], w["x1"], w["top"])
+        if lines and abs(lines[-1][0] - w["top"]) <= LINE_TOLERANCE:
+            lines[-1][1].append(word)
+        else:
+            lines.append((w["top"], [word]))
+    return [sorted(line, key=lambda w: w.x0) for _, line in lines]
+
+
+def parse_amount(text: str) -> Optional[float]:
+    """« 1.234,56 », « -12,50 », « 12,50- » -> float signé ; None si ce n'est pas un montant."""
+    m = _AMOUNT.match(text)
+    if not m:
+        return None
+    value = float(re.sub(r"\D", "", m.group(2)) + "." + m.group(3))
+    return -value if "-" in (m.group(1), m.group(4)) else value
+
+
+def merge_amounts(words: List[Word]) -> List[Word]:
+    """Recolle les milliers séparés par une espace : « 1 » + « 234,56 » -> « 1234,56 »."""
+    out: List[Word] = []
+    for word in words:
+        if (out and _AMOUNT.match(word.text) and _THOUSANDS.match(out[-1].text)
+                and word.x0 - out[-1].x1 <= THOUSANDS_GAP):
+            previous = out.pop()
+            word = Word(previous.text + word.text, previous.x0, word.x1, word.top)
+        out.append(word)
+    return out
+
+
+class Period(NamedTuple):
+    start: Optional[date]
+    end: Optional[date]
+
+
+def statement_period(text: str) -> Period:
+    """Période du relevé (« du 01/02/2025 au 28/02/2025 »), sinon bornée par les dates complètes du texte."""
+    m = _PERIOD.search(text)
+    if m:
+        d1, m1, y1, d2, m2, y2 = map(int, m.groups())
+        try:
+            return Period(date(y1, m1, d1), date(y2, m2, d2))
+        except ValueError:
+            pass
+    found = []
+    for d, mo, y in _FULL_DATE.findall(text):
+        try:
+            found.append(date(int(y), int(mo), int(d)))
+        except ValueError:
+            continue
+    return Period(min(found), max(found)) if found else Period(None, None)
+
+
+def resolve_date(text: str, period: Period) -> Optional[date]:
+    """Date d'opération ; l'année manquante (« 12/03 ») est déduite de la période du relevé."""
+    m = _DATE.match(text)
+    if not m:
+        return None
+    day, month, year = int(m.group(1)), int(m.group(2)), m.group(3)
+    if year:
+        year = int(year) + (2000 if len(year) == 2 else 0)
+    else:
+        end = period.end or date.today()
+        # Relevé à cheval sur deux années : décembre appartient à l'année précédente
+        year = end.year - 1 if month > end.month else end.year
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+# --- Analyseurs ---
+
+class StatementParser:
+    """Interface des analyseurs : un attribut `name` (étiquette des métriques) et parse()."""
+
+    def parse(self, statement: Statement) -> Optional[List[dict]]:
+        """Transactions du relevé, ou None si la mise en page n'est pas reconnue."""
+        raise NotImplementedError
+
+
+@dataclass
+class ColumnLayout(StatementParser):
+    """Tableau dont l'en-tête nomme les colonnes ; les montants sont rangés par alignement."""
+    name: str
+    columns: Dict[str, Tuple[str, ...]]  # colonne -> mots d'en-tête possibles (repliés)
+    classify: Callable[[Dict[str, float]], Optional[Tuple[str, float]]]  # montants par colonne -> (type, montant)
+    required: Tuple[str, ...]
+    markers: Tuple[str, ...] = ()        # textes exigés dans le relevé (banque)
+
+    def header(self, line: List[Word]) -> Optional[Dict[str, Word]]:
+        found: Dict[str, Word] = {}
+        for word in line:
+            token = fold(word.text).strip(".:()")
+            for column, aliases in self.columns.items():
+                if column not in found and token in aliases:
+                    found[column] = word
+        return found if all(c in found for c in self.required) else None
+
+    def parse(self, statement: Statement) -> Optional[List[dict]]:
+        folded = fold(statement.text)
+        if any(fold(m) not in folded for m in self.markers):
+            return None
+        period = statement_period(statement.text)
+        rows: List[dict] = []
+        columns: Optional[Dict[str, Word]] = None
+        current: Optional[dict] = None
+        last_top = 0.0
+        for line in statement.lines:
+            if not line:
+                current = None
+                continue
+            found = self.header(line)
+            if found:
+                columns, current = found, None  # en-tête répété à chaque page
+                continue
+            if columns is None:
+                continue
+            row = self._row(merge_amounts(line), columns, period)
+            if row is not None:
+                rows.append(row)
+                current = row
+            elif current is not None and line[0].top - last_top <= CONTINUATION_GAP and self._continuation(line, columns):
+                current["description"] = (current["description"] + " " + " ".join(w.text for w in line)).strip()
+            else:
+                current = None
+            last_top = line[0].top
+        return rows or None
+
+    def _row(self, line: List[Word], columns: Dict[str, Word], period: Period) -> Optional[dict]:
+        if len(line) < 2:
+            return None
+        operation_date = resolve_date(line[0].text, period)
+        if operation_date is None:
+            return None
+        amounts: Dict[str, float] = {}
+        description = []
+        amount_columns = [c for c in columns if c != "date" and c != "label"]
+        first_amount_x = min(columns[c].x0 for c in amount_columns)
+        for word in line[1:]:
+            value = parse_amount(word.text) if word.x1 > first_amount_x - 5 else None
+            if value is not None:
+                # Colonne dont le bord droit est le plus proche (montants alignés à droite)
+                column = min(amount_columns, key=lambda c: abs(columns[c].x1 - word.x1))
+                amounts[column] = value
+            elif resolve_date(word.text, period) is None:  # date de valeur
+                description.append(word.text)
+        text = " ".join(description).strip()
+        if not text or _SKIP.match(fold(text)):
+            return None
+        result = self.classify(amounts)
+        if result is None:
+            return None
+        kind, amount = result
+        return {"date": operation_date.isoformat(), "amount": round(abs(amount), 2), "type": kind, "description": text}
+
+    @staticmethod
+    def _continuation(line: List[Word], columns: Dict[str, Word]) -> bool:
+        """Suite du libellé sur la ligne suivante : ni date, ni montant, dans la colonne libellé."""
+        label = columns.get("label")
+        if label is None or _DATE.match(line[0].text) or any(parse_amount(w.text) is not None for w in line):
+            return False
+        right = min(w.x0 for c, w in columns.items() if c not in ("date", "label"))
+        return line[0].x0 >= label.x0 - 20 and line[-1].x1 < right and not _SKIP.match(fold(line[0].text))
+
+
+def _debit_credit(amounts: Dict[str, float]) -> Optional[Tuple[str, float]]:
+    if "debit" in amounts:
+        return "Dépense", amounts["debit"]
+    if "credit" in amounts:
+        return "Revenu", amounts["credit"]
+    return None
+
+
+def _signed(amounts: Dict[str, float]) -> Optional[Tuple[str, float]]:
+    if "amount" not in amounts:
+        return None
+    return ("Dépense" if amounts["amount"] < 0 else "Revenu"), amounts["amount"]
+
+
+DATE_HEADERS = ("date", "dates")
+LABEL_HEADERS = ("libelle", "libelles", "nature", "operation", "operations", "description", "detail", "details", "intitule")
+
+PARSERS: List[StatementParser] = []
+
+
+def register(parser: StatementParser, first: bool = False) -> StatementParser:
+    if first:
+        PARSERS.insert(0, parser)
+    else:
+        PARSERS.append(parser)
+    return parser
+
+
+register(ColumnLayout(
+    "debit_credit",
+    {"date": DATE_HEADERS, "label": LABEL_HEADERS, "debit": ("debit", "debits"),
+     "credit": ("credit", "credits")},
+    _debit_credit, required=("date", "debit", "credit"),
+))
+register(ColumnLayout(
+    "signed_amount",
+    {"date": DATE_HEADERS, "label": LABEL_HEADERS, "amount": ("montant", "amount", "somme")},
+    _signed, required=("date", "label", "amount"),
+))
+
+
+def parse_known(statement: Statement) -> Optional[Tuple[str, List[dict]]]:
+    """(nom de l'analyseur, transactions) pour la première mise en page reconnue."""
+    for parser in PARSERS:
+        rows = parser.parse(statement)
+        if rows:
+            return parser.name, rows
+    return None
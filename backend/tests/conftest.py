@@ -0,0 +1,41 @@
+import asyncio
+import os
+import sys
+import uuid
+
+import httpx
+import pytest
+
+# Les modules du backend sont à plat dans backend/ (comme pour bench/)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class Api:
+    """Application liée à une base en mémoire, authentifiée comme `user`."""
+
+    def __init__(self, server, db, user):
+        self.app, self.db, self.user = server.app, db, user
+
+    def run(self, scenario):
+        """Lance `scenario(client)` avec un client httpx branché sur l'application."""
+        async def main():
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=self.app), base_url="http://t") as client:
+                return await scenario(client)
+        return asyncio.run(main())
+
+    def get(self, path, params=None, headers=None):
+        return self.run(lambda client: client.get(path, params=params, headers=headers))
+
+
+@pytest.fixture
+def api():
+    import server  # chargé à la demande : les tests unitaires n'en ont pas besoin
+    from mongo import database
+
+    db = database()
+    user = server.UserInDB(id=str(uuid.uuid4()), email="test@example.com", hashed_password="x")
+    server.bind_database(db)
+    asyncio.run(db.users.insert_one(user.dict()))
+    server.app.dependency_overrides[server.get_current_user] = lambda: user
+    yield Api(server, db, user)
+    server.app.dependency_overrides.clear()
@@ -0,0 +1,148 @@
+"""
+Serveur RESP minimal sur asyncio.start_server, substitut local de Redis pour
+les tests de ratelimit.RedisBackend (et du cache partagé de response_cache).
+
+Commandes : PING, AUTH, SELECT, GET, SET [EX n], INCR, EXPIRE, TTL, DEL.
+Les expirations suivent l'horloge `clock` (modifiable par les tests).
+
+    python tests/fake_redis.py --port 6390
+"""
+import argparse
+import asyncio
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class FakeRedis:
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.data: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+        self.commands: List[List[bytes]] = []
+        self.hang = False  # vrai : le serveur lit les commandes mais ne répond plus
+        self.connections = 0
+        self._writers = set()
+        self._server = None
+        self.port = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0):
+        self._server = await asyncio.start_server(self._serve, host, port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        self.drop_connections()
+        self._server.close()
+        await self._server.wait_closed()
+
+    def drop_connections(self):
+        """Coupe les connexions ouvertes (redémarrage du serveur, vu du client)."""
+        for writer in list(self._writers):
+            writer.close()
+        self._writers.clear()
+
+    # --- Protocole ---
+
+    @staticmethod
+    async def _read_command(reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+        line = await reader.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            return line.strip().split()  # commande « inline »
+        args = []
+        for _ in range(int(line[1:-2])):
+            size = int((await reader.readline())[1:-2])
+            args.append((await reader.readexactly(size + 2))[:-2])
+        return args
+
+    @staticmethod
+    def _encode(reply) -> bytes:
+        if reply is None:
+            return b"$-1\r\n"
+        if isinstance(reply, int):
+            return b":%d\r\n" % reply
+        if isinstance(reply, bytes):
+            return b"$%d\r\n%s\r\n" % (len(reply), reply)
+        if isinstance(reply, Exception):
+            return b"-ERR %s\r\n" % str(reply).encode()
+        return b"+%s\r\n" % reply.encode()
+
+    async def _serve(self, reader, writer):
+        self.connections += 1
+        self._writers.add(writer)
+        try:
+            while True:
+                try:
+                    args = await self._read_command(reader)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    return
+                if args is None:
+                    return
+                self.commands.append(args)
+                if self.hang:
+                    continue
+                writer.write(self._encode(self._dispatch(args)))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    # --- Commandes ---
+
+    def _get(self, key: bytes) -> Optional[bytes]:
+        value, expires = self.data.get(key, (None, None))
+        if expires is not None and self.clock() >= expires:
+            del self.data[key]
+            return None
+        return value
+
+    def _dispatch(self, args: List[bytes]):
+        name, args = args[0].upper().decode(), args[1:]
+        if name == "PING":
+            return "PONG"
+        if name in ("AUTH", "SELECT"):
+            return "OK"
+        if name == "GET":
+            return self._get(args[0])
+        if name == "SET":
+            expires = None
+            if len(args) >= 4 and args[2].upper() == b"EX":
+                expires = self.clock() + int(args[3])
+            self.data[args[0]] = (args[1], expires)
+            return "OK"
+        if name == "INCR":
+            current = self._get(args[0]) or b"0"
+            try:
+                value = int(current) + 1
+            except ValueError:
+                return Exception("value is not an integer or out of range")
+            _, expires = self.data.get(args[0], (None, None))
+            self.data[args[0]] = (str(value).encode(), expires)
+            return value
+        if name == "EXPIRE":
+            if self._get(args[0]) is None:
+                return 0
+            self.data[args[0]] = (self.data[args[0]][0], self.clock() + int(args[1]))
+            return 1
+        if name == "TTL":
+            if self._get(args[0]) is None:
+                return -2
+            expires = self.data[args[0]][1]
+            return -1 if expires is None else int(expires - self.clock())
+        if name == "DEL":
+            return sum(1 for key in args if self.data.pop(key, None) is not None)
+        return Exception(f"unknown command '{name}'")
+
+
+async def _main(port: int):
+    server = await FakeRedis().start(port=port)
+    print(f"Faux Redis sur 127.0.0.1:{server.port}")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=6390)
+    asyncio.run(_main(parser.parse_args().port))
@@ -0,0 +1,40 @@
+"""
+Base MongoDB en mémoire pour les tests (mongomock-motor, comme bench/loadtest.py).
+
+mongomock ne connaît pas `$round` (MongoDB >= 4.2), utilisé par les pipelines
+de compact.py en mode mixte : il est ajouté ici, pour les tests seulement.
+Son find_one_and_update relit aussi le document avec le filtre d'origine quand
+la projection exclut `_id` : un garde-fou comme `{"$gte": montant}` ne
+correspond plus après l'écriture et l'opération semble n'avoir rien modifié.
+"""
+import mongomock.aggregate as _aggregate
+from mongomock.collection import Collection as _Collection
+from mongomock_motor import AsyncMongoMockClient
+
+if "$round" not in _aggregate.arithmetic_operators:
+    _aggregate.arithmetic_operators.add("$round")
+    _handle_arithmetic = _aggregate._Parser._handle_arithmetic_operator
+
+    def _handle_round(self, operator, values):
+        if operator == "$round":
+            number = self.parse(values[0])
+            return None if number is None else float(round(number, values[1] if len(values) > 1 else 0))
+        return _handle_arithmetic(self, operator, values)
+
+    _aggregate._Parser._handle_arithmetic_operator = _handle_round
+
+if not hasattr(_Collection, "_find_and_modify_by_filter"):
+    _Collection._find_and_modify_by_filter = _Collection._find_and_modify
+
+    def _find_and_modify(self, query, projection=None, *args, **kwargs):
+        # Cible le document par `_id`, comme MongoDB
+        found = self.find_one(query, projection={"_id": 1}, sort=kwargs.get("sort"))
+        if found is not None:
+            query = {"_id": found["_id"]}
+        return self._find_and_modify_by_filter(query, projection, *args, **kwargs)
+
+    _Collection._find_and_modify = _find_and_modify
+
+
+def database(name: str = "budget_test"):
+    return AsyncMongoMockClient()[name]
@@ -0,0 +1,63 @@
+"""
+Archivage (archive.py) : déplacement par lots, résumés, reprise d'un lot interrompu.
+"""
+import asyncio
+import uuid
+from datetime import datetime, timezone
+
+import archive
+from mongo import database
+
+USER = str(uuid.uuid4())
+CUTOFF = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def transaction(amount, month, year=2023, type_="Dépense"):
+    return {"id": str(uuid.uuid4()), "user_id": USER, "date": datetime(year, month, 10), "amount": amount,
+            "type": type_, "description": "x", "category_id": None, "subcategory_id": None}
+
+
+async def _account():
+    db = database()
+    await db.users.insert_one({"id": USER, "tx_version": 0, "tx_epoch": 0, "data_version": 0})
+    docs = [transaction(10, 1), transaction(20, 2), transaction(5, 2, type_="Revenu"), transaction(7, 3, year=2024)]
+    await db.transactions.insert_many(docs)
+    return db
+
+
+def test_archive_user_moves_old_transactions_and_summarizes():
+    async def scenario():
+        db = await _account()
+        archive.ARCHIVE_BATCH_SIZE, size = 2, archive.ARCHIVE_BATCH_SIZE
+        try:
+            assert await archive.archive_user(db, USER, CUTOFF) == 3
+        finally:
+            archive.ARCHIVE_BATCH_SIZE = size
+        assert await db.transactions.count_documents({}) == 1
+        assert await db.transactions_archive.count_documents(archive.settled({"user_id": USER})) == 3
+        assert await archive.summary_totals(db, USER) == {"Revenu": 5, "Dépense": 30}
+        user = await db.users.find_one({"id": USER})
+        assert user["archived_before"].replace(tzinfo=timezone.utc) == CUTOFF
+        assert (user["tx_epoch"], user["data_version"]) == (1, 1)
+        assert await archive.archive_user(db, USER, CUTOFF) == 0
+
+    asyncio.run(scenario())
+
+
+def test_interrupted_batch_is_never_counted_twice_and_is_resumed():
+    async def scenario():
+        db = await _account()
+        # Arrêt entre la copie et la suppression : le lot n'est compté que par la collection chaude
+        batch = await db.transactions.find({"date": {"$lt": CUTOFF}}).to_list(None)
+        await db.transactions_archive.insert_many([{**t, archive.IN_FLIGHT: True} for t in batch])
+        await archive.rebuild_summaries(db, USER)
+        assert await archive.summary_totals(db, USER) == {"Revenu": 0, "Dépense": 0}
+        assert await db.transactions_archive.count_documents(archive.settled({"user_id": USER})) == 0
+        # Arrêt après la suppression : le passage suivant termine le lot même sans rien d'autre à déplacer
+        await db.transactions.delete_many({"date": {"$lt": CUTOFF}})
+        assert await archive.archive_user(db, USER, CUTOFF) == 3
+        assert await db.transactions_archive.count_documents({archive.IN_FLIGHT: {"$exists": True}}) == 0
+        assert await archive.summary_totals(db, USER) == {"Revenu": 5, "Dépense": 30}
+        assert (await db.users.find_one({"id": USER}))["tx_epoch"] == 1
+
+    asyncio.run(scenario())
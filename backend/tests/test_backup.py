@@ -0,0 +1,68 @@
+"""
+Sauvegarde et restauration (backup.py) : aller-retour, échec en cours de restauration.
+"""
+import asyncio
+import gzip
+import io
+import uuid
+from datetime import datetime
+
+import pytest
+
+import backup
+from mongo import database
+
+USER = str(uuid.uuid4())
+
+
+async def _account(db, description="Courses"):
+    category = str(uuid.uuid4())
+    await db.users.insert_one({"id": USER, "email": "a@example.com", "currency": "EUR", "tx_version": 0, "tx_epoch": 0})
+    await db.categories.insert_one({"id": category, "user_id": USER, "name": "Alimentation", "type": "Dépense"})
+    await db.transactions.insert_many([
+        {"id": str(uuid.uuid4()), "user_id": USER, "date": datetime(2025, 3, day), "amount": 10.0 + day,
+         "type": "Dépense", "description": description, "category_id": category, "subcategory_id": None}
+        for day in range(1, 6)
+    ])
+
+
+async def _dump(db) -> bytes:
+    return b"".join([chunk async for chunk in backup.backup_stream(db, USER)])
+
+
+def test_restore_replaces_account_data():
+    async def scenario():
+        db = database()
+        await _account(db)
+        data = await _dump(db)
+        assert backup.validate(io.BytesIO(data))["transactions"] == 5
+        await db.transactions.insert_one({"id": "extra", "user_id": USER, "date": datetime(2025, 4, 1), "amount": 1.0,
+                                          "type": "Dépense", "description": "après la sauvegarde"})
+        _, inserted = await backup.restore(db, io.BytesIO(data), USER)
+        assert inserted == {"categories": 1, "transactions": 5}
+        transactions = await db.transactions.find({"user_id": USER}).to_list(None)
+        (category,) = await db.categories.find({"user_id": USER}).to_list(None)
+        assert len(transactions) == 5 and {t["category_id"] for t in transactions} == {category["id"]}
+        assert await db.transactions.count_documents({}) == 5  # plus rien sous le propriétaire provisoire
+        assert (await db.users.find_one({"id": USER}))["tx_epoch"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_failed_restore_leaves_account_intact(monkeypatch):
+    monkeypatch.setattr(backup, "BACKUP_BATCH_SIZE", 2)
+
+    async def scenario():
+        db = database()
+        await _account(db, "avant")
+        lines = gzip.decompress(await _dump(db)).splitlines(keepends=True)
+        # Archive tronquée par une ligne illisible après quelques lots déjà insérés
+        broken = gzip.compress(b"".join(lines[:-2]) + b"{pas du json\n")
+        with pytest.raises(backup.BackupError):
+            await backup.restore(db, io.BytesIO(broken), USER)
+        assert await db.transactions.count_documents({}) == 5
+        assert {t["description"] for t in await db.transactions.find({}).to_list(None)} == {"avant"}
+        assert await db.categories.count_documents({}) == 1
+        assert (await db.users.find_one({"id": USER}))["tx_epoch"] == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,44 @@
+"""
+Cache LRU en mémoire (cache.py) : éviction, TTL.
+"""
+import cache
+from cache import LRUCache
+
+
+def test_lru_eviction_order():
+    lru = LRUCache("test", maxsize=2)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    assert lru.get("a") == 1  # a redevient le plus récent
+    lru.set("c", 3)
+    assert lru.get("b") is None
+    assert (lru.get("a"), lru.get("c"), len(lru)) == (1, 3, 2)
+    lru.set("a", 10)
+    assert lru.get("a") == 10 and len(lru) == 2
+    lru.delete("a")
+    assert lru.get("a", "absent") == "absent"
+
+
+def test_falsy_values_are_hits():
+    lru = LRUCache("test", maxsize=4)
+    lru.set("zero", 0)
+    lru.set("none", None)
+    assert lru.get("zero", "absent") == 0
+    assert lru.get("none", "absent") is None
+
+
+def test_ttl_expiry(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    lru = LRUCache("test", maxsize=4, ttl=10)
+    lru.set("k", "v")
+    now[0] = 109.9
+    assert lru.get("k") == "v"
+    now[0] = 110
+    assert lru.get("k") is None and len(lru) == 0
+
+
+def test_disabled_cache_keeps_nothing():
+    lru = LRUCache("test", maxsize=0)
+    lru.set("k", "v")
+    assert lru.get("k") is None and len(lru) == 0
@@ -0,0 +1,69 @@
+"""
+Catégories par défaut partagées (category_templates.py) : superposition,
+copie à l'écriture et pierres tombales.
+"""
+import asyncio
+import uuid
+
+import category_templates as ct
+from mongo import database
+
+USER = str(uuid.uuid4())
+OTHER = str(uuid.uuid4())
+SANTE = ct.template_id("Santé")
+
+
+def names(categories):
+    return [c["name"] for c in categories]
+
+
+def test_template_ids_are_stable():
+    assert ct.template_id("Santé") == SANTE == ct.template_id("Santé")
+    assert list(ct.TEMPLATES)[0] == ct.template_id("Salaire")
+
+
+def test_overlay_without_and_with_defaults():
+    own = [{"id": "x", "name": "Perso"}, {"id": "y", "name": "Supprimée", "deleted": True}]
+    assert names(ct.overlay(own, False)) == ["Perso"]
+    merged = ct.overlay(own, True)
+    assert names(merged) == [c["name"] for c in ct.DEFAULT_CATEGORIES] + ["Perso"]
+
+
+def test_update_copies_the_template_then_edits_the_copy():
+    async def scenario():
+        categories = database().categories
+        await ct.update(categories, USER, SANTE, {"name": "Médecin"})
+        (copy,) = await categories.find({}).to_list(None)
+        assert (copy["id"], copy["user_id"], copy["name"], copy["type"]) == (SANTE, USER, "Médecin", "Dépense")
+        await ct.update(categories, USER, SANTE, {"type": "Revenu"})
+        assert await categories.count_documents({}) == 1
+        found = await ct.find_one(categories, USER, True, SANTE)
+        assert (found["name"], found["type"]) == ("Médecin", "Revenu")
+        visible = await ct.user_categories(categories, USER, True)
+        assert len(visible) == len(ct.TEMPLATES)
+        assert visible[list(ct.TEMPLATES).index(SANTE)]["name"] == "Médecin"
+        # Les autres comptes et le modèle partagé ne bougent pas
+        assert (await ct.find_one(categories, OTHER, True, SANTE))["name"] == "Santé"
+        assert ct.TEMPLATES[SANTE]["name"] == "Santé"
+
+    asyncio.run(scenario())
+
+
+def test_delete_leaves_a_tombstone_for_templates_only():
+    async def scenario():
+        categories = database().categories
+        await ct.update(categories, USER, SANTE, {"name": "Médecin"})
+        await ct.delete(categories, USER, SANTE)
+        (tombstone,) = await categories.find({}).to_list(None)
+        assert tombstone["deleted"] is True and "name" not in tombstone
+        assert await ct.find_one(categories, USER, True, SANTE) is None
+        assert "Santé" not in names(await ct.user_categories(categories, USER, True))
+        assert len(await ct.user_categories(categories, OTHER, True)) == len(ct.TEMPLATES)
+        # Une catégorie propre est simplement supprimée
+        await categories.insert_one({"id": "perso", "user_id": USER, "name": "Perso", "type": "Dépense"})
+        await ct.delete(categories, USER, "perso")
+        assert await categories.count_documents({"id": "perso"}) == 0
+        # Un compte sans les modèles ne les voit pas
+        assert await ct.find_one(categories, OTHER, False, SANTE) is None
+
+    asyncio.run(scenario())
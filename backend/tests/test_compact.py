@@ -0,0 +1,161 @@
+"""
+Format compact (compact.py) : encodage, requêtes traduites, mode mixte, migration.
+"""
+import asyncio
+import uuid
+from datetime import datetime
+
+import pytest
+from bson import Binary, ObjectId
+
+import compact
+from compact import TransactionCollection, decode, encode, merge_sorted
+from mongo import database
+
+USER = str(uuid.uuid4())
+CATEGORY = str(uuid.uuid4())
+
+
+def legacy(amount, day, description="x", **extra):
+    doc = {"_id": ObjectId(), "id": str(uuid.uuid4()), "user_id": USER, "date": datetime(2025, 3, day),
+           "amount": amount, "type": "Dépense", "description": description, "category_id": CATEGORY,
+           "subcategory_id": None, "created_at": datetime(2025, 3, day)}
+    doc.update(extra)
+    return doc
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_encode_decode_round_trip():
+    doc = legacy(12.5, 3, id="import-42")
+    stored = encode(dict(doc))
+    assert stored["a"] == 1250 and isinstance(stored["u"], Binary)
+    assert stored["i"] == "import-42"  # pas un UUID : reste une chaîne
+    assert "s" not in stored  # None omis
+    assert "k" in stored  # created_at loin de l'_id
+    assert decode(stored) == doc
+    assert decode(doc) is doc  # déjà historique
+    assert encode(stored) is stored
+
+
+def test_created_at_derived_from_object_id():
+    _id = ObjectId()
+    doc = legacy(1, 1, _id=_id, created_at=_id.generation_time.replace(tzinfo=None))
+    stored = encode(dict(doc))
+    assert "k" not in stored
+    assert decode(stored)["created_at"] == doc["created_at"]
+
+
+@pytest.mark.parametrize("op,value,expected", [
+    ("$lte", 0.57, 57), ("$gt", 0.57, 57), ("$gte", 0.57, 57), ("$lt", 0.57, 57),
+    ("$lte", 0.575, 57), ("$gt", 0.575, 57), ("$gte", 0.575, 58), ("$lt", 0.575, 58),
+    ("$gte", 0.29, 29), ("$lte", 12, 1200),
+])
+def test_cents_bounds(op, value, expected):
+    assert compact.encode_query({"amount": {op: value}}) == {"a": {op: expected}}
+
+
+async def _mixed_collection():
+    db = database()
+    coll = TransactionCollection(db.transactions, "mixed")
+    old = [legacy(0.29, 1, "a"), legacy(0.57, 3, "c"), legacy(0.1, 5, "e")]
+    await db.transactions.insert_many([dict(d) for d in old])
+    new = [legacy(0.1, 2, "b"), legacy(0.57, 4, "d"), legacy(0.1, 6, "f")]
+    await coll.insert_many([dict(d) for d in new])
+    return db, coll, old + new
+
+
+def test_mixed_reads_merge_both_formats():
+    async def scenario():
+        db, coll, docs = await _mixed_collection()
+        assert await db.transactions.count_documents({compact.MARKER: {"$exists": True}}) == 3
+        ordered = await coll.find({"user_id": USER}).sort("date", 1).to_list(None)
+        assert [d["description"] for d in ordered] == list("abcdef")
+        assert ordered == sorted(docs, key=lambda d: d["date"])
+        page = await coll.find({"user_id": USER}).sort("date", -1).skip(1).limit(3).to_list(None)
+        assert [d["description"] for d in page] == list("edc")
+        streamed = [d["description"] async for d in coll.find({"user_id": USER}).sort("date", 1)]
+        assert streamed == list("abcdef")
+        assert sorted(d["description"] for d in await coll.find({"amount": {"$lte": 0.57, "$gt": 0.1}}).to_list(None)) == list("acd")
+        assert await coll.count_documents({"category_id": CATEGORY}) == 6
+        found = await coll.find_one({"id": docs[4]["id"]})
+        assert found == docs[4]
+
+    run(scenario())
+
+
+def test_mixed_aggregate_sums_in_exact_cents():
+    async def scenario():
+        _, coll, _ = await _mixed_collection()
+        rows = await coll.aggregate([
+            {"$match": {"user_id": USER}},
+            {"$group": {"_id": "$category_id", "total": {"$sum": "$amount"}, "n": {"$sum": 1}}},
+        ]).to_list(None)
+        # Une ligne par format de l'identifiant (voir TransactionCollection.aggregate) : on cumule
+        assert {row["_id"] for row in rows} == {CATEGORY}
+        assert sum(row["n"] for row in rows) == 6
+        assert round(sum(row["total"] for row in rows), 2) == 1.73
+        (total,) = await coll.aggregate([
+            {"$match": {"user_id": USER}}, {"$group": {"_id": None, "total": {"$sum": "$amount"}}},
+        ]).to_list(None)
+        assert total["total"] == 1.73  # somme entière en centimes : 0.29 * 100 ne dérive pas
+
+    run(scenario())
+
+
+def test_mixed_updates_and_deletes_reach_both_formats():
+    async def scenario():
+        db, coll, docs = await _mixed_collection()
+        result = await coll.update_many({"user_id": USER, "amount": 0.1}, {"$set": {"subcategory_id": CATEGORY, "amount": 0.2}})
+        assert result.matched_count == 3
+        assert await coll.count_documents({"amount": 0.2, "subcategory_id": CATEGORY}) == 3
+        await coll.update_one({"id": docs[0]["id"]}, {"$set": {"description": "A"}})
+        assert (await coll.find_one({"id": docs[0]["id"]}))["description"] == "A"
+        await coll.delete_many({"date": {"$lt": datetime(2025, 3, 3)}})
+        assert await coll.count_documents({}) == 4
+
+    run(scenario())
+
+
+def test_untranslated_methods_are_refused():
+    coll = TransactionCollection(database().transactions, "mixed")
+    assert coll.name == "transactions"
+    for name in ("find_one_and_update", "bulk_write", "distinct", "watch", "replace_one"):
+        with pytest.raises(AttributeError):
+            getattr(coll, name)
+
+
+def test_merge_sorted_descending():
+    async def source(values):
+        for v in values:
+            yield v
+
+    async def scenario():
+        return [v async for v in merge_sorted([source([9, 5, 1]), source([8, 2]), source([])], key=lambda v: v, reverse=True)]
+
+    assert run(scenario()) == [9, 8, 5, 2, 1]
+
+
+def test_migrate_round_trip_and_finalize():
+    async def scenario():
+        db = database()
+        docs = [legacy(i / 7, i % 28 + 1) for i in range(25)]
+        await db.transactions.insert_many([dict(d) for d in docs])
+        with pytest.raises(RuntimeError):
+            await compact.drop_legacy_indexes(db, "transactions")
+        assert await compact.migrate(db, "transactions", "compact", batch_size=10) == (25, 0)
+        assert await db.transactions.count_documents({compact.MARKER: {"$exists": False}}) == 0
+        state = await db.migrations.find_one({"_id": "transactions:compact"})
+        assert state["converted"] == 25 and state["remaining"] == 0
+        # Reprise : rien à refaire
+        assert await compact.migrate(db, "transactions", "compact") == (0, 0)
+        coll = TransactionCollection(db.transactions, "compact")
+        expected = {d["id"]: dict(d, amount=round(d["amount"], 2)) for d in docs}
+        assert {d["id"]: d for d in await coll.find({}).to_list(None)} == expected
+        await compact.drop_legacy_indexes(db, "transactions")
+        assert await compact.migrate(db, "transactions", "legacy", batch_size=10) == (25, 0)
+        assert {d["id"]: d for d in await db.transactions.find({}).to_list(None)} == expected
+
+    run(scenario())
@@ -0,0 +1,63 @@
+"""
+Comparaison de périodes (/api/dashboard/compare) : bornes, totaux, budgets.
+"""
+import pytest
+
+import server
+
+
+@pytest.mark.parametrize("granularity,key,start", [
+    ("month", "2025-03", (2025, 3)),
+    ("quarter", "2025-q2", (2025, 4)),
+    ("year", "2024", (2024, 1)),
+])
+def test_parse_period(granularity, key, start):
+    assert server.parse_period(granularity, key) == start
+    assert server.period_key(granularity, start) == key.upper()
+
+
+def test_period_helpers():
+    assert server.add_months(2024, 11, 3) == (2025, 2)
+    assert server.add_months(2025, 1, -1) == (2024, 12)
+    assert server.period_start("quarter", 2025, 8) == (2025, 7)
+    assert server.period_months("quarter", (2025, 11)) == [(2025, 11), (2025, 12), (2026, 1)]
+    assert server.period_label("quarter", "2025-Q3", (2025, 7)) == "T3 2025"
+
+
+def test_totals_and_budgets_per_period(api):
+    async def scenario(client):
+        category = (await client.post("/api/categories", json={"name": "Courses", "type": "Dépense"})).json()
+        await client.post("/api/budgets", json={"category_id": category["id"], "amount": 100})
+        for date, amount, kind, category_id in [
+            ("2025-01-05T10:00:00Z", 2000, "Revenu", None),
+            ("2025-01-20T10:00:00Z", 80, "Dépense", category["id"]),
+            ("2025-02-03T10:00:00Z", 150, "Dépense", category["id"]),
+            ("2025-04-01T00:00:00Z", 500, "Revenu", None),
+        ]:
+            body = {"date": date, "amount": amount, "type": kind, "category_id": category_id}
+            assert (await client.post("/api/transactions", json=body)).status_code == 200
+        months = (await client.get("/api/dashboard/compare", params={"periods": "2025-01,2025-02"})).json()
+        quarters = (await client.get("/api/dashboard/compare", params={"granularity": "quarter", "year": 2025})).json()
+        return months, quarters
+
+    months, quarters = api.run(scenario)
+    january, february = months["periods"]
+    assert (january["display_period"], january["total_income"], january["total_expense"]) == ("Janvier 2025", 2000, 80)
+    assert january["savings_rate"] == pytest.approx(96)
+    assert [b["amount_spent"] for b in january["respected_budgets"]] == [80]
+    assert february["savings_rate"] == 0 and february["exceeded_budgets"][0]["difference"] == -50
+    assert [p["period"] for p in quarters["periods"]] == ["2025-Q1", "2025-Q2", "2025-Q3", "2025-Q4"]
+    first, second = quarters["periods"][:2]
+    assert (first["total_income"], first["total_expense"], second["total_income"]) == (2000, 230, 500)
+    assert first["respected_budgets"][0]["amount_budgeted"] == 300  # budget mensuel x 3 mois
+    assert second["end_date"].startswith("2025-07-01")
+
+
+@pytest.mark.parametrize("params", [
+    {"granularity": "week"},
+    {"periods": "2025-13"},
+    {"periods": ","},
+    {"start": "2000-01", "end": "2025-12"},
+])
+def test_invalid_requests(api, params):
+    assert api.get("/api/dashboard/compare", params).status_code == 400
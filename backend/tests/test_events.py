@@ -0,0 +1,102 @@
+"""
+Événements en direct (events.py) : fusion, file bornée, change streams, flux SSE.
+"""
+import asyncio
+import time
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+
+import compact
+import events
+from events import RESYNC, EventHub
+
+USER = str(uuid.uuid4())
+
+
+@pytest.fixture(autouse=True)
+def fast(monkeypatch):
+    monkeypatch.setattr(events, "COALESCE_SECONDS", 0)
+
+
+def test_transactions_event_and_format():
+    event = events.transactions_event([datetime(2025, 3, 31, 23, tzinfo=timezone.utc), datetime(2025, 1, 2), None])
+    assert event == {"event": "transactions", "months": ["2025-01", "2025-03"]}
+    assert events.format_sse(event) == b'event: transactions\ndata: {"months": ["2025-01", "2025-03"]}\n\n'
+
+
+def test_coalesce():
+    march, april = events.transactions_event([datetime(2025, 3, 1)]), events.transactions_event([datetime(2025, 4, 1)])
+    removed = events.pending_removed("p1")
+    assert events.coalesce([march, removed, april]) == [removed, {"event": "transactions", "months": ["2025-03", "2025-04"]}]
+    assert events.coalesce([march, events.transactions_event(None)]) == [{"event": "transactions", "months": None}]
+    assert events.coalesce([march, RESYNC, removed]) == [RESYNC]
+
+
+def test_publish_reaches_only_the_user_and_slow_clients_resync(monkeypatch):
+    monkeypatch.setattr(events, "QUEUE_SIZE", 2)
+    monkeypatch.setattr(events, "MAX_CONNECTIONS_PER_USER", 2)
+
+    async def scenario():
+        hub = EventHub()
+        mine, other = hub.subscribe(USER), hub.subscribe("autre")
+        hub.subscribe(USER)
+        with pytest.raises(events.TooManyConnections):
+            hub.subscribe(USER)
+        for month in (1, 2, 3):
+            hub.notify(USER, events.transactions_event([datetime(2025, month, 1)]))
+        assert await mine.next(0.1) == [RESYNC]  # file pleine : vidée, un seul resync
+        assert await other.next(0.01) == []
+        mine.close()
+        mine.close()
+        hub.subscribe(USER)  # une place libérée
+        hub.source = "changestream"
+        hub.notify("autre", RESYNC)  # les change streams font foi
+        assert await other.next(0.01) == []
+
+    asyncio.run(scenario())
+
+
+def test_change_events_route_by_user_for_both_formats():
+    date = datetime(2025, 3, 4)
+    legacy = {"_id": 1, "id": str(uuid.uuid4()), "user_id": USER, "date": date, "amount": 1.0, "type": "Dépense"}
+    change = {"ns": {"coll": "transactions"}, "operationType": "update",
+              "fullDocumentBeforeChange": compact.encode(dict(legacy)),
+              "fullDocument": dict(legacy, date=datetime(2025, 4, 1))}
+    assert events.change_events(change) == [(USER, {"event": "transactions", "months": ["2025-03", "2025-04"]})]
+    assert events.change_events({"ns": {"coll": "transactions"}, "operationType": "delete"}) == []
+    pending = {"id": "p1", "user_id": USER, "amount": 3.0, "merchant": "FNAC"}
+    added = events.change_events({"ns": {"coll": "pending_transactions"}, "operationType": "insert", "fullDocument": pending})
+    assert added[0][0] == USER and added[0][1]["item"]["merchant"] == "FNAC"
+    removed = events.change_events({"ns": {"coll": "pending_transactions"}, "operationType": "delete",
+                                    "fullDocumentBeforeChange": pending})
+    assert removed == [(USER, events.pending_removed("p1"))]
+
+
+def test_sse_stream_stops_on_expiry_and_revocation(monkeypatch):
+    monkeypatch.setattr(events, "HEARTBEAT_SECONDS", 0.01)
+    monkeypatch.setattr(events, "REVALIDATE_SECONDS", 0)
+
+    async def connected():
+        return False
+
+    async def scenario():
+        hub = EventHub()
+        subscription = hub.subscribe(USER)
+        hub.publish(USER, events.pending_removed("p1"))
+        checks = []
+
+        async def still_valid():
+            checks.append(1)
+            return len(checks) < 3
+
+        chunks = [c async for c in events.sse_stream(subscription, connected, still_valid=still_valid)]
+        assert chunks[0] == b"retry: 5000\n\n"
+        assert chunks[1].startswith(b"event: pending\n")
+        assert chunks[2:] == [b": ping\n\n"]
+        assert not hub._subscribers  # désinscrit à la fin du flux
+        expired = [c async for c in events.sse_stream(hub.subscribe(USER), connected, expires_at=time.time() - 1)]
+        assert expired == [b"retry: 5000\n\n"]
+
+    asyncio.run(scenario())
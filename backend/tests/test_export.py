@@ -0,0 +1,48 @@
+"""
+Export CSV en flux (export.py) : premiers octets, gzip, cellules neutralisées.
+"""
+import asyncio
+import csv
+import io
+import zlib
+from datetime import datetime
+
+import export
+
+
+def transaction(description, category_id=None):
+    return {"date": datetime(2025, 3, 1), "type": "Dépense", "amount": 12.5,
+            "description": description, "category_id": category_id, "subcategory_id": None}
+
+
+async def _never_ending():
+    await asyncio.Event().wait()
+    yield  # pragma: no cover
+
+
+def _rows(data: bytes) -> list:
+    return list(csv.reader(io.StringIO(data.decode("utf-8-sig"))))
+
+
+def test_header_is_sent_before_the_first_transaction():
+    async def first_chunk(compress):
+        stream = export.csv_stream(_never_ending(), {}, {}, compress)
+        return await asyncio.wait_for(stream.__anext__(), 1)
+
+    assert _rows(asyncio.run(first_chunk(False))) == [export.HEADER]
+    inflate = zlib.decompressobj(31)
+    assert _rows(inflate.decompress(asyncio.run(first_chunk(True)))) == [export.HEADER]
+
+
+def test_formula_cells_are_neutralized():
+    async def collect():
+        async def source():
+            for t in (transaction("=cmd|' /C calc'!A0"), transaction("@SUM(A1)", "c"),
+                      transaction("-2+3"), transaction("Café - croissant")):
+                yield t
+        return b"".join([chunk async for chunk in export.csv_stream(source(), {"c": "+Courses"}, {}, True)])
+
+    rows = _rows(zlib.decompress(asyncio.run(collect()), 31))
+    assert [r[3] for r in rows[1:]] == ["'=cmd|' /C calc'!A0", "'@SUM(A1)", "'-2+3", "Café - croissant"]
+    assert rows[2][4] == "'+Courses"
+    assert rows[1][2] == "12.5"
@@ -0,0 +1,76 @@
+"""
+Cache des claims JWT vérifiés (jwt_cache.py) : succès, expiration, révocation, borne.
+"""
+import time
+
+import pytest
+
+import jwt_cache
+from jwt_cache import ClaimsCache
+
+
+class Verifier:
+    """Faux `verify` : compte ses appels ; les jetons sont « sujet:exp »."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, token: str) -> dict:
+        self.calls += 1
+        if token == "invalide":
+            raise ValueError("signature")
+        subject, exp = token.split(":")
+        return {"sub": subject, "exp": float(exp)}
+
+
+def token(subject, ttl=3600):
+    return f"{subject}:{time.time() + ttl}"
+
+
+def test_verified_claims_are_reused_until_exp(monkeypatch):
+    cache, verify = ClaimsCache(), Verifier()
+    a = token("a", ttl=60)
+    assert cache.decode(a, verify) == cache.decode(a, verify)
+    assert verify.calls == 1
+    now = time.time()
+    monkeypatch.setattr(jwt_cache.time, "time", lambda: now + 61)
+    cache.decode(a, verify)  # expiré : revérifié (et rejeté par le vrai verify)
+    assert verify.calls == 2 and len(cache) == 0
+
+
+def test_failures_and_expired_tokens_are_not_cached():
+    cache, verify = ClaimsCache(), Verifier()
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            cache.decode("invalide", verify)
+        cache.decode(token("a", ttl=-1), verify)
+    assert verify.calls == 4 and len(cache) == 0
+
+
+def test_revoke_drops_only_the_subject():
+    cache, verify = ClaimsCache(), Verifier()
+    tokens = [token("a"), token("a", 7200), token("b")]
+    for t in tokens:
+        cache.decode(t, verify)
+    assert cache.revoke("a") == 2
+    assert len(cache) == 1
+    for t in tokens:
+        cache.decode(t, verify)
+    assert verify.calls == 5  # seuls les deux jetons de « a » ont été revérifiés
+
+
+def test_lru_bound_and_disabled_cache():
+    cache, verify = ClaimsCache(maxsize=2), Verifier()
+    a, b, c = token("a"), token("b"), token("c")
+    cache.decode(a, verify)
+    cache.decode(b, verify)
+    cache.decode(a, verify)  # a redevient le plus récent
+    cache.decode(c, verify)  # évince b
+    assert len(cache) == 2
+    cache.decode(a, verify)
+    cache.decode(b, verify)
+    assert verify.calls == 4
+    disabled = ClaimsCache(maxsize=0)
+    disabled.decode(a, verify)
+    disabled.decode(a, verify)
+    assert verify.calls == 6 and len(disabled) == 0
@@ -0,0 +1,82 @@
+"""
+Index marchand (merchants.py) : normalisation, confiance, préfixes, mise à jour.
+"""
+import asyncio
+import uuid
+
+import pytest
+
+from compact import TransactionCollection
+from merchants import MerchantIndex, MerchantIndexes, Suggestion, normalize
+from mongo import database
+
+USER = str(uuid.uuid4())
+
+
+@pytest.mark.parametrize("description,expected", [
+    ("CB CARREFOUR MARKET 12/03 CARTE 4974XX", "carrefour market"),
+    ("PRLV SEPA Free Mobile", "free mobile"),
+    ("VIR Amazon Prime Vidéo Europe", "amazon prime video"),
+    ("1234 5678", None),
+    ("", None),
+    (None, None),
+])
+def test_normalize(description, expected):
+    assert normalize(description) == expected
+
+
+def test_confidence_and_prefix_fallback():
+    index = MerchantIndex()
+    assert index.lookup("CB CARREFOUR") is None
+    index.learn("CB CARREFOUR MARKET 12/03", "courses")
+    assert index.lookup("CARREFOUR MARKET") == Suggestion("courses", None, 0.5)
+    index.learn("CARREFOUR MARKET PARIS", "courses")
+    index.learn("CB CARREFOUR MARKET", "courses", "super")
+    suggestion = index.lookup("CB CARREFOUR MARKET 14/03")
+    assert suggestion.category_id == "courses" and suggestion.confidence == 2 / 4
+    # Libellé inconnu au-delà du premier mot : repli sur le préfixe le plus long connu
+    assert index.lookup("CARREFOUR CITY").category_id == "courses"
+    assert index.lookup("AMAZON") is None
+
+
+def test_forget_undoes_learn():
+    index = MerchantIndex()
+    index.learn("Boulangerie Paul", "alimentation")
+    index.learn("Boulangerie Paul", "restaurant")
+    index.forget("Boulangerie Paul", "restaurant")
+    assert index.lookup("BOULANGERIE PAUL") == Suggestion("alimentation", None, 0.5)
+    index.forget("Boulangerie Paul", "alimentation")
+    assert index.lookup("BOULANGERIE PAUL") is None and len(index) == 0
+
+
+def test_apply_respects_min_confidence_and_existing_categories():
+    index = MerchantIndex()
+    for _ in range(3):
+        index.learn("NETFLIX.COM", "abonnements", "video")
+    index.learn("FNAC", "shopping")
+    rows = [{"description": "NETFLIX.COM 0123"}, {"description": "FNAC"}, {"description": "NETFLIX", "category_id": "autre"}]
+    assert index.apply(rows, min_confidence=0.6) == 1
+    assert (rows[0]["category_id"], rows[0]["subcategory_id"]) == ("abonnements", "video")
+    assert "category_id" not in rows[1] and rows[2]["category_id"] == "autre"
+
+
+def test_indexes_build_from_history_and_follow_writes():
+    async def scenario():
+        db = database()
+        transactions = TransactionCollection(db.transactions, "compact")
+        await transactions.insert_many([
+            {"id": str(uuid.uuid4()), "user_id": USER, "description": "CB UBER TRIP", "category_id": "transport",
+             "subcategory_id": None, "amount": 12.0, "type": "Dépense"}
+            for _ in range(3)
+        ] + [{"id": str(uuid.uuid4()), "user_id": USER, "description": "CB UBER EATS", "category_id": None,
+              "subcategory_id": None, "amount": 20.0, "type": "Dépense"}])
+        indexes = MerchantIndexes(maxsize=4, ttl=None)
+        index = await indexes.get(transactions, USER)
+        assert index.lookup("UBER TRIP HELP") == Suggestion("transport", None, 0.75)
+        assert await indexes.get(transactions, USER) is index
+        indexes.learn(USER, "UBER EATS", "restaurant")
+        assert index.lookup("UBER EATS").category_id == "restaurant"
+        indexes.invalidate(USER)
+        assert await indexes.get(transactions, USER) is not index
+
+    asyncio.run(scenario())
@@ -0,0 +1,109 @@
+"""
+Extraction par le modèle (pdf_import.py) avec un faux client : découpage,
+relances, borne de concurrence et fusion des morceaux.
+"""
+import asyncio
+import json
+import re
+
+import pytest
+from fastapi import HTTPException
+
+import pdf_import
+
+
+def row(day, amount, description="CAFE"):
+    return {"date": f"2025-03-{day:02d}", "amount": amount, "type": "Dépense", "description": description}
+
+
+class StubClient(pdf_import.LLMClient):
+    """Répond selon la première page du morceau ; `failures` : échecs à servir d'abord, par page."""
+
+    def __init__(self, answers, failures=None):
+        self.answers = answers
+        self.failures = dict(failures or {})
+        self.calls = []
+        self.active = self.peak = 0
+
+    async def generate(self, prompt: str) -> str:
+        page = int(re.search(r"page-(\d+)", prompt).group(1))
+        self.calls.append(page)
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(0.01)
+            if self.failures.get(page):
+                self.failures[page] -= 1
+                return "désolé, pas de JSON"
+            return json.dumps(self.answers[page])
+        finally:
+            self.active -= 1
+
+
+@pytest.fixture
+def client(monkeypatch):
+    sleep = asyncio.sleep
+    monkeypatch.setattr(pdf_import.asyncio, "sleep", lambda delay: sleep(min(delay, 0.01)))
+    monkeypatch.setattr(pdf_import, "_semaphore", None)
+    monkeypatch.setattr(pdf_import, "LLM_CONCURRENCY", 2)
+    monkeypatch.setattr(pdf_import, "LLM_RETRIES", 1)
+
+    def install(*args, **kwargs):
+        stub = StubClient(*args, **kwargs)
+        pdf_import.use_client(stub)
+        return stub
+
+    yield install
+    pdf_import.use_client(None)
+
+
+def pages(count):
+    return [f"page-{n} texte du relevé" for n in range(1, count + 1)]
+
+
+def test_interface_requires_generate():
+    with pytest.raises(TypeError):
+        pdf_import.LLMClient()
+
+
+def test_chunks_are_retried_bounded_and_merged(client):
+    answers = {
+        1: [row(1, 3.5), row(2, 12)],
+        5: [row(2, 12), row(4, 3.5)],  # report de la dernière ligne du morceau précédent
+        9: [row(9, 40, "LOYER")],
+        13: [row(20, 3.5)],
+    }
+    stub = client(answers, failures={9: 1})
+    result = asyncio.run(pdf_import.extract_with_llm(pages(16)))
+    assert result.failed_pages == []
+    assert sorted(stub.calls) == [1, 5, 9, 9, 13]
+    assert stub.peak == 2
+    assert [(t["date"], t["amount"]) for t in result.transactions] == [
+        ("2025-03-01", 3.5), ("2025-03-02", 12), ("2025-03-04", 3.5), ("2025-03-09", 40), ("2025-03-20", 3.5),
+    ]
+
+
+def test_failed_chunk_pages_are_reported(client):
+    client({1: [row(1, 3.5)], 5: []}, failures={5: 2})
+    result = asyncio.run(pdf_import.extract_with_llm(pages(8)))
+    assert result.failed_pages == [(5, 8)]
+    assert len(result.transactions) == 1
+
+
+def test_all_chunks_failing_is_an_error(client):
+    client({}, failures={1: 2})
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(pdf_import.extract_with_llm(pages(2)))
+    assert error.value.status_code == 502
+
+
+def test_merge_counts_repeats_within_the_window():
+    coffee = row(3, 2.2)
+    merged = pdf_import.merge_chunks([
+        [coffee, row(1, 50, "COURSES"), row(2, 8), row(2, 30), row(3, 6), coffee, coffee],
+        [coffee, coffee, coffee, row(5, 9)],  # deux lignes reportées, puis un café de plus
+        None,
+        [row(5, 9)],  # après un morceau en échec : rien à comparer
+    ])
+    assert merged.count(coffee) == 4  # le premier, hors de la fenêtre, n'a rien retiré
+    assert merged.count(row(5, 9)) == 2
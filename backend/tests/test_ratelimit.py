@@ -0,0 +1,124 @@
+"""
+RedisBackend contre un faux serveur RESP local (tests/fake_redis.py).
+
+    cd backend && python -m pytest -q tests
+"""
+import asyncio
+import types
+
+import pytest
+
+import ratelimit
+from fake_redis import FakeRedis
+from ratelimit import RedisBackend, RedisError
+
+
+def run(scenario):
+    """Lance `scenario(server, backend)` contre un faux Redis neuf."""
+    async def main():
+        server = await FakeRedis().start()
+        backend = RedisBackend(f"redis://127.0.0.1:{server.port}/0", timeout=0.2)
+        try:
+            return await scenario(server, backend)
+        finally:
+            backend._close()
+            await server.stop()
+    return asyncio.run(main())
+
+
+def test_fixed_window_incr_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ratelimit, "time", types.SimpleNamespace(time=lambda: now[0]))
+
+    async def scenario(server, backend):
+        assert await backend.hit("login:1.2.3.4", 2, 60) == 0.0
+        assert await backend.hit("login:1.2.3.4", 2, 60) == 0.0
+        assert await backend.hit("login:1.2.3.4", 2, 60) == pytest.approx(20.0)  # fenêtre [960, 1020[
+        assert await backend.hit("login:5.6.7.8", 2, 60) == 0.0  # autre clé
+        key = b"rl:login:1.2.3.4:16"
+        assert server.data[key][0] == b"3"
+        assert server.data[key][1] is not None  # EXPIRE posé avec INCR
+        now[0] = 1020.0  # fenêtre suivante : compteur neuf
+        assert await backend.hit("login:1.2.3.4", 2, 60) == 0.0
+        assert server.data[b"rl:login:1.2.3.4:17"][0] == b"1"
+
+    run(scenario)
+
+
+def test_pipeline_replies_in_order():
+    async def scenario(server, backend):
+        replies = await backend.execute(("SET", "a", "x"), ("GET", "a"), ("INCR", "n"), ("GET", "absent"))
+        assert replies == ["OK", b"x", 1, None]
+        assert server.connections == 1
+        # Une erreur dans le pipeline est levée après lecture de toutes les réponses
+        with pytest.raises(RedisError):
+            await backend.execute(("INCR", "a"), ("INCR", "n"))
+        assert await backend.execute(("GET", "n")) == [b"2"]
+
+    run(scenario)
+
+
+def test_reconnects_after_server_drop():
+    async def scenario(server, backend):
+        assert await backend.execute(("INCR", "n")) == [1]
+        server.drop_connections()
+        await asyncio.sleep(0)
+        assert await backend.execute(("INCR", "n")) == [2]
+        assert server.connections == 2
+
+    run(scenario)
+
+
+def test_timeout_does_not_desync_connection():
+    async def scenario(server, backend):
+        await backend.execute(("SET", "mine", "A"), ("SET", "other", "B"))
+        server.hang = True
+        with pytest.raises(TimeoutError):
+            await backend.execute(("GET", "other"))
+        server.hang = False
+        # La réponse en retard ne doit pas être lue à la place de la suivante
+        assert await backend.execute(("GET", "mine")) == [b"A"]
+
+    run(scenario)
+
+
+def test_cancelled_call_does_not_desync_connection():
+    async def scenario(server, backend):
+        await backend.execute(("SET", "mine", "A"), ("SET", "other", "B"))
+        server.hang = True
+        call = asyncio.ensure_future(backend.execute(("GET", "other")))
+        await asyncio.sleep(0.05)
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+        server.hang = False
+        assert await backend.execute(("GET", "mine")) == [b"A"]
+
+    run(scenario)
+
+
+def test_waiters_are_bounded_by_timeout():
+    async def scenario(server, backend):
+        server.hang = True
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        results = await asyncio.gather(*(backend.execute(("INCR", "n")) for _ in range(5)), return_exceptions=True)
+        assert all(isinstance(r, TimeoutError) for r in results)
+        assert loop.time() - started < 0.5  # chaque appel borné, pas 5 x timeout
+
+    run(scenario)
+
+
+def test_limiter_fails_open_when_redis_hangs():
+    async def scenario(server, backend):
+        server.hang = True
+        limiter = ratelimit.Limiter(backend, key_func=lambda request: "k")
+
+        @limiter.limit("1/minute")
+        async def route(request):
+            return "ok"
+
+        request = ratelimit.Request({"type": "http", "headers": []})
+        assert await asyncio.wait_for(route(request=request), 1) == "ok"
+
+    run(scenario)
@@ -0,0 +1,50 @@
+"""
+Routage des lectures analytiques (read_routing.py) : préférence, fenêtre après écriture.
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from pymongo.read_preferences import SecondaryPreferred
+
+from compact import TransactionCollection
+from mongo import database
+from read_routing import ReadRouter, read_preference
+
+NOW = datetime(2025, 6, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def router(mode="secondaryPreferred", window=100):
+    db = database()
+    r = ReadRouter(mode, 90, window)
+    r.bind(db, TransactionCollection(db.transactions, "mixed"), TransactionCollection(db.transactions_archive, "mixed"))
+    return r
+
+
+def test_read_preference():
+    assert read_preference("primary", 0) is None
+    preference = read_preference("secondaryPreferred", 120)
+    assert isinstance(preference, SecondaryPreferred) and preference.max_staleness == 120
+    with pytest.raises(ValueError):
+        read_preference("secondaryPreferred", 60)
+    with pytest.raises(ValueError):
+        read_preference("secondaire", 90)
+
+
+def test_primary_mode_never_routes():
+    r = router("primary")
+    assert r.secondary is None
+    assert r.reads() is r.primary
+    assert r.reads(NOW - timedelta(days=1), NOW) is r.primary
+
+
+def test_recent_writes_stay_on_the_primary():
+    r = router()
+    assert r.secondary.transactions.mode == "mixed"
+    assert r.secondary.transactions.name == "transactions"
+    assert r.secondary is not r.primary
+    assert r.reads(None, NOW) is r.secondary  # jamais écrit
+    assert r.reads(NOW - timedelta(seconds=99), NOW) is r.primary
+    assert r.reads(NOW - timedelta(seconds=100), NOW) is r.secondary
+    # Date naïve lue dans MongoDB : UTC
+    assert r.reads((NOW - timedelta(seconds=5)).replace(tzinfo=None), NOW) is r.primary
+    assert r.reads((NOW - timedelta(hours=1)).replace(tzinfo=None), NOW) is r.secondary
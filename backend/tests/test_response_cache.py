@@ -0,0 +1,68 @@
+"""
+Cache de réponses à deux niveaux (response_cache.py) contre un faux Redis.
+"""
+import asyncio
+import json
+
+from fake_redis import FakeRedis
+from response_cache import ResponseCache
+
+KEY = ("user", 3, "2025-01-01", None)
+
+
+def run(scenario):
+    async def main():
+        server = await FakeRedis().start()
+        url = f"redis://127.0.0.1:{server.port}/0"
+        caches = []
+
+        def cache():
+            c = ResponseCache("test", maxsize=8, ttl=60, url=url)
+            c.shared.timeout = 0.2
+            caches.append(c)
+            return c
+        try:
+            return await scenario(server, cache)
+        finally:
+            for c in caches:
+                c.shared._close()
+            await server.stop()
+    return asyncio.run(main())
+
+
+def test_local_only_cache():
+    async def scenario():
+        cache = ResponseCache("test", maxsize=8, ttl=60, url=None)
+        assert await cache.get(KEY) is None
+        await cache.set(KEY, {"total": 1.5})
+        assert await cache.get(KEY) == {"total": 1.5}
+        assert await cache.get(("user", 4, "2025-01-01", None)) is None  # autre data_version
+
+    asyncio.run(scenario())
+
+
+def test_shared_level_is_seen_by_other_workers():
+    async def scenario(server, cache):
+        first, second = cache(), cache()
+        await first.set(KEY, {"total": 1.5})
+        assert server.data[b"rc:test:user:3:2025-01-01:"][0] == json.dumps({"total": 1.5}).encode()
+        assert await second.get(KEY) == {"total": 1.5}
+        reads = len(server.commands)
+        assert await second.get(KEY) == {"total": 1.5}  # désormais en mémoire
+        assert len(server.commands) == reads
+
+    run(scenario)
+
+
+def test_shared_outage_is_skipped_for_a_while():
+    async def scenario(server, cache):
+        c = cache()
+        server.hang = True
+        await c.set(KEY, {"total": 1.5})  # expire sans bloquer la réponse
+        assert await c.get(KEY) == {"total": 1.5}
+        sent = len(server.commands)
+        assert await c.get(("user", 4, "2025-01-01", None)) is None
+        await c.set(("user", 4, "2025-01-01", None), {"total": 2})
+        assert len(server.commands) == sent  # niveau partagé ignoré pendant SHARED_RETRY_SECONDS
+
+    run(scenario)
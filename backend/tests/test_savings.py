@@ -0,0 +1,29 @@
+"""
+Objectifs d'épargne : ajustements atomiques et historique des contributions.
+"""
+import asyncio
+
+
+def test_concurrent_adjustments_keep_balance_and_ledger_in_step(api):
+    async def scenario(client):
+        goal = (await client.post("/api/savings-goals", json={"name": "Vacances", "target_amount": 1000})).json()
+        adjust = f"/api/savings-goals/{goal['id']}/adjust"
+        responses = await asyncio.gather(
+            *(client.post(adjust, json={"amount": 10, "action": "add"}) for _ in range(20)),
+            *(client.post(adjust, json={"amount": 30, "action": "remove"}) for _ in range(10)),
+        )
+        codes = [r.status_code for r in responses]
+        assert codes[:20] == [200] * 20 and set(codes[20:]) <= {200, 400}
+        removed = codes[20:].count(200)
+        (saved,) = (await client.get("/api/savings-goals")).json()
+        assert saved["current_amount"] == 200 - 30 * removed >= 0
+        ledger = (await client.get(f"/api/savings-goals/{goal['id']}/contributions")).json()
+        assert len(ledger) == 20 + removed
+        assert sum(c["amount"] for c in ledger) == saved["current_amount"]
+        assert min(c["balance"] for c in ledger) >= 0
+        overdraft = await client.post(adjust, json={"amount": saved["current_amount"] + 1, "action": "remove"})
+        assert overdraft.status_code == 400
+        await client.delete(f"/api/savings-goals/{goal['id']}")
+        assert (await client.get(f"/api/savings-goals/{goal['id']}/contributions")).status_code == 404
+
+    api.run(scenario)
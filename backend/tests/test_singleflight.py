@@ -0,0 +1,75 @@
+"""
+Regroupement des calculs concurrents (singleflight.py).
+"""
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_computation():
+    async def scenario():
+        flight = SingleFlight("test")
+        calls = 0
+        release = asyncio.Event()
+
+        async def compute():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return calls
+
+        waiters = [asyncio.create_task(flight.do("k", compute)) for _ in range(5)]
+        other = asyncio.create_task(flight.do("autre", compute))
+        await asyncio.sleep(0)
+        assert len(flight) == 2
+        release.set()
+        assert await asyncio.gather(*waiters) == [waiters[0].result()] * 5
+        await other
+        assert calls == 2 and len(flight) == 0
+        # Terminé : rien n'est gardé, l'appel suivant recalcule
+        assert await flight.do("k", compute) == 3
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_caller_does_not_cancel_the_others():
+    async def scenario():
+        flight = SingleFlight("test")
+        release = asyncio.Event()
+
+        async def compute():
+            await release.wait()
+            return "ok"
+
+        leader = asyncio.create_task(flight.do("k", compute))
+        follower = asyncio.create_task(flight.do("k", compute))
+        await asyncio.sleep(0)
+        leader.cancel()  # client déconnecté
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        release.set()
+        assert await follower == "ok"
+
+    asyncio.run(scenario())
+
+
+def test_errors_reach_every_caller_and_are_not_kept():
+    async def scenario():
+        flight = SingleFlight("test")
+        attempts = 0
+
+        async def failing():
+            nonlocal attempts
+            attempts += 1
+            await asyncio.sleep(0)
+            raise ValueError("boom")
+
+        results = await asyncio.gather(*(flight.do("k", failing) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(r, ValueError) for r in results) and attempts == 1
+        with pytest.raises(ValueError):
+            await flight.do("k", failing)
+        assert attempts == 2
+
+    asyncio.run(scenario())
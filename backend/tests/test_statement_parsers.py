@@ -0,0 +1,96 @@
+"""
+Analyseurs de relevés (statement_parsers.py) sur des lignes de relevé reconstituées.
+"""
+from statement_parsers import Statement, Word, parse_amount, parse_known, resolve_date, statement_period
+
+CHAR = 5.0
+
+
+def word(text, x0=None, x1=None, top=0.0):
+    """Mot placé par son bord gauche, ou par son bord droit (montants alignés à droite)."""
+    width = CHAR * len(text)
+    if x0 is None:
+        x0 = x1 - width
+    return Word(text, x0, x0 + width if x1 is None else x1, top)
+
+
+def line(top, date_text, label, amounts=(), value_date=None):
+    """Ligne d'opération : date, libellé (mots), montants [(texte, bord droit)]."""
+    words = [word(date_text, x0=40, top=top)]
+    x = 100
+    for part in label.split():
+        words.append(word(part, x0=x, top=top))
+        x += CHAR * len(part) + 4
+    if value_date:
+        words.append(word(value_date, x0=330, top=top))
+    words.extend(word(text, x1=right, top=top) for text, right in amounts)
+    return words
+
+
+DEBIT_RIGHT, CREDIT_RIGHT, AMOUNT_RIGHT = 430.0, 515.0, 470.0
+
+DEBIT_CREDIT_HEADER = [word("Date", x0=40), word("Libellé", x0=100), word("Valeur", x0=330),
+                       word("Débit", x1=DEBIT_RIGHT), word("Crédit", x1=CREDIT_RIGHT)]
+SIGNED_HEADER = [word("Date", x0=40), word("Description", x0=100), word("Montant", x1=AMOUNT_RIGHT)]
+
+
+def statement(header, rows, text="Relevé de compte du 01/03/2025 au 31/03/2025"):
+    lines = [header] + rows
+    return Statement(text=text, lines=lines, pages=[text])
+
+
+def test_debit_credit_layout():
+    rows = [
+        line(100, "01/03", "SOLDE CREDITEUR AU 28/02/2025", [("1.234,56", CREDIT_RIGHT)]),
+        line(120, "02/03", "CB CARREFOUR MARKET", [("45,20", DEBIT_RIGHT)], value_date="02/03"),
+        line(140, "03/03", "CB TOTALENERGIES", [("12,00", DEBIT_RIGHT)]),
+        line(160, "04/03", "SOLDES HIVER BOUTIQUE", [("30,00", DEBIT_RIGHT)]),
+        line(180, "05/03", "REPORTAGE PHOTO", [("80,00", DEBIT_RIGHT)]),
+        line(200, "06/03", "VIR SEPA SALAIRE", [("2", CREDIT_RIGHT - CHAR * 6 - 3), ("100,00", CREDIT_RIGHT)]),
+        [word("ACME SAS MARS", x0=100, top=210)],  # suite du libellé
+        line(240, "31/03", "TOTAL DES OPERATIONS", [("167,20", DEBIT_RIGHT), ("2.100,00", CREDIT_RIGHT)]),
+        line(260, "31/03", "REPORT A NOUVEAU", [("3.167,36", CREDIT_RIGHT)]),
+        line(280, "31/03", "SOUS-TOTAL", [("167,20", DEBIT_RIGHT)]),
+    ]
+    name, parsed = parse_known(statement(DEBIT_CREDIT_HEADER, rows))
+    assert name == "debit_credit"
+    assert parsed == [
+        {"date": "2025-03-02", "amount": 45.2, "type": "Dépense", "description": "CB CARREFOUR MARKET"},
+        {"date": "2025-03-03", "amount": 12.0, "type": "Dépense", "description": "CB TOTALENERGIES"},
+        {"date": "2025-03-04", "amount": 30.0, "type": "Dépense", "description": "SOLDES HIVER BOUTIQUE"},
+        {"date": "2025-03-05", "amount": 80.0, "type": "Dépense", "description": "REPORTAGE PHOTO"},
+        {"date": "2025-03-06", "amount": 2100.0, "type": "Revenu", "description": "VIR SEPA SALAIRE ACME SAS MARS"},
+    ]
+
+
+def test_signed_amount_layout():
+    rows = [
+        line(100, "02/03/2025", "Carrefour City", [("-12,50", AMOUNT_RIGHT)]),
+        line(120, "03/03/2025", "Total Energies Station", [("-60,00", AMOUNT_RIGHT)]),
+        line(140, "04/03/2025", "Remboursement Lydia", [("+25,00", AMOUNT_RIGHT)]),
+        line(160, "31/03/2025", "Solde fin de mois", [("952,50", AMOUNT_RIGHT)]),
+    ]
+    name, parsed = parse_known(statement(SIGNED_HEADER, rows))
+    assert name == "signed_amount"
+    assert parsed == [
+        {"date": "2025-03-02", "amount": 12.5, "type": "Dépense", "description": "Carrefour City"},
+        {"date": "2025-03-03", "amount": 60.0, "type": "Dépense", "description": "Total Energies Station"},
+        {"date": "2025-03-04", "amount": 25.0, "type": "Revenu", "description": "Remboursement Lydia"},
+    ]
+
+
+def test_unknown_layout_is_left_to_gemini():
+    rows = [line(100, "02/03", "CB CARREFOUR", [("45,20", DEBIT_RIGHT)])]
+    header = [word("Jour", x0=40), word("Opération", x0=100)]
+    assert parse_known(statement(header, rows)) is None
+
+
+def test_amounts_and_dates():
+    assert parse_amount("1.234,56") == 1234.56
+    assert parse_amount("1 234,56") == 1234.56
+    assert parse_amount("12,50-") == -12.5
+    assert parse_amount("12.50") is None
+    period = statement_period("Période du 01/12/2024 au 31/01/2025")
+    assert resolve_date("15/12", period).isoformat() == "2024-12-15"
+    assert resolve_date("15/01", period).isoformat() == "2025-01-15"
+    assert resolve_date("31/02", period) is None
@@ -0,0 +1,85 @@
+"""
+Formats de réponse négociés (wire.py) : Accept, Accept-Encoding, Vary, rendu.
+"""
+import gzip
+from datetime import datetime, timezone
+
+import msgpack
+import pytest
+
+import wire
+from wire import WireFormat, negotiate
+
+
+@pytest.mark.parametrize("accept,accept_encoding,expected", [
+    ("", "", WireFormat(negotiated=True)),
+    ("application/json", "gzip, deflate", WireFormat(False, False, "gzip", True)),
+    ("application/msgpack", "gzip, br", WireFormat(True, False, "br", True)),
+    ("application/x-msgpack; layout=columnar", "", WireFormat(True, True, None, True)),
+    ("application/json; layout=columnar, application/msgpack", "", WireFormat(True, False, None, True)),
+    ("application/json; layout=columnar, application/msgpack;q=0", "br;q=0, gzip", WireFormat(False, True, "gzip", True)),
+    ('application/json; layout="COLUMNAR"', "identity", WireFormat(False, True, None, True)),
+    ("text/html, */*;q=0.8", "*", WireFormat(negotiated=True)),
+])
+def test_negotiate(accept, accept_encoding, expected):
+    assert negotiate(accept, accept_encoding) == expected
+
+
+def test_negotiate_without_optional_codecs(monkeypatch):
+    monkeypatch.setattr(wire, "msgpack", None)
+    monkeypatch.setattr(wire, "brotli", None)
+    assert negotiate("application/msgpack, application/json; layout=columnar", "br, gzip") == WireFormat(False, True, "gzip", True)
+
+
+def test_to_columnar():
+    rows = [{"a": 1, "b": 2}, {"b": 3, "c": 4}]
+    assert wire.to_columnar(rows) == {"columns": ["a", "b", "c"], "rows": [[1, 2, None], [None, 3, 4]]}
+    assert wire.to_columnar([]) == {"columns": [], "rows": []}
+    assert wire.to_columnar({"a": 1}) is None
+
+
+# --- Rendu par l'application ---
+
+def test_vary_and_compression(api):
+    params = {"granularity": "month", "year": 2025}
+    small = api.get("/api/dashboard/compare", {"granularity": "year", "periods": "2025"}, {"Accept-Encoding": "gzip"})
+    assert small.headers["vary"] == "Accept, Accept-Encoding"
+    assert "content-encoding" not in small.headers  # sous COMPRESS_MIN_BYTES
+    large = api.get("/api/dashboard/compare", params, {"Accept-Encoding": "gzip"})
+    assert large.headers["content-encoding"] == "gzip"
+    assert len(large.json()["periods"]) == 12
+
+
+def test_response_model_route_keeps_native_types_in_msgpack(api):
+    response = api.get("/api/dashboard/compare", {"granularity": "month", "year": 2025},
+                    {"Accept": "application/msgpack; layout=columnar"})
+    assert response.headers["content-type"] == wire.MSGPACK
+    assert "x-layout" not in response.headers  # objet, pas une liste : disposition inchangée
+    body = msgpack.unpackb(response.content, timestamp=3)
+    first = body["periods"][0]
+    assert first["start_date"] == datetime(2025, 1, 1, tzinfo=timezone.utc)
+    assert first["total_income"] == 0
+    as_json = api.get("/api/dashboard/compare", {"granularity": "month", "year": 2025}, {})
+    assert as_json.json()["periods"][0]["start_date"] == "2025-01-01T00:00:00+00:00"
+
+
+def _render(content, fmt):
+    import server
+    token = wire._current.set(fmt)
+    try:
+        return server.UnifiedJSONResponse(content)
+    finally:
+        wire._current.reset(token)
+
+
+def test_render_outside_the_middleware_is_plain_json():
+    response = _render({"a": 1}, WireFormat())
+    assert response.body == b'{"a":1}' and "vary" not in response.headers
+
+
+def test_large_json_is_gzipped_with_fixed_mtime():
+    fmt = WireFormat(encoding="gzip", negotiated=True)
+    first = _render([{"n": n} for n in range(500)], fmt)
+    second = _render([{"n": n} for n in range(500)], fmt)
+    assert first.body == second.body
+    assert gzip.decompress(first.body).startswith(b'[{"n":0}')
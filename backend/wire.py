@@ -0,0 +1,154 @@
+"""
+Formats de réponse négociés pour UnifiedJSONResponse (Accept, Accept-Encoding).
+
+- Encodage : JSON par défaut ; MessagePack si le client demande
+  `application/msgpack` (ou `application/x-msgpack`) et que msgpack est
+  installé. Les dates y sont des Timestamp MessagePack (extension -1) ;
+- Disposition colonnaire : paramètre `layout=columnar` du type demandé
+  (`Accept: application/json; layout=columnar`). Une liste d'objets devient
+  {"columns": [...], "rows": [[...], ...]} : les clés ne sont écrites qu'une
+  fois. L'en-tête `X-Layout: columnar` signale qu'elle a été appliquée ;
+- Compression : br (si brotli est installé) ou gzip, à partir de
+  COMPRESS_MIN_BYTES.
+
+WireMiddleware lit les en-têtes de la requête et place le format négocié dans
+une ContextVar, lue par UnifiedJSONResponse. Les autres réponses (flux SSE,
+fichiers, exports déjà compressés) ne sont pas touchées.
+
+Une route à `response_model` qui renvoie un modèle passe d'abord par
+jsonable_encoder (dates en chaînes ISO, même en MessagePack) : les routes du
+tableau de bord renvoient `model_response(...)` (server.py) pour garder les
+types natifs.
+"""
+import gzip
+import os
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Callable, List, NamedTuple, Optional
+
+from metrics import RESPONSE_ENCODINGS
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    msgpack = None
+try:
+    import brotli
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))  # 4 : proche de gzip 6 en temps, plus compact
+
+MSGPACK = "application/msgpack"
+MSGPACK_TYPES = (MSGPACK, "application/x-msgpack")
+
+
+class WireFormat(NamedTuple):
+    msgpack: bool = False
+    columnar: bool = False
+    encoding: Optional[str] = None  # "br" | "gzip" | None
+    negotiated: bool = False        # requête passée par WireMiddleware
+
+
+_current: ContextVar[WireFormat] = ContextVar("wire_format", default=WireFormat())
+
+
+def current() -> WireFormat:
+    return _current.get()
+
+
+def _ranges(header: str) -> List[tuple]:
+    """« a/b; layout=columnar; q=0.5, c » -> [(valeur, {paramètres}, q)]."""
+    out = []
+    for part in header.split(","):
+        value, *params = [p.strip() for p in part.split(";")]
+        if not value:
+            continue
+        options = {}
+        for param in params:
+            name, _, val = param.partition("=")
+            options[name.strip().lower()] = val.strip().strip('"').lower()
+        try:
+            q = float(options.pop("q", "1"))
+        except ValueError:
+            q = 0.0
+        out.append((value.lower(), options, q))
+    return out
+
+
+def negotiate(accept: str, accept_encoding: str) -> WireFormat:
+    accepted = [(value, options) for value, options, q in _ranges(accept) if q > 0]
+    use_msgpack = msgpack is not None and any(value in MSGPACK_TYPES for value, _ in accepted)
+    wanted = [options for value, options in accepted if (value in MSGPACK_TYPES) == use_msgpack]
+    columnar = any(options.get("layout") == "columnar" for options in wanted)
+    encodings = {value for value, _, q in _ranges(accept_encoding) if q > 0}
+    encoding = "br" if brotli is not None and "br" in encodings else "gzip" if "gzip" in encodings else None
+    return WireFormat(use_msgpack, columnar, encoding, True)
+
+
+class WireMiddleware:
+    """Middleware ASGI : format négocié de la requête -> ContextVar."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        fmt = negotiate(headers.get(b"accept", b"").decode("latin-1"), headers.get(b"accept-encoding", b"").decode("latin-1"))
+        token = _current.set(fmt)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current.reset(token)
+
+
+# --- Rendu ---
+
+def to_columnar(content: Any) -> Optional[dict]:
+    """Liste d'objets -> {"columns", "rows"} ; None si le contenu n'est pas une liste d'objets."""
+    if not isinstance(content, list) or not all(isinstance(row, dict) for row in content):
+        return None
+    columns = list(content[0]) if content else []
+    seen = set(columns)
+    for row in content:
+        if len(row) != len(columns) or any(key not in seen for key in row):
+            for key in row:
+                if key not in seen:
+                    columns.append(key)
+                    seen.add(key)
+    return {"columns": columns, "rows": [[row.get(c) for c in columns] for row in content]}
+
+
+def packb(content: Any, default: Callable[[Any], Any]) -> bytes:
+    """MessagePack ; les dates sans fuseau sont en UTC (comme celles lues dans MongoDB)."""
+    def fallback(obj):
+        if isinstance(obj, datetime):
+            return msgpack.Timestamp.from_datetime(obj.replace(tzinfo=timezone.utc))
+        return default(obj)
+    return msgpack.packb(content, datetime=True, default=fallback)
+
+
+def finish(response, fmt: WireFormat, columnar: bool):
+    """En-têtes de négociation et compression du corps déjà rendu."""
+    if not fmt.negotiated:
+        return
+    headers = response.headers
+    headers["vary"] = "Accept, Accept-Encoding"
+    if columnar:
+        headers["x-layout"] = "columnar"
+    encoding = fmt.encoding
+    if encoding is None or "content-encoding" in headers or len(response.body) < COMPRESS_MIN_BYTES:
+        encoding = None
+    elif encoding == "br":
+        response.body = brotli.compress(response.body, quality=BROTLI_QUALITY)
+    else:
+        response.body = gzip.compress(response.body, compresslevel=GZIP_LEVEL, mtime=0)
+    if encoding is not None:
+        headers["content-encoding"] = encoding
+        headers["content-length"] = str(len(response.body))
+    RESPONSE_ENCODINGS.inc("msgpack" if fmt.msgpack else "json", encoding or "identity")
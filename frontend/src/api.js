@@ -24,9 +24,25 @@ api.interceptors.request.use(
   }
 );
 
+// Listes en disposition colonnaire (clés envoyées une fois) : moins d'octets à transférer et à parser
+export const COLUMNAR = { Accept: 'application/json; layout=columnar' };
+
+// { columns, rows } -> liste d'objets
+const fromColumnar = ({ columns, rows }) =>
+  rows.map((row) => {
+    const item = {};
+    columns.forEach((name, i) => {
+      item[name] = row[i];
+    });
+    return item;
+  });
+
 // --- Intercepteur de Réponse ---
 api.interceptors.response.use(
   (response) => {
+    if (response.headers && response.headers['x-layout'] === 'columnar') {
+      response.data = fromColumnar(response.data);
+    }
     return response;
   },
   (error) => {
@@ -268,6 +284,26 @@ export const bulkCreateTransactions = async (transactions) => {
   });
 };
 
+/**
+ * Exporte les transactions filtrées (CSV ou Excel) et déclenche le téléchargement.
+ * @param {string} format - "csv" ou "xlsx".
+ * @param {object} params - Mêmes filtres que GET /api/transactions.
+ */
+export const exportTransactions = async (format, params = {}) => {
+  const response = await api.get('/api/transactions/export', {
+    params: { ...params, format },
+    responseType: 'blob',
+  });
+  const url = window.URL.createObjectURL(response.data);
+  const link = document.createElement('a');
+  link.href = url;
+  link.download = `transactions-${new Date().toISOString().slice(0, 10)}.${format}`;
+  document.body.appendChild(link);
+  link.click();
+  link.remove();
+  window.URL.revokeObjectURL(url);
+};
+
 // --- NOUVEAU : API Keys & Inbox Apple Pay ---
 
 export const generateApiKey = async () => {
@@ -290,4 +326,63 @@ export const deletePendingTransaction = async (pendingId) => {
   return await api.delete(`/api/transactions/pending/${pendingId}`);
 };
 
+// Valide les éléments de l'inbox dont la catégorie est connue (index marchand)
+export const autoCategorizePending = async () => {
+  return await api.post('/api/transactions/pending/auto-categorize');
+};
+
+// --- Événements en direct (SSE) ---
+
+// handlers : { pending, transactions, resync } ; renvoie la fonction de désabonnement.
+// Le jeton passe dans l'URL (EventSource n'envoie pas d'en-têtes) : on utilise un jeton
+// de flux de courte durée, redemandé à chaque (re)connexion, jamais le jeton d'accès.
+export const subscribeEvents = (handlers) => {
+  if (!localStorage.getItem('authToken') || typeof EventSource === 'undefined') return () => {};
+  let source = null;
+  let retry = null;
+  let closed = false;
+
+  const reconnect = () => {
+    if (source) source.close();
+    source = null;
+    if (!closed && localStorage.getItem('authToken')) retry = setTimeout(open, 5000);
+  };
+
+  const open = async () => {
+    let token;
+    try {
+      token = (await api.post('/api/events/token')).data.token;
+    } catch (error) {
+      reconnect();
+      return;
+    }
+    if (closed) return;
+    source = new EventSource(`${API_BASE_URL}/api/events?token=${encodeURIComponent(token)}`);
+    Object.entries(handlers).forEach(([name, handler]) => {
+      source.addEventListener(name, (e) => handler(JSON.parse(e.data)));
+    });
+    // Le jeton de flux a expiré entre-temps : la reconnexion automatique d'EventSource échouerait
+    source.onerror = reconnect;
+  };
+
+  open();
+  return () => {
+    closed = true;
+    clearTimeout(retry);
+    if (source) source.close();
+  };
+};
+
+// Vrai si un des mois "AAAA-MM" de l'événement touche [start, end] (months null : portée inconnue)
+export const monthsOverlap = (months, start, end) => {
+  if (!months) return true;
+  const monthOf = (date) => {
+    const d = new Date(date);
+    return `${d.getFullYear()}-${String(d.getMonth() + 1).padStart(2, '0')}`;
+  };
+  const from = start ? monthOf(start) : null;
+  const to = end ? monthOf(end) : null;
+  return months.some((m) => (!from || m >= from) && (!to || m <= to));
+};
+
 export default api;
\ No newline at end of file
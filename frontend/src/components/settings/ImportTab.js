@@ -116,11 +116,14 @@ function ImportTab() {
       const dataWithTempIds = response.data.map(t => ({
         ...t,
         tempId: uuidv4_fallback(),
-        category_id: '' // L'utilisateur devra choisir
+        category_id: t.category_id || '' // Suggestion de l'historique, sinon à choisir
       }));
       setPdfPreview(dataWithTempIds);
+      const unparsedPages = response.headers['x-unparsed-pages'];
       if (dataWithTempIds.length === 0) {
         setError("Aucune transaction n'a été détectée dans ce PDF.");
+      } else if (unparsedPages) {
+        setError(`Certaines pages n'ont pas pu être analysées (${unparsedPages}) : vérifiez l'aperçu ou relancez l'analyse.`);
       }
     } catch (err) {
       setError(err.response?.data?.detail || "Erreur lors de l'analyse du PDF.");
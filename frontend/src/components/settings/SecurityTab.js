@@ -81,10 +81,14 @@ function SecurityTab() { // Renommé de PasswordTab à SecurityTab
 
     setPwdLoading(true);
     try {
-      await api.put('/api/users/me/change-password', {
+      const response = await api.put('/api/users/me/change-password', {
         current_password: pwdCurrent,
         new_password: pwdNew,
       });
+      // Les anciens jetons sont révoqués : on garde la session avec le nouveau
+      if (response.data.access_token) {
+        localStorage.setItem('authToken', response.data.access_token);
+      }
       setPwdSuccess("Votre mot de passe a été mis à jour avec succès !");
       setPwdCurrent('');
       setPwdNew('');
@@ -1,10 +1,12 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { Link } from 'react-router-dom';
 import api, { 
   getMonthlyReview, 
   getPendingTransactions, 
   resolvePendingTransaction, 
-  deletePendingTransaction 
+  deletePendingTransaction,
+  autoCategorizePending,
+  subscribeEvents
 } from '../api';
 import { useAuth } from '../App'; 
 import { 
@@ -97,6 +99,29 @@ function Dashboard() {
     fetchPendingTransactions(); // Rafraichit l'inbox quand on modifie les données
   }, [refreshKey, appliedParams]); 
 
+  // Mises à jour en direct : seule la partie concernée (inbox ou stats) est rechargée
+  const liveHandlers = useRef({});
+  liveHandlers.current = {
+    pending: (e) => {
+      if (e.op === 'added') {
+        setPendingTransactions(prev => prev.some(t => t.id === e.item.id) ? prev : [e.item, ...prev]);
+        setPendingSelections(prev => ({ ...prev, [e.item.id]: prev[e.item.id] || suggestedSelection(e.item) }));
+      } else {
+        setPendingTransactions(prev => prev.filter(t => t.id !== e.id));
+      }
+    },
+    // Les stats contiennent aussi les totaux globaux, le solde estimé et le graphique annuel :
+    // toute modification de transactions les change, quelle que soit la période affichée.
+    transactions: () => fetchStats(),
+    resync: () => setRefreshKey(prev => prev + 1),
+  };
+
+  useEffect(() => subscribeEvents({
+    pending: (e) => liveHandlers.current.pending(e),
+    transactions: (e) => liveHandlers.current.transactions(e),
+    resync: () => liveHandlers.current.resync(),
+  }), []);
+
   // Initial fetch (Revue, Catégories pour l'Inbox)
   useEffect(() => {
     const fetchInitialData = async () => {
@@ -154,7 +179,7 @@ function Dashboard() {
       const newSelections = { ...pendingSelections };
       res.data.forEach(t => {
         if (!newSelections[t.id]) {
-          newSelections[t.id] = { categoryId: '', subcategoryId: '' };
+          newSelections[t.id] = suggestedSelection(t);
         }
       });
       setPendingSelections(newSelections);
@@ -166,6 +191,25 @@ function Dashboard() {
     }
   };
 
+  // Pré-remplit avec la suggestion de l'index marchand
+  const suggestedSelection = (t) => ({ categoryId: t.category_id || '', subcategoryId: t.subcategory_id || '' });
+
+  const [autoCategorizing, setAutoCategorizing] = useState(false);
+  const handleAutoCategorize = async () => {
+    setAutoCategorizing(true);
+    try {
+      const res = await autoCategorizePending();
+      if (res.data.resolved === 0) {
+        alert("Aucune transaction n'a pu être classée automatiquement.");
+      }
+      setRefreshKey(prev => prev + 1);
+    } catch (err) {
+      console.error('Failed to auto-categorize', err);
+    } finally {
+      setAutoCategorizing(false);
+    }
+  };
+
   const handlePendingSelectionChange = (id, field, value) => {
     setPendingSelections(prev => ({
       ...prev,
@@ -290,9 +334,19 @@ function Dashboard() {
       {/* --- NOUVEAU BLOC : INBOX TRANSACTIONS EN ATTENTE --- */}
       {pendingTransactions.length > 0 && (
         <div className="bg-yellow-50 border-2 border-yellow-200 rounded-2xl shadow-md p-6">
-          <div className="flex items-center space-x-3 mb-4 text-yellow-800">
-            <Inbox className="h-6 w-6" />
-            <h2 className="text-lg font-bold">À Classer ({pendingTransactions.length})</h2>
+          <div className="flex items-center justify-between mb-4 text-yellow-800">
+            <div className="flex items-center space-x-3">
+              <Inbox className="h-6 w-6" />
+              <h2 className="text-lg font-bold">À Classer ({pendingTransactions.length})</h2>
+            </div>
+            <button
+              onClick={handleAutoCategorize}
+              disabled={autoCategorizing}
+              className="flex items-center space-x-2 px-3 py-1.5 text-sm bg-yellow-600 text-white rounded-lg hover:bg-yellow-700 disabled:opacity-50"
+            >
+              {autoCategorizing ? <Loader className="h-4 w-4 animate-spin" /> : <Check className="h-4 w-4" />}
+              <span>Classer automatiquement</span>
+            </button>
           </div>
           <p className="text-sm text-yellow-700 mb-4">Ces transactions ont été reçues automatiquement (ex: Apple Pay). Sélectionnez une catégorie pour les ajouter à votre budget.</p>
           
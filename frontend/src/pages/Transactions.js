@@ -1,8 +1,8 @@
-import React, { useState, useEffect } from 'react';
-import api from '../api';
+import React, { useState, useEffect, useRef } from 'react';
+import api, { exportTransactions, subscribeEvents, monthsOverlap, COLUMNAR } from '../api';
 import { format } from 'date-fns';
 import { fr } from 'date-fns/locale';
-import { Search, Filter, Edit2, Trash2, Loader, Plus } from 'lucide-react';
+import { Search, Filter, Edit2, Trash2, Loader, Plus, Download } from 'lucide-react';
 import TransactionModal from '../components/TransactionModal';
 
 function Transactions() {
@@ -18,6 +18,7 @@ function Transactions() {
   });
   const [showModal, setShowModal] = useState(false);
   const [editTransaction, setEditTransaction] = useState(null);
+  const [exporting, setExporting] = useState(false);
 
   useEffect(() => {
     fetchCategories();
@@ -29,16 +30,30 @@ function Transactions() {
     fetchTransactions();
   }, [filters]);
 
+  // Rechargement en direct, seulement si les mois modifiés sont dans la période filtrée
+  const onTransactionsChanged = useRef(null);
+  onTransactionsChanged.current = (e) => {
+    if (monthsOverlap(e.months, filters.start_date, filters.end_date)) fetchTransactions();
+  };
+
+  useEffect(() => subscribeEvents({
+    transactions: (e) => onTransactionsChanged.current(e),
+    resync: () => onTransactionsChanged.current({ months: null }),
+  }), []);
+
+  const filterParams = () => {
+    const params = {};
+    if (filters.start_date) params.start_date = new Date(filters.start_date).toISOString();
+    if (filters.end_date) params.end_date = new Date(filters.end_date).toISOString();
+    if (filters.category_id) params.category_id = filters.category_id;
+    if (filters.search) params.search = filters.search;
+    return params;
+  };
+
   const fetchTransactions = async () => {
     setLoading(true);
     try {
-      const params = {};
-      if (filters.start_date) params.start_date = new Date(filters.start_date).toISOString();
-      if (filters.end_date) params.end_date = new Date(filters.end_date).toISOString();
-      if (filters.category_id) params.category_id = filters.category_id;
-      if (filters.search) params.search = filters.search;
-
-      const response = await api.get('/api/transactions', { params });
+      const response = await api.get('/api/transactions', { params: filterParams(), headers: COLUMNAR });
       setTransactions(response.data);
     } catch (error) {
       console.error('Error fetching transactions:', error);
@@ -79,6 +94,18 @@ function Transactions() {
     }
   };
 
+  const handleExport = async (exportFormat) => {
+    setExporting(true);
+    try {
+      await exportTransactions(exportFormat, filterParams());
+    } catch (error) {
+      console.error('Error exporting transactions:', error);
+      alert("Erreur lors de l'export");
+    } finally {
+      setExporting(false);
+    }
+  };
+
   const handleEdit = (transaction) => {
     setEditTransaction(transaction);
     setShowModal(true);
@@ -137,6 +164,23 @@ function Transactions() {
           <h1 className="text-3xl font-bold text-gray-900">Transactions</h1>
           <p className="text-gray-600 mt-1">Gérez toutes vos transactions</p>
         </div>
+        <div className="flex flex-col sm:flex-row gap-2 w-full sm:w-auto">
+        <button
+          onClick={() => handleExport('csv')}
+          disabled={exporting}
+          className="w-full sm:w-auto bg-white text-gray-700 border border-gray-300 px-4 py-3 rounded-xl font-semibold hover:bg-gray-50 transition-colors flex items-center justify-center space-x-2 disabled:opacity-50"
+        >
+          <Download className="h-5 w-5" />
+          <span>CSV</span>
+        </button>
+        <button
+          onClick={() => handleExport('xlsx')}
+          disabled={exporting}
+          className="w-full sm:w-auto bg-white text-gray-700 border border-gray-300 px-4 py-3 rounded-xl font-semibold hover:bg-gray-50 transition-colors flex items-center justify-center space-x-2 disabled:opacity-50"
+        >
+          <Download className="h-5 w-5" />
+          <span>Excel</span>
+        </button>
         <button
           onClick={() => {
             setEditTransaction(null);
@@ -147,6 +191,7 @@ function Transactions() {
           <Plus className="h-5 w-5" />
           <span>Nouvelle transaction</span>
         </button>
+        </div>
       </div>
 
       {/* Filters */}